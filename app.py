@@ -1,44 +1,102 @@
 import streamlit as st
 import pandas as pd
 import io
-import plotly.express as px # Importando Plotly Express
 
-def analisar_conversao_por_etapa_web(df, coluna_conversao='Tipo', valor_conversao='Cancelado-Lead-Respondeu', coluna_etapa='Etapa'):
+from leads.cache import get_parse_cache, hash_uploaded_file
+from leads.charts import box_figure, box_stats, cached_figure, top_n
+from leads.columnar import get_columnar_cache
+from leads.conversions import STAGE_RESULT_COL, analisar_conversao_em_blocos, analisar_conversao_por_etapa, resumo_por_etapa
+from leads.diagnostics import render_panel, stage, start_run
+from leads.dtypes import format_memory_report, optimize_dtypes
+from leads.filters import FilterIndex, freeze_selections, render_filters
+from leads.funnel import RESPONSE_HOURS_COL, funil_em_blocos, funil_por_etapa
+from leads.pipeline import read_spreadsheet
+from leads.table import render_table
+
+def carregar_planilha(uploaded_file):
+    """
+    Lê a planilha enviada e compacta os tipos das colunas (Tipo, Etapa, Deal ID...).
+    Retorna o DataFrame e o relatório de memória.
+    """
+    df = read_spreadsheet(uploaded_file.name, uploaded_file.getvalue(), columnar_cache=get_columnar_cache())
+    with stage('compactar tipos', df):
+        relatorio_memoria = optimize_dtypes(df)
+    return df, relatorio_memoria
+
+def grafico_conversoes_por_etapa(df_resumo):
+    """
+    Rosca com a distribuição das conversões por etapa. As maiores etapas aparecem
+    sozinhas e o resto é somado em "Outros"; a figura fica em cache pelo conteúdo.
+    """
+    df_grafico = top_n(df_resumo.set_index('Etapa'), by='Conversões').reset_index()
+
+    def montar():
+        import plotly.express as px # Plotly Express só é importado quando o gráfico é montado
+
+        fig = px.pie(
+            df_grafico,            # Passa o DataFrame já reduzido
+            values='Conversões',   # Coluna para os valores
+            names='Etapa',         # Coluna para os nomes/rótulos das fatias
+            title='Distribuição de Conversões por Etapa',
+            hole=0.4, # Para fazer um gráfico de rosca
+            hover_data=['Percentual (%)'] # Mostra a porcentagem ao passar o mouse
+        )
+        fig.update_traces(textposition='inside', textinfo='percent+label')
+        return fig
+    return cached_figure('app-distribuicao', df_grafico, montar)
+
+def grafico_funil(df_funil):
+    """Funil com quantos leads chegaram em cada etapa; a figura fica em cache pelo conteúdo."""
+    def montar():
+        import plotly.express as px
+
+        return px.funnel(df_funil, x='Leads na etapa', y='Etapa', title='Leads que chegaram em cada etapa')
+    return cached_figure('app-funil', df_funil, montar)
+
+def analisar_conversao_por_etapa_web(df, coluna_conversao='Tipo', valor_conversao='Cancelado-Lead-Respondeu', coluna_etapa='Etapa', deduplicar=False):
     """
     Função de análise principal, adaptada para ser usada na aplicação web.
     Recebe um DataFrame e retorna os resultados da análise e uma mensagem de status.
     """
-    if df.empty:
-        return pd.DataFrame(), "A planilha está vazia ou não contém dados válidos para análise."
+    resultados, mensagem = analisar_conversao_por_etapa(df, coluna_conversao, valor_conversao, coluna_etapa, deduplicar=deduplicar)
 
-    # Verifica se as colunas essenciais existem no DataFrame original
-    if coluna_conversao not in df.columns:
-        return pd.DataFrame(), f"Erro: Coluna '{coluna_conversao}' não encontrada na sua planilha. Por favor, verifique o nome da coluna."
-    
-    # Filtra as linhas onde a conversão (resposta do lead) aconteceu
-    leads_convertidos = df[df[coluna_conversao] == valor_conversao].copy()
+    if not resultados.empty and STAGE_RESULT_COL not in resultados.columns:
+        st.warning(f"Atenção: Coluna '{coluna_etapa}' não encontrada nos leads convertidos. A análise de conversão por etapa não será detalhada por etapa, apenas a lista de convertidos.")
 
-    if leads_convertidos.empty:
-        return pd.DataFrame(), f"Nenhum lead com '{valor_conversao}' encontrado na coluna '{coluna_conversao}'."
+    return resultados, mensagem
 
-    # Verifica se a coluna de etapa existe antes de tentar usá-la para a análise detalhada
-    if coluna_etapa not in leads_convertidos.columns: # Verificar em leads_convertidos, não no df original
+def analisar_conversao_em_blocos_web(uploaded_file, coluna_conversao='Tipo', valor_conversao='Cancelado-Lead-Respondeu', coluna_etapa='Etapa', deduplicar=False):
+    """
+    Modo streaming para CSVs grandes: lê o arquivo em blocos e mantém apenas as conversões.
+    Retorna os resultados, a mensagem de status e a contagem por etapa.
+    """
+    resultados, mensagem, contagem_por_etapa = get_parse_cache().get_or_compute(
+        ('app-streaming', coluna_conversao, valor_conversao, coluna_etapa, deduplicar, hash_uploaded_file(uploaded_file)),
+        lambda: analisar_conversao_em_blocos(io.BytesIO(uploaded_file.getvalue()), coluna_conversao, valor_conversao, coluna_etapa, deduplicar=deduplicar),
+    )
+
+    if not resultados.empty and STAGE_RESULT_COL not in resultados.columns:
         st.warning(f"Atenção: Coluna '{coluna_etapa}' não encontrada nos leads convertidos. A análise de conversão por etapa não será detalhada por etapa, apenas a lista de convertidos.")
-        cols_para_exibir_sem_etapa = ['Data-hora', 'Deal ID', 'Whatsapp', 'Mensagem', 'Deal name']
-        cols_existentes_sem_etapa = [col for col in cols_para_exibir_sem_etapa if col in leads_convertidos.columns]
-        
-        return leads_convertidos[cols_existentes_sem_etapa], f"Análise concluída. Coluna '{coluna_etapa}' não encontrada para detalhar por etapa."
 
-    # Seleciona as colunas relevantes para exibição
-    cols_para_exibir = ['Data-hora', 'Deal ID', 'Whatsapp', 'Mensagem', 'Deal name', coluna_etapa]
-    cols_existentes = [col for col in cols_para_exibir if col in leads_convertidos.columns]
-    
-    resultados = leads_convertidos[cols_existentes].copy()
-    resultados.rename(columns={coluna_etapa: 'Etapa de Conversão'}, inplace=True)
-    
-    mensagem_sucesso = "Análise de conversões concluída com sucesso!"
-    
-    return resultados, mensagem_sucesso
+    return resultados, mensagem, contagem_por_etapa
+
+def analisar_funil_web(uploaded_file, df, modo_streaming, coluna_conversao='Tipo', valor_conversao='Cancelado-Lead-Respondeu', coluna_etapa='Etapa'):
+    """
+    Funil por etapa (alcance, conversão e tempo até a resposta por Deal ID), calculado
+    uma vez por arquivo. No modo streaming, o CSV é lido em blocos.
+    Retorna a tabela do funil, os tempos de resposta e a mensagem de status.
+    """
+    if modo_streaming:
+        calcular = lambda: funil_em_blocos(io.BytesIO(uploaded_file.getvalue()), coluna_conversao, valor_conversao, coluna_etapa)
+    else:
+        calcular = lambda: funil_por_etapa(df, coluna_conversao, valor_conversao, coluna_etapa)
+    return get_parse_cache().get_or_compute(
+        ('app-funil', modo_streaming, coluna_conversao, valor_conversao, coluna_etapa, hash_uploaded_file(uploaded_file)),
+        calcular,
+    )
+
+# CSVs a partir deste tamanho abrem com o modo streaming já marcado
+LIMITE_STREAMING_MB = 50
 
 # --- Configuração e Layout da Aplicação Streamlit ---
 st.set_page_config(
@@ -47,6 +105,8 @@ st.set_page_config(
     layout="wide", # Usa a largura total da tela
     initial_sidebar_state="auto"
 )
+# Tempo, linhas e memória de cada etapa desta execução (painel na barra lateral / log JSON)
+diagnostics = start_run('app')
 
 st.title("📊 Leanzinho analisa planilha! ")
 
@@ -68,70 +128,104 @@ uploaded_file = st.file_uploader("Arraste e solte ou clique para selecionar seu
 if uploaded_file is not None:
     # Lendo o arquivo carregado
     try:
+        # Parâmetros para a análise (mantidos fixos com base na sua descrição)
+        coluna_conversao_padrao = 'Tipo'
+        valor_conversao_padrao = 'Cancelado-Lead-Respondeu'
+        coluna_etapa_padrao = 'Etapa'
+
+        modo_streaming = False
         if uploaded_file.name.endswith('.csv'):
-            df_input = pd.read_csv(uploaded_file)
-        elif uploaded_file.name.endswith('.xlsx'):
-            df_input = pd.read_excel(uploaded_file)
+            modo_streaming = st.checkbox(
+                "Modo streaming (CSV grande)",
+                value=uploaded_file.size >= LIMITE_STREAMING_MB * 1024 * 1024,
+                help="Lê o CSV em blocos e mantém na memória apenas os leads convertidos. Indicado para logs com milhões de linhas."
+            )
+        deduplicar = st.checkbox(
+            "Contar cada lead uma vez (mesmo Deal ID ou Whatsapp)",
+            value=False,
+            help="Mantém só a primeira conversão de cada lead; telefones são comparados só pelos dígitos."
+        )
+
+        if modo_streaming:
+            # Só as primeiras linhas para a prévia; a análise lê o arquivo em blocos
+            df_input = pd.read_csv(io.BytesIO(uploaded_file.getvalue()), nrows=5)
+            relatorio_memoria = None
+        else:
+            # A planilha é lida uma única vez por conteúdo; as reexecuções reutilizam o cache
+            with stage('carregar planilha') as record:
+                df_input, relatorio_memoria = get_parse_cache().get_or_compute(
+                    ('app', uploaded_file.name.rsplit('.', 1)[-1], hash_uploaded_file(uploaded_file)),
+                    lambda: carregar_planilha(uploaded_file),
+                )
+                record['rows_out'] = len(df_input)
         
         st.success("✅ Planilha carregada com sucesso!")
         st.info(f"Nome do arquivo: **{uploaded_file.name}**")
+        if relatorio_memoria is not None:
+            st.caption(format_memory_report(relatorio_memoria))
         
         st.subheader("Prévia das Primeiras Linhas da Planilha")
         st.dataframe(df_input.head(), use_container_width=True)
 
-        # Parâmetros para a análise (mantidos fixos com base na sua descrição)
-        coluna_conversao_padrao = 'Tipo'
-        valor_conversao_padrao = 'Cancelado-Lead-Respondeu'
-        coluna_etapa_padrao = 'Etapa'
-
         # Executando a análise
-        with st.spinner("Analisando as conversões..."):
-            df_conversoes, mensagem_status = analisar_conversao_por_etapa_web(
-                df_input,
-                coluna_conversao=coluna_conversao_padrao,
-                valor_conversao=valor_conversao_padrao,
-                coluna_etapa=coluna_etapa_padrao
-            )
+        contagem_por_etapa = None
+        with st.spinner("Analisando as conversões..."), stage('analisar conversões', None if modo_streaming else df_input) as record:
+            if modo_streaming:
+                df_conversoes, mensagem_status, contagem_por_etapa = analisar_conversao_em_blocos_web(
+                    uploaded_file,
+                    coluna_conversao=coluna_conversao_padrao,
+                    valor_conversao=valor_conversao_padrao,
+                    coluna_etapa=coluna_etapa_padrao,
+                    deduplicar=deduplicar
+                )
+            else:
+                df_conversoes, mensagem_status = analisar_conversao_por_etapa_web(
+                    df_input,
+                    coluna_conversao=coluna_conversao_padrao,
+                    valor_conversao=valor_conversao_padrao,
+                    coluna_etapa=coluna_etapa_padrao,
+                    deduplicar=deduplicar
+                )
+            record['rows_out'] = len(df_conversoes)
         
         st.markdown(f"**Status da Análise:** _{mensagem_status}_")
 
+        # Filtro por etapa: o índice é montado uma vez por resultado da análise
+        selecao_etapas = {}
+        if STAGE_RESULT_COL in df_conversoes.columns:
+            indice_etapas = get_parse_cache().get_or_compute(
+                ('app-filtro', modo_streaming, deduplicar, hash_uploaded_file(uploaded_file)),
+                lambda: FilterIndex(df_conversoes, [STAGE_RESULT_COL]),
+            )
+            st.sidebar.header("Filtros")
+            selecao_etapas = render_filters(st.sidebar, indice_etapas, {STAGE_RESULT_COL: "Etapa"}, st.session_state, key='app-filter')
+            if selecao_etapas:
+                df_conversoes = indice_etapas.select(df_conversoes, selecao_etapas)
+                if contagem_por_etapa is not None:
+                    contagem_por_etapa = contagem_por_etapa[contagem_por_etapa.index.isin(selecao_etapas[STAGE_RESULT_COL])]
+
         if not df_conversoes.empty:
             # Dividir a tela em colunas para organizar o dashboard
             col1, col2 = st.columns([1, 2]) # Uma coluna menor para o resumo e uma maior para os detalhes
 
             with col1:
                 # O erro da imagem estava aqui: df_conversoes['Etapa de Conversão'] é a Series para contagem
-                if 'Etapa de Conversão' in df_conversoes.columns:
+                if STAGE_RESULT_COL in df_conversoes.columns:
                     st.subheader("📊 Resumo por Etapa")
                     
-                    contagem_por_etapa = df_conversoes['Etapa de Conversão'].value_counts().sort_index()
-                    total_conversoes = contagem_por_etapa.sum()
-
-                    if total_conversoes > 0:
-                        porcentagem_por_etapa = (contagem_por_etapa / total_conversoes * 100).round(2)
-                        
-                        # Cria o DataFrame de resumo com os nomes de coluna explícitos
-                        df_resumo = pd.DataFrame({
-                            'Etapa': contagem_por_etapa.index, # Garante que 'Etapa' é o nome da coluna das categorias
-                            'Conversões': contagem_por_etapa.values,
-                            'Percentual (%)': porcentagem_por_etapa.values
-                        })
-                        
+                    with stage('resumo por etapa', df_conversoes):
+                        df_resumo = resumo_por_etapa(df_conversoes, contagem_por_etapa)
+
+                    if not df_resumo.empty:
                         st.dataframe(df_resumo, use_container_width=True)
 
                         st.markdown("---")
                         st.subheader("Gráfico de Distribuição")
                         # Usando Plotly Express para um gráfico de pizza interativo
-                        fig = px.pie(
-                            df_resumo,             # Passa o DataFrame df_resumo
-                            values='Conversões',   # Coluna para os valores
-                            names='Etapa',         # Coluna para os nomes/rótulos das fatias (AQUI ESTAVA O PONTO CRÍTICO)
-                            title='Distribuição de Conversões por Etapa',
-                            hole=0.4, # Para fazer um gráfico de rosca
-                            hover_data=['Percentual (%)'] # Mostra a porcentagem ao passar o mouse
-                        )
-                        fig.update_traces(textposition='inside', textinfo='percent+label')
-                        st.plotly_chart(fig, use_container_width=True) # Exibe o gráfico do Plotly
+                        with stage('gráfico de distribuição'):
+                            # Etapas além das maiores vão para "Outros"; a figura só é refeita quando o resumo muda
+                            fig = grafico_conversoes_por_etapa(df_resumo)
+                            st.plotly_chart(fig, use_container_width=True) # Exibe o gráfico do Plotly
                     else:
                         st.warning("Não há conversões para calcular porcentagens.")
                 else:
@@ -139,34 +233,81 @@ if uploaded_file is not None:
 
             with col2:
                 st.subheader("✅ Detalhes de Leads Convertidos")
-                st.dataframe(df_conversoes, use_container_width=True) # Tabela de detalhes ocupa a coluna maior
+                # Tabela de detalhes ocupa a coluna maior; só a página visível vai para o navegador
+                render_table(
+                    st, df_conversoes, 'conversoes',
+                    cache_key=('app-conversoes', modo_streaming, deduplicar, hash_uploaded_file(uploaded_file), freeze_selections(selecao_etapas)),
+                )
 
             # Opção para baixar os resultados (abaixo das colunas para melhor organização)
             st.markdown("---")
             st.subheader("📥 Baixar Relatórios")
             col_dl1, col_dl2 = st.columns(2)
 
+            # Os CSVs só são gerados quando o botão é clicado
             with col_dl1:
-                csv_detalhado = df_conversoes.to_csv(index=False).encode('utf-8')
                 st.download_button(
                     label="Baixar Leads Detalhados (CSV)",
-                    data=csv_detalhado,
+                    data=lambda: df_conversoes.to_csv(index=False).encode('utf-8'),
                     file_name="leads_convertidos_detalhados.csv",
                     mime="text/csv",
                     help="Baixa a tabela completa dos leads que converteram."
                 )
             
-            if 'Etapa de Conversão' in df_conversoes.columns and total_conversoes > 0:
+            if STAGE_RESULT_COL in df_conversoes.columns and not df_resumo.empty:
                 with col_dl2:
-                    csv_resumo = df_resumo.to_csv(index=False).encode('utf-8') # Salva o DataFrame com as porcentagens
                     st.download_button(
                         label="Baixar Resumo por Etapa (CSV)",
-                        data=csv_resumo,
+                        data=lambda: df_resumo.to_csv(index=False).encode('utf-8'), # Resumo com as porcentagens
                         file_name="resumo_conversoes_por_etapa.csv",
                         mime="text/csv",
                         help="Baixa a contagem e porcentagem de conversões por cada etapa da automação."
                     )
 
+        # Funil: quantos Deal IDs chegaram em cada etapa, quantos responderam nela e em quanto tempo
+        st.markdown("---")
+        st.subheader("🔻 Funil da Automação")
+        with st.spinner("Calculando o funil..."), stage('funil', None if modo_streaming else df_input) as record:
+            df_funil, df_tempos, mensagem_funil = analisar_funil_web(
+                uploaded_file,
+                df_input,
+                modo_streaming,
+                coluna_conversao=coluna_conversao_padrao,
+                valor_conversao=valor_conversao_padrao,
+                coluna_etapa=coluna_etapa_padrao
+            )
+            record['rows_out'] = len(df_funil)
+        if selecao_etapas and not df_funil.empty:
+            # Só as etapas escolhidas no filtro
+            etapas = selecao_etapas[STAGE_RESULT_COL]
+            df_funil = df_funil[df_funil['Etapa'].isin(etapas)]
+            df_tempos = df_tempos[df_tempos['Etapa'].isin(etapas)]
+
+        if df_funil.empty:
+            st.info(mensagem_funil)
+        else:
+            st.dataframe(df_funil, use_container_width=True)
+            col_funil1, col_funil2 = st.columns(2)
+            with col_funil1:
+                fig_funil = grafico_funil(df_funil)
+                st.plotly_chart(fig_funil, use_container_width=True)
+            with col_funil2:
+                if not df_tempos.empty:
+                    # Só os quartis e limites de cada etapa vão para o gráfico, não um ponto por resposta
+                    estatisticas = box_stats(df_tempos, 'Etapa', RESPONSE_HOURS_COL)
+                    fig_tempos = cached_figure(
+                        'app-tempos', estatisticas,
+                        lambda: box_figure(
+                            estatisticas,
+                            order=list(df_funil['Etapa']),
+                            title='Tempo até a resposta por etapa (horas)',
+                            x_title='Etapa',
+                            y_title=RESPONSE_HOURS_COL,
+                        ),
+                        order=list(df_funil['Etapa']),
+                    )
+                    st.plotly_chart(fig_tempos, use_container_width=True)
+
     except pd.errors.EmptyDataError:
         st.error("❌ Erro: O arquivo carregado está vazio ou mal formatado. Por favor, verifique o conteúdo.")
     except Exception as e:
@@ -174,4 +315,7 @@ if uploaded_file is not None:
         st.warning("Por favor, verifique se o arquivo está no formato correto e se as colunas esperadas (como 'Tipo', 'Etapa', 'Data-hora', 'Deal ID', etc.) estão presentes e com os nomes exatos.")
 
 st.markdown("---")
-st.markdown("Desenvolvido pelo seu melhor estagiario Leanito")
\ No newline at end of file
+st.markdown("Desenvolvido pelo seu melhor estagiario Leanito")
+
+render_panel(st.sidebar, diagnostics)
+diagnostics.finish()
\ No newline at end of file
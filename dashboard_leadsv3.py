@@ -1,13 +1,52 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from io import BytesIO
+
+from leads.cache import get_parse_cache
+from leads.charts import DEFAULT_TOP_N, category_pie, monthly_line, segment_bar
+from leads.dates import DATE_FORMAT_CHOICES, dropped_rows, format_date_report, format_label
+from leads.diagnostics import render_panel, stage, start_run
+from leads.dtypes import format_memory_report
+from leads.excel import DEFAULT_SHEETS
+from leads.export import EXPORT_FORMATS, get_export_manager
+from leads.filters import filter_cells, freeze_selections, render_filters
+from leads.monthly import monthly_rollup, monthly_rollup_from_frame, monthly_segment_situation, monthly_summary
+from leads.pipeline import (
+    DEFAULT_DATE_FORMAT,
+    DEFAULT_DEDUPE,
+    FILTER_COLUMNS,
+    LEAD_COLUMNS,
+    TARGET_DATE_COL,
+    TARGET_SEGMENT_COL,
+    TARGET_STATUS_COL,
+    TARGET_SITUATION_COL,
+    category_counts,
+    ingest_spreadsheet,
+    load_leads_cached,
+    load_store_leads,
+    period_cached,
+    rollup_category_counts,
+    rollup_segment_breakdown,
+    rollup_situation_counts,
+    segment_breakdown,
+    select_leads,
+    situation_counts,
+    unqualified_leads,
+)
+from leads.registry import get_dataset_registry
+from leads.rules import excluded_keywords_label, get_rules
+from leads.store import get_lead_store
+from leads.table import render_table
+
+DEDUPE_OPTIONS = {'first': "Manter o primeiro", 'last': "Manter o último", 'off': "Não remover"}
+# While an export is being generated, the export panel checks on it every this many seconds
+EXPORT_POLL_SECONDS = 1.0
 
 st.set_page_config(
     page_title="Dashboard de Análise de Leads",
     page_icon="📊",
     layout="wide"
 )
+# Timing, rows and memory of each step of this rerun (sidebar panel / JSON log)
+diagnostics = start_run('dashboard_leadsv3')
 
 st.title("☕ Sistema de compilação de leads!")
 st.markdown("""
@@ -15,125 +54,123 @@ Compilador de leads, comparativo mês a mês por oportunidade e segmentos.
 """)
 
 st.sidebar.header("Upload da Planilha Excel")
+lead_store = get_lead_store()
 uploaded_file = st.sidebar.file_uploader(
-    "Arraste e solte sua planilha Excel aqui", type=["xlsx", "xls"]
+    "Arraste e solte sua planilha Excel aqui", type=["xlsx", "xls"], accept_multiple_files=lead_store is not None
+)
+dedupe = st.sidebar.radio(
+    "Leads repetidos (mesmo telefone, e-mail ou Deal ID)",
+    list(DEDUPE_OPTIONS),
+    index=list(DEDUPE_OPTIONS).index(DEFAULT_DEDUPE if DEFAULT_DEDUPE in DEDUPE_OPTIONS else 'off'),
+    format_func=DEDUPE_OPTIONS.get,
 )
+date_format_choices = list(dict.fromkeys([*DATE_FORMAT_CHOICES, DEFAULT_DATE_FORMAT]))
+date_format = st.sidebar.selectbox(
+    "Formato da data de conversão",
+    date_format_choices,
+    index=date_format_choices.index(DEFAULT_DATE_FORMAT),
+    format_func=lambda fmt: format_label(fmt) if fmt else "Detectar automaticamente",
+)
+sheets = 'all' if st.sidebar.checkbox(
+    "Ler todas as abas da planilha", value=DEFAULT_SHEETS == 'all', help="As abas são juntadas numa tabela, com a coluna 'aba'."
+) else 'first'
+
+# One copy of each dataset per process: sessions on the same file share it, and
+# this session holds its current one until it switches files or ends
+dataset_registry = get_dataset_registry()
+if 'leads-registry-session' not in st.session_state:
+    st.session_state['leads-registry-session'] = dataset_registry.session()
+registry_session = st.session_state['leads-registry-session']
 
 df = None
-if uploaded_file:
+prepared = None
+if lead_store is not None:
+    # Local store (LEADS_STORE_PATH): each new workbook is appended once, the dashboard shows all of them
+    for store_file in uploaded_file or []:
+        try:
+            with stage('importar planilha na base local') as record:
+                ingested = ingest_spreadsheet(
+                    lead_store, store_file.name, store_file.getvalue(), date_format=date_format, sheets=sheets
+                )
+                record['rows_out'] = ingested['inserted']
+        except Exception as e:
+            st.sidebar.error(f"Erro ao carregar a planilha {store_file.name}: {e}")
+            continue
+        if ingested['missing_cols']:
+            st.sidebar.error(
+                f"{store_file.name}: colunas essenciais não encontradas: `{', '.join(ingested['missing_cols'])}`."
+            )
+        elif not ingested['already_imported']:
+            st.sidebar.success(
+                f"{store_file.name}: {ingested['inserted']} leads novos adicionados à base local "
+                f"({ingested['existing']} linhas já estavam nela)."
+            )
+    if lead_store.version:
+        with stage('carregar base local'):
+            prepared = load_store_leads(lead_store, dedupe=dedupe, session=registry_session)
+        st.sidebar.caption(f"Base local: {len(lead_store.sources())} planilhas importadas.")
+elif uploaded_file:
     try:
-        df = pd.read_excel(uploaded_file)
+        with stage('carregar planilha'):
+            # Only the columns the dashboard uses are read from the workbook
+            prepared = load_leads_cached(
+                uploaded_file.name, uploaded_file.getvalue(), dedupe=dedupe, date_format=date_format,
+                columns=LEAD_COLUMNS, sheets=sheets, session=registry_session,
+            )
         st.sidebar.success("Planilha carregada com sucesso!")
     except Exception as e:
         st.sidebar.error(f"Erro ao carregar a planilha: {e}")
 
-if df is not None:
-    def normalize_col_name(col_name):
-        return col_name.strip().lower().replace(' ', '_').replace('-', '_').replace('/', '_').replace(':', '')
-
-    TARGET_STATUS_COL = 'status'
-    TARGET_DATE_COL = 'data_da_conversao'
-    TARGET_SEGMENT_COL = 'segmento_categoria'
-    TARGET_SITUATION_COL = 'situacao'
-
-    potential_status_names = [normalize_col_name('Status'), normalize_col_name('status')]
-    potential_date_names = [normalize_col_name('Data da conversão:'), normalize_col_name('Data da conversão'), normalize_col_name('data_da_conversao')]
-    potential_segment_names = [normalize_col_name('Segmento/Categoria'), normalize_col_name('segmento_categoria')]
-    potential_situation_names = [normalize_col_name('Situação'), normalize_col_name('situacao')]
-
-    found_status_col = None
-    found_date_col = None
-    found_segment_col = None
-    found_situation_col = None
-
-    current_normalized_cols_map = {normalize_col_name(col): col for col in df.columns}
-
-    for norm_name, original_name in current_normalized_cols_map.items():
-        if norm_name in potential_status_names:
-            found_status_col = original_name
-        if norm_name in potential_date_names:
-            found_date_col = original_name
-        if norm_name in potential_segment_names:
-            found_segment_col = original_name
-        if norm_name in potential_situation_names:
-            found_situation_col = original_name
-
-    rename_dict = {}
-    if found_status_col and found_status_col != TARGET_STATUS_COL:
-        rename_dict[found_status_col] = TARGET_STATUS_COL
-    if found_date_col and found_date_col != TARGET_DATE_COL:
-        rename_dict[found_date_col] = TARGET_DATE_COL
-    if found_segment_col and found_segment_col != TARGET_SEGMENT_COL:
-        rename_dict[found_segment_col] = TARGET_SEGMENT_COL
-    if found_situation_col and found_situation_col != TARGET_SITUATION_COL:
-        rename_dict[found_situation_col] = TARGET_SITUATION_COL
-
+if prepared is None:
+    dataset_registry.release(registry_session, 'leads')
+else:
+    shared_sessions = dataset_registry.holders(prepared['cache_key'])
+    if shared_sessions > 1:
+        st.sidebar.caption(f"Mesma planilha aberta em {shared_sessions} sessões (uma cópia dos dados em memória).")
+    rename_dict = prepared['rename_dict']
     if rename_dict:
-        df.rename(columns=rename_dict, inplace=True)
         st.sidebar.markdown("Colunas renomeadas para padronização:")
         for original, new in rename_dict.items():
             st.sidebar.markdown(f"- `{original}` -> `{new}`")
     else:
         st.sidebar.markdown("As colunas essenciais já estão nos nomes padronizados ou não foram encontradas para renomeação explícita.")
 
-    required_columns_standardized = [TARGET_STATUS_COL, TARGET_DATE_COL, TARGET_SEGMENT_COL]
-
-    if not all(col in df.columns for col in required_columns_standardized):
-        missing_cols = [col for col in required_columns_standardized if col not in df.columns]
+    missing_cols = prepared['missing_cols']
+    if missing_cols:
         st.error(
             f"Erro: As seguintes colunas essenciais não foram encontradas na sua planilha "
             f"após a tentativa de padronização: `{', '.join(missing_cols)}`."
             f"Por favor, verifique se os nomes das colunas estão corretos na sua planilha "
             f"(`Status`, `Data da conversão:`, `Segmento/Categoria` ou variações próximas)."
-            f"Colunas encontradas no arquivo: {', '.join(df.columns)}"
+            f"Colunas encontradas no arquivo: {', '.join(prepared['original_columns'])}"
         )
-        df = None
-
-if df is not None:
-    if TARGET_DATE_COL in df.columns:
-        df[TARGET_DATE_COL] = pd.to_datetime(
-            df[TARGET_DATE_COL], errors='coerce'
-        )
-        df.dropna(subset=[TARGET_DATE_COL], inplace=True)
     else:
-        st.error(
-            f"Coluna '{TARGET_DATE_COL}' (Data da Conversão) não encontrada após padronização. "
-            "Verifique o nome da coluna na sua planilha."
-        )
-        df = None
+        df = prepared['df']
 
 if df is not None:
-    def classify_lead(status_value):
-        if pd.isna(status_value) or str(status_value).strip() == "" or str(status_value).strip().lower() == "sem qualificação":
-            return "⚠️ Sem qualificação"
-        elif str(status_value).strip().lower() == "válido":
-            return "✅ Válido"
-        elif str(status_value).strip().lower() == "inválido":
-            return "❌ Inválido"
-        else:
-            return "⚠️ Sem qualificação"
-
-    df['categoria_lead'] = df[TARGET_STATUS_COL].apply(classify_lead)
-
-    if TARGET_SEGMENT_COL in df.columns:
-        initial_rows = len(df)
-        df[TARGET_SEGMENT_COL] = df[TARGET_SEGMENT_COL].astype(str)
-
-        df = df[
-            ~df[TARGET_SEGMENT_COL].str.contains('duplicado', case=False, na=False) &
-            ~df[TARGET_SEGMENT_COL].str.contains('teste', case=False, na=False)
-        ].copy()
-
-        rows_removed = initial_rows - len(df)
-        if rows_removed > 0:
-            st.sidebar.info(f"Removidas {rows_removed} linhas de 'duplicado' ou 'teste' da coluna '{TARGET_SEGMENT_COL}'.")
-        else:
-            st.sidebar.info(f"Nenhuma linha de 'duplicado' ou 'teste' encontrada na coluna '{TARGET_SEGMENT_COL}'.")
+    rows_removed = prepared['rows_removed']
+    if rows_removed > 0:
+        st.sidebar.info(f"Removidas {rows_removed} linhas de {excluded_keywords_label()} da coluna '{TARGET_SEGMENT_COL}'.")
+    else:
+        st.sidebar.info(f"Nenhuma linha de {excluded_keywords_label()} encontrada na coluna '{TARGET_SEGMENT_COL}'.")
+    if prepared['duplicates_removed'] > 0:
+        st.sidebar.info(f"Removidos {prepared['duplicates_removed']} leads repetidos (mesmo telefone, e-mail ou Deal ID).")
+    date_report = prepared.get('date_report')
+    date_message = format_date_report(date_report, TARGET_DATE_COL) if date_report else ''
+    if date_message and dropped_rows(date_report):
+        st.sidebar.warning(date_message)
+    elif date_message:
+        st.sidebar.caption(date_message)
+    if prepared['memory']:
+        st.sidebar.caption(format_memory_report(prepared['memory']))
 
     st.sidebar.header("Filtros")
 
-    min_date = df[TARGET_DATE_COL].min().date()
-    max_date = df[TARGET_DATE_COL].max().date()
+    date_index = prepared['date_index']
+    filter_index = prepared['filter_index']
+    cube = prepared['cube']
+    min_date = date_index.min_date
+    max_date = date_index.max_date
 
     date_range = st.sidebar.date_input(
         "Selecione o período de conversão",
@@ -144,155 +181,240 @@ if df is not None:
 
     if len(date_range) == 2:
         start_date, end_date = date_range
-        df_filtered = df[
-            (df[TARGET_DATE_COL].dt.date >= start_date)
-            & (df[TARGET_DATE_COL].dt.date <= end_date)
-        ].copy()
+        start_pos, stop_pos = date_index.positions(start_date, end_date)
     else:
         st.sidebar.warning("Por favor, selecione um período de data válido.")
-        df_filtered = df.copy()
-
-    tab1, tab2 = st.tabs(["Visão Geral e Métricas", "Detalhamento por Segmento"])
-
-    with tab1:
-        st.header("Visão Geral e Métricas Principais")
-        st.markdown("---")
-
-        total_leads = len(df_filtered)
-        st.metric(label="Total de Leads (Período Selecionado)", value=total_leads)
-
-        if TARGET_SITUATION_COL in df_filtered.columns:
-            df_filtered[TARGET_SITUATION_COL] = df_filtered[TARGET_SITUATION_COL].astype(str)
-            
-            oportunidade_leads = df_filtered[
-                df_filtered[TARGET_SITUATION_COL].str.contains('oportunidade', case=False, na=False)
-            ]
-            st.metric(label="Leads com Situação 'Oportunidade'", value=len(oportunidade_leads))
+        start_date = end_date = None
+        start_pos, stop_pos = 0, len(df)
 
-            perdido_leads = df_filtered[
-                df_filtered[TARGET_SITUATION_COL].str.contains('perdido', case=False, na=False)
-            ]
-            st.metric(label="Leads com Situação 'Perdido'", value=len(perdido_leads)) # Nova métrica para Perdido
-        else:
-            st.info(f"Coluna '{TARGET_SITUATION_COL}' (Situação) não encontrada para contagem de 'Oportunidade' e 'Perdido'.")
+    # Value filters; each option shows its leads in the period under the other filters
+    selections = render_filters(st.sidebar, filter_index, FILTER_COLUMNS, st.session_state, start_pos, stop_pos)
 
-        if total_leads > 0:
-            lead_counts = df_filtered['categoria_lead'].value_counts()
-            lead_percentages = df_filtered['categoria_lead'].value_counts(normalize=True) * 100
+    with stage('filtrar período', df) as record:
+        df_filtered = filter_index.select(df, selections, start_pos, stop_pos)
+        record['rows_out'] = len(df_filtered)
+    rollup = filter_cells(cube.query(start_date, end_date), selections) if cube is not None else None
 
-            st.subheader("Classificação de Leads")
-            col1, col2 = st.columns(2)
-            with col1:
-                st.markdown("**Contagem de Leads por Categoria**")
-                st.dataframe(lead_counts.reset_index().rename(columns={'index': 'Categoria', 'categoria_lead': 'Contagem'}), hide_index=True)
-            with col2:
-                st.markdown("**Percentual de Leads por Categoria**")
-                st.dataframe(lead_percentages.reset_index().rename(columns={'index': 'Categoria', 'categoria_lead': 'Percentual (%)'}), hide_index=True, column_config={"Percentual (%)": st.column_config.ProgressColumn("Percentual (%)", format="%.2f %%", min_value=0, max_value=100)})
+    # Only the selected tab runs; its aggregations are memoized per data, period and filters
+    tab1, tab2, tab3 = st.tabs(
+        ["Visão Geral e Métricas", "Detalhamento por Segmento", "Comparativo Mês a Mês"], key='tab', on_change='rerun'
+    )
+    total_leads = len(df_filtered)
 
+    if tab1.open:
+        with tab1:
+            st.header("Visão Geral e Métricas Principais")
             st.markdown("---")
 
-            st.subheader("⚠️ Leads Sem Qualificação (Ação Prioritária)")
-            unqualified_leads = df_filtered[
-                df_filtered['categoria_lead'] == "⚠️ Sem qualificação"
-            ]
-            st.info(
-                f"Temos **{len(unqualified_leads)}** leads sem qualificação no período selecionado. "
-                "Revise esses leads para priorizar ações."
-            )
-            if not unqualified_leads.empty:
+            st.metric(label="Total de Leads (Período Selecionado)", value=total_leads)
+
+            if TARGET_SITUATION_COL in df_filtered.columns:
+                counts = period_cached(
+                    prepared, 'situation-counts', start_date, end_date,
+                    lambda: rollup_situation_counts(rollup) if rollup is not None else situation_counts(df_filtered),
+                    selections=selections,
+                )
+                for name, count in counts.items():
+                    st.metric(label=f"Leads com Situação '{name}'", value=count)
+            else:
+                st.info(f"Coluna '{TARGET_SITUATION_COL}' (Situação) não encontrada para contagem de 'Oportunidade' e 'Perdido'.")
+
+            if total_leads > 0:
+                with stage('contar categorias', df_filtered):
+                    lead_counts, lead_percentages = period_cached(
+                        prepared, 'category-counts', start_date, end_date,
+                        lambda: rollup_category_counts(rollup) if rollup is not None else category_counts(df_filtered),
+                        selections=selections,
+                    )
+
+                st.subheader("Classificação de Leads")
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown("**Contagem de Leads por Categoria**")
+                    st.dataframe(lead_counts.reset_index().rename(columns={'index': 'Categoria', 'categoria_lead': 'Contagem'}), hide_index=True)
+                with col2:
+                    st.markdown("**Percentual de Leads por Categoria**")
+                    st.dataframe(lead_percentages.reset_index().rename(columns={'index': 'Categoria', 'categoria_lead': 'Percentual (%)'}), hide_index=True, column_config={"Percentual (%)": st.column_config.ProgressColumn("Percentual (%)", format="%.2f %%", min_value=0, max_value=100)})
+
+                st.markdown("---")
+
+                st.subheader("⚠️ Leads Sem Qualificação (Ação Prioritária)")
                 display_cols_candidates = ['nome', 'e-mail', 'telefone', TARGET_SEGMENT_COL, TARGET_STATUS_COL, TARGET_DATE_COL, TARGET_SITUATION_COL, 'categoria_lead']
                 display_cols = [col for col in display_cols_candidates if col in df_filtered.columns]
-                st.dataframe(unqualified_leads[display_cols])
+                with stage('leads sem qualificação', df_filtered) as record:
+                    unqualified = period_cached(
+                        prepared, 'unqualified', start_date, end_date, lambda: unqualified_leads(df_filtered)[display_cols],
+                        selections=selections,
+                    )
+                    record['rows_out'] = len(unqualified)
+                st.info(
+                    f"Temos **{len(unqualified)}** leads sem qualificação no período selecionado. "
+                    "Revise esses leads para priorizar ações."
+                )
+                if not unqualified.empty:
+                    # Only the visible page goes to the browser; search and sort run here
+                    render_table(st, unqualified, 'unqualified', cache_key=(prepared['cache_key'], start_date, end_date, freeze_selections(selections)))
+                else:
+                    st.markdown("Nenhum lead 'Sem qualificação' encontrado no período selecionado.")
+
+                st.markdown("---")
+
+                st.subheader("Distribuição de Leads por Categoria")
+                with stage('gráfico de pizza'):
+                    # Built once per distinct set of counts; reruns reuse the cached figure
+                    fig_pie = category_pie(lead_counts)
+                    st.plotly_chart(fig_pie, use_container_width=True)
+
             else:
-                st.markdown("Nenhum lead 'Sem qualificação' encontrado no período selecionado.")
+                st.warning("Nenhum lead encontrado para o período selecionado.")
 
+    if tab2.open:
+        with tab2:
+            st.header("Análise Detalhada por Segmento/Categoria")
             st.markdown("---")
 
-            st.subheader("Distribuição de Leads por Categoria")
-            fig_pie = px.pie(
-                names=lead_counts.index,
-                values=lead_counts.values,
-                title="Distribuição das Categorias de Leads",
-                color=lead_counts.index,
-                color_discrete_map={
-                    '✅ Válido': 'green',
-                    '❌ Inválido': 'red',
-                    '⚠️ Sem qualificação': 'orange'
-                }
-            )
-            fig_pie.update_traces(textinfo='percent+label', pull=[0.1 if cat == '⚠️ Sem qualificação' else 0 for cat in lead_counts.index])
-            st.plotly_chart(fig_pie, use_container_width=True)
-
-        else:
-            st.warning("Nenhum lead encontrado para o período selecionado.")
-
-    with tab2:
-        st.header("Análise Detalhada por Segmento/Categoria")
-        st.markdown("---")
-
-        if total_leads > 0 and TARGET_SEGMENT_COL in df_filtered.columns:
-            segment_analysis = df_filtered.groupby(TARGET_SEGMENT_COL)[
-                'categoria_lead'
-            ].value_counts().unstack(fill_value=0)
-
-            segment_analysis['Total'] = segment_analysis.sum(axis=1)
-            segment_analysis = segment_analysis.sort_values(
-                by='Total', ascending=False
-            )
-
-            st.subheader("Contagem de Leads por Segmento e Categoria")
-            st.dataframe(segment_analysis)
+            if total_leads > 0 and TARGET_SEGMENT_COL in df_filtered.columns:
+                with stage('contar por segmento', df_filtered) as record:
+                    segment_analysis = period_cached(
+                        prepared, 'segments', start_date, end_date,
+                        lambda: rollup_segment_breakdown(rollup) if rollup is not None else segment_breakdown(df_filtered),
+                        selections=selections,
+                    )
+                    record['rows_out'] = len(segment_analysis)
+
+                st.subheader("Contagem de Leads por Segmento e Categoria")
+                st.dataframe(segment_analysis)
+
+                st.markdown("---")
+
+                st.subheader("Distribuição de Leads por Segmento")
+                top_segments = st.number_input(
+                    "Segmentos no gráfico (os demais são somados em \"Outros\")",
+                    min_value=1, value=DEFAULT_TOP_N, step=1,
+                )
+                with stage('gráfico de barras', len(segment_analysis)):
+                    # Stacked bars for the largest segments only: the long tail of free-text segments goes to "Outros"
+                    fig_bar_segment = segment_bar(segment_analysis, top_segments)
+                    st.plotly_chart(fig_bar_segment, use_container_width=True)
+
+            elif total_leads > 0 and TARGET_SEGMENT_COL not in df_filtered.columns:
+                st.warning(f"Coluna '{TARGET_SEGMENT_COL}' (Segmento/Categoria) não encontrada para análise por segmento.")
+            else:
+                st.warning("Nenhum lead encontrado para o período selecionado para análise por segmento.")
 
+    if tab3.open:
+        with tab3:
+            st.header("Comparativo Mês a Mês")
             st.markdown("---")
 
-            st.subheader("Distribuição de Leads por Segmento")
-            fig_bar_segment = px.bar(
-                segment_analysis.drop(columns='Total'),
-                x=segment_analysis.index,
-                y=segment_analysis.drop(columns='Total').columns,
-                title="Contagem de Leads por Segmento e Categoria",
-                labels={'value': 'Número de Leads', TARGET_SEGMENT_COL: 'Segmento/Categoria'},
-                color_discrete_map={
-                    '✅ Válido': 'green',
-                    '❌ Inválido': 'red',
-                    '⚠️ Sem qualificação': 'orange'
-                }
-            )
-            fig_bar_segment.update_layout(barmode='stack')
-            st.plotly_chart(fig_bar_segment, use_container_width=True)
-
-        elif total_leads > 0 and TARGET_SEGMENT_COL not in df_filtered.columns:
-            st.warning(f"Coluna '{TARGET_SEGMENT_COL}' (Segmento/Categoria) não encontrada para análise por segmento.")
-        else:
-            st.warning("Nenhum lead encontrado para o período selecionado para análise por segmento.")
+            if total_leads > 0:
+                with stage('comparativo mensal', df_filtered) as record:
+                    monthly = period_cached(
+                        prepared, 'monthly', start_date, end_date,
+                        lambda: filter_cells(monthly_rollup(cube, start_date, end_date), selections) if cube is not None else monthly_rollup_from_frame(df_filtered),
+                        selections=selections,
+                    )
+                    summary = period_cached(
+                        prepared, 'monthly-summary', start_date, end_date, lambda: monthly_summary(monthly), selections=selections
+                    )
+                    monthly_table = summary.rename(index=str)
+                    record['rows_out'] = len(monthly_table)
+
+                st.subheader("Leads por Mês")
+                st.dataframe(monthly_table)
+
+                count_columns = [col for col in ['Leads', 'Válidos', 'Inválidos', 'Sem qualificação', *get_rules()['flags']] if col in monthly_table.columns]
+                with stage('gráfico mensal'):
+                    # Quarterly or yearly points when there are too many months for the chart width
+                    fig_monthly = monthly_line(summary, count_columns)
+                    st.plotly_chart(fig_monthly, use_container_width=True)
+
+                if TARGET_SITUATION_COL in df_filtered.columns:
+                    st.markdown("---")
+                    st.subheader("Oportunidade e Perdido por Segmento")
+                    selected_situation = st.radio("Situação", list(get_rules()['flags']), horizontal=True)
+                    segment_monthly = monthly_segment_situation(monthly, selected_situation)
+                    if segment_monthly.empty:
+                        st.info(f"Nenhum lead com situação '{selected_situation}' no período selecionado.")
+                    else:
+                        st.dataframe(segment_monthly)
+            else:
+                st.warning("Nenhum lead encontrado para o período selecionado para o comparativo mês a mês.")
 
     st.sidebar.markdown("---")
     st.sidebar.header("Exportar Dados Processados")
 
-    @st.cache_data
-    def convert_df_to_excel(df_to_export):
-        output = BytesIO()
-        writer = pd.ExcelWriter(output, engine='xlsxwriter')
-        df_to_export.to_excel(writer, index=False, sheet_name='Leads Processados')
-        writer.close()
-        processed_data = output.getvalue()
-        return processed_data
-
     if df is not None and not df_filtered.empty:
-        excel_data = convert_df_to_excel(df_filtered)
-        st.sidebar.download_button(
-            label="Download Dados Processados (Excel)",
-            data=excel_data,
-            file_name="leads_processados.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        # Generated on request in a background thread, to a file on disk,
+        # keyed by file hash + period + filters (no hashing of the frame)
+        export_format = st.sidebar.radio(
+            "Formato", list(EXPORT_FORMATS), format_func=lambda fmt: EXPORT_FORMATS[fmt][0], horizontal=True
         )
+        export_label, export_mime = EXPORT_FORMATS[export_format]
+        export_key = (prepared['cache_key'], str(start_date), str(end_date), freeze_selections(selections), export_format)
+        if lead_store is not None:
+            export_frame = df_filtered # The local store keeps every column of the spreadsheets
+        else:
+            # The dashboard reads only the lead columns; the export loads the spreadsheet with all of them
+            export_frame = lambda: select_leads(
+                load_leads_cached(
+                    uploaded_file.name, uploaded_file.getvalue(), dedupe=dedupe, date_format=date_format, sheets=sheets,
+                ),
+                start_date, end_date, selections,
+            )
+        export_manager = get_export_manager()
+        export_job = export_manager.get(export_key)
+        export_pending = export_job is not None and not export_job.done()
+
+        # Only the panel reruns while the export is in progress, polling the background job
+        @st.fragment(run_every=EXPORT_POLL_SECONDS if export_pending else None)
+        def export_panel():
+            job = export_manager.get(export_key)
+            if job is None or (job.done() and job.exception() is not None):
+                if job is not None:
+                    st.error(f"Erro ao gerar o arquivo: {job.exception()}")
+                if st.button(f"Gerar arquivo ({export_label})"):
+                    export_manager.submit(export_key, export_frame, export_format)
+                    st.rerun()
+            elif not job.done():
+                st.info("Gerando o arquivo em segundo plano...")
+            elif export_pending:
+                st.rerun()  # Ready: a full rerun stops the polling and shows the download
+            else:
+                st.download_button(
+                    label=f"Download Dados Processados ({export_label})",
+                    data=lambda: export_manager.read(export_key),
+                    file_name=f"leads_processados.{export_format}",
+                    mime=export_mime,
+                    on_click='ignore',
+                )
+
+        with st.sidebar:
+            export_panel()
     elif df is not None and df_filtered.empty:
         st.sidebar.warning("Nenhum dado processado para download no período selecionado.")
     else:
         st.sidebar.info("Carregue uma planilha para exportar os dados processados.")
 
+    if cube is not None:
+        def cube_csv():
+            return get_parse_cache().get_or_compute(
+                ('cube_csv', prepared['cache_key']),
+                lambda: cube.to_frame().to_csv(index=False).encode('utf-8'),
+            )
+        st.sidebar.download_button(
+            label="Download Cubo de Agregação Diária (CSV)",
+            data=cube_csv,
+            file_name="leads_cubo_diario.csv",
+            mime="text/csv",
+            on_click='ignore',
+        )
+
 else:
     st.info("Por favor, carregue sua planilha Excel na barra lateral para começar a análise.")
 
 st.markdown("---")
-st.markdown("Feito por Leanito")
\ No newline at end of file
+st.markdown("Feito por Leanito")
+
+render_panel(st.sidebar, diagnostics)
+diagnostics.finish()
\ No newline at end of file
@@ -0,0 +1,6 @@
+"""
+Núcleo de processamento de leads usado pelos dashboards Streamlit e pelo app.py.
+
+Os módulos deste pacote não dependem do Streamlit, para que possam ser
+reutilizados fora das reexecuções da interface.
+"""
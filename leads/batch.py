@@ -0,0 +1,216 @@
+"""
+Processamento em lote, sem interface, de uma pasta de planilhas de leads.
+
+Executa o mesmo pipeline do dashboard_leadsv3.py (padronização das colunas,
+classificação, remoção de duplicado/teste, detalhamento por segmento e contagem
+de oportunidade/perdido) em cada arquivo, em paralelo num pool de processos.
+
+Uso:
+    python -m leads.batch PASTA_ENTRADA -o PASTA_SAIDA [--workers N] [--export-leads]
+                          [--columnar-cache PASTA_CACHE] [--date-format FORMATO]
+
+Saídas (as de cada planilha na mesma subpasta relativa da entrada, com a
+extensão no nome: vendas/jan.xlsx -> vendas/jan_xlsx_segmentos.csv):
+    <arquivo>_<ext>_segmentos.csv     detalhamento por segmento de cada planilha
+    <arquivo>_<ext>_processado.xlsx   leads processados (com --export-leads)
+    resumo.csv                        uma linha por planilha, com as contagens
+    segmentos_combinados.csv          detalhamento por segmento somando todas as planilhas
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from leads.classify import CATEGORIA_INVALIDO, CATEGORIA_SEM_QUALIFICACAO, CATEGORIA_VALIDO
+from leads.columnar import get_columnar_cache
+from leads.export import write_excel
+from leads.pipeline import (
+    CATEGORY_COL,
+    DEFAULT_DATE_FORMAT,
+    LEAD_COLUMNS,
+    TARGET_SITUATION_COL,
+    load_leads,
+    segment_breakdown,
+    situation_counts,
+)
+
+SUPPORTED_SUFFIXES = ('.xlsx', '.xls', '.csv')
+
+# Categoria -> coluna do resumo
+SUMMARY_CATEGORY_COLUMNS = {
+    CATEGORIA_VALIDO: 'validos',
+    CATEGORIA_INVALIDO: 'invalidos',
+    CATEGORIA_SEM_QUALIFICACAO: 'sem_qualificacao',
+}
+
+
+def find_spreadsheets(input_dir, recursive=False):
+    pattern = '**/*' if recursive else '*'
+    return sorted(
+        path for path in Path(input_dir).glob(pattern)
+        if path.is_file() and path.suffix.lower() in SUPPORTED_SUFFIXES and not path.name.startswith('~$')
+    )
+
+
+def output_stem(path, input_dir=None):
+    """
+    Prefixo das saídas de uma planilha, relativo à pasta de saída: o caminho
+    relativo a `input_dir` com a extensão no nome, para que planilhas de mesmo
+    nome em subpastas diferentes (ou a.xlsx e a.csv) não se sobrescrevam.
+    """
+    path = Path(path)
+    relative = path.relative_to(input_dir) if input_dir is not None else Path(path.name)
+    return relative.parent / f"{relative.stem}_{relative.suffix.lstrip('.').lower()}"
+
+
+def summarize(prepared):
+    """Contagens da linha do resumo e detalhamento por segmento de uma planilha processada."""
+    df = prepared['df']
+    summary = {
+        'total_leads': len(df),
+        'linhas_removidas': prepared['rows_removed'],
+        'duplicados': prepared['duplicates_removed'],
+        'datas_invalidas': prepared['invalid_dates'],
+        'formato_data': (prepared.get('date_report') or {}).get('format') or '',
+    }
+
+    lead_counts = df[CATEGORY_COL].value_counts()
+    for categoria, column in SUMMARY_CATEGORY_COLUMNS.items():
+        summary[column] = int(lead_counts.get(categoria, 0))
+
+    if TARGET_SITUATION_COL in df.columns:
+        for name, count in situation_counts(df).items():
+            summary[name.lower()] = count
+    return summary, segment_breakdown(df)
+
+
+def process_file(path, output_dir, export_leads=False, columnar_cache_dir=None, date_format=DEFAULT_DATE_FORMAT,
+                 input_dir=None):
+    """
+    Processa uma planilha e grava as saídas individuais (ver `output_stem`).
+    Retorna a linha do resumo e o detalhamento por segmento (None se a planilha
+    não foi processada). Erros ficam na coluna 'erro' do resumo, sem
+    interromper o lote.
+    """
+    path = Path(path)
+    summary = {'arquivo': str(path.relative_to(input_dir) if input_dir is not None else path.name), 'erro': ''}
+    started = time.perf_counter()
+    try:
+        prepared = load_leads(
+            path.name,
+            path.read_bytes(),
+            columnar_cache=get_columnar_cache(columnar_cache_dir) if columnar_cache_dir else None,
+            source=str(path.resolve()),
+            date_format=date_format,
+            # Sem exportar os leads, só as colunas usadas no resumo são lidas
+            columns=None if export_leads else LEAD_COLUMNS,
+        )
+    except Exception as e:
+        summary['erro'] = f"Erro ao carregar a planilha: {e}"
+        return summary, None
+
+    if prepared['missing_cols']:
+        summary['erro'] = f"Colunas essenciais não encontradas: {', '.join(prepared['missing_cols'])}"
+        return summary, None
+
+    try:
+        counts, segments = summarize(prepared)
+        stem = Path(output_dir) / output_stem(path, input_dir)
+        stem.parent.mkdir(parents=True, exist_ok=True)
+        segments.to_csv(f"{stem}_segmentos.csv")
+        if export_leads:
+            write_excel(prepared['df'], f"{stem}_processado.xlsx")
+    except Exception as e:
+        summary['erro'] = f"Erro ao processar a planilha: {e}"
+        return summary, None
+
+    summary.update(counts)
+    summary['segundos'] = round(time.perf_counter() - started, 3)
+    return summary, segments
+
+
+def combine_segments(breakdowns):
+    """Soma os detalhamentos por segmento de várias planilhas."""
+    breakdowns = [b for b in breakdowns if b is not None]
+    if not breakdowns:
+        return pd.DataFrame()
+    combined = pd.concat(breakdowns).fillna(0).groupby(level=0).sum().astype(int)
+    return combined.sort_values(by='Total', ascending=False)
+
+
+def run_batch(paths, output_dir, workers=None, export_leads=False, columnar_cache_dir=None,
+              date_format=DEFAULT_DATE_FORMAT, input_dir=None):
+    """
+    Processa as planilhas em paralelo e grava o resumo e os segmentos combinados.
+    As saídas de cada planilha repetem o caminho dela relativo a `input_dir`.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if workers == 1 or len(paths) <= 1:
+        results = [
+            process_file(path, output_dir, export_leads, columnar_cache_dir, date_format, input_dir) for path in paths
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                process_file,
+                paths,
+                [output_dir] * len(paths),
+                [export_leads] * len(paths),
+                [columnar_cache_dir] * len(paths),
+                [date_format] * len(paths),
+                [input_dir] * len(paths),
+            ))
+
+    summary = pd.DataFrame([summary for summary, _ in results]).convert_dtypes()
+    summary.to_csv(output_dir / 'resumo.csv', index=False)
+    combine_segments([segments for _, segments in results]).to_csv(output_dir / 'segmentos_combinados.csv')
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m leads.batch',
+        description="Processa em lote uma pasta de planilhas de leads (.xlsx/.csv).",
+    )
+    parser.add_argument('input_dir', help="pasta com as planilhas")
+    parser.add_argument('-o', '--output-dir', default='saida_leads', help="pasta de saída (padrão: saida_leads)")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help="número de processos (padrão: número de CPUs)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="procura planilhas também nas subpastas")
+    parser.add_argument('--export-leads', action='store_true', help="grava também os leads processados de cada planilha em .xlsx")
+    parser.add_argument('--columnar-cache', metavar='PASTA_CACHE', help="guarda uma cópia Parquet de cada planilha padronizada e a reutiliza nas próximas execuções")
+    parser.add_argument('--date-format', default=DEFAULT_DATE_FORMAT, metavar='FORMATO', help="formato da data de conversão, ex.: %%d/%%m/%%Y (padrão: detectado em cada planilha)")
+    args = parser.parse_args(argv)
+
+    paths = find_spreadsheets(args.input_dir, recursive=args.recursive)
+    if not paths:
+        print(f"Nenhuma planilha (.xlsx, .xls, .csv) encontrada em {args.input_dir}", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    summary = run_batch(
+        paths,
+        args.output_dir,
+        workers=args.workers,
+        export_leads=args.export_leads,
+        columnar_cache_dir=args.columnar_cache,
+        date_format=args.date_format,
+        input_dir=args.input_dir,
+    )
+    failed = summary[summary['erro'] != '']
+    print(
+        f"{len(paths) - len(failed)} de {len(paths)} planilhas processadas em "
+        f"{time.perf_counter() - started:.1f}s. Resultados em {args.output_dir}"
+    )
+    for _, row in failed.iterrows():
+        print(f"- {row['arquivo']}: {row['erro']}", file=sys.stderr)
+    return 0 if failed.empty else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Benchmark das etapas do pipeline com planilhas sintéticas.
+
+Gera (uma vez, em --data-dir) planilhas de leads e logs de automação nos
+tamanhos pedidos, roda cada etapa do pipeline medindo o tempo e o pico de
+memória (RSS do processo, amostrado durante a etapa) e acrescenta os resultados
+a um CSV, para comparar execuções antes e depois de uma mudança.
+
+Uso:
+    python -m leads.bench [--sizes 10000 100000 1000000] [--formats xlsx csv]
+                          [--data-dir bench_data] [--results bench_results.csv]
+                          [--repeat N] [--no-memory]
+
+Etapas dos leads: load, normalize, dates, dtypes, classify, exclude, dedupe,
+sort_index, date_filter, segments, cube, excel_export. Etapas do log do app.py:
+load, conversions, summary, funnel.
+"""
+import argparse
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from leads.conversions import analisar_conversao_por_etapa, resumo_por_etapa
+from leads.dateindex import DateIndex, sort_by_date
+from leads.diagnostics import rss_bytes
+from leads.dtypes import optimize_dtypes
+from leads.export import export_bytes, write_csv, write_excel
+from leads.funnel import funil_por_etapa
+from leads.pipeline import (
+    LEAD_COLUMNS,
+    OPTIONAL_COLUMNS,
+    REQUIRED_COLUMNS,
+    TARGET_DATE_COL,
+    add_lead_category,
+    build_cube,
+    coerce_dates,
+    filter_by_date_range,
+    read_spreadsheet,
+    remove_duplicate_leads,
+    remove_excluded_rows,
+    segment_breakdown,
+    standardize_columns,
+)
+from leads.synthetic import generate_automation_log, generate_leads
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_FORMATS = ['xlsx', 'csv']
+RESULT_COLUMNS = [
+    'run', 'commit', 'python', 'pandas', 'dataset', 'rows', 'format', 'repeat',
+    'stage', 'rows_in', 'rows_out', 'seconds', 'peak_mb',
+]
+
+
+def _rows(value):
+    if isinstance(value, tuple):
+        value = value[0]
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    return None
+
+
+class PeakMemory:
+    """
+    Pico de memória durante um trecho, acima do valor no início. Amostra o RSS
+    numa thread; sem /proc, usa o tracemalloc (mais lento, só conta o que o
+    Python e o NumPy alocam).
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_bytes = None
+
+    def __enter__(self):
+        self._baseline = rss_bytes()
+        if self._baseline is None:
+            self._tracing = not tracemalloc.is_tracing()
+            if self._tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._baseline = tracemalloc.get_traced_memory()[0]
+            return self
+        self._peak = self._baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, rss_bytes())
+
+    def __exit__(self, *exc):
+        if hasattr(self, '_thread'):
+            self._stop.set()
+            self._thread.join()
+            self.peak_bytes = max(self._peak, rss_bytes()) - self._baseline
+        else:
+            self.peak_bytes = tracemalloc.get_traced_memory()[1] - self._baseline
+            if self._tracing:
+                tracemalloc.stop()
+        return False
+
+
+class StageTimer:
+    """Executa as etapas, uma a uma, guardando tempo, linhas e pico de memória de cada uma."""
+
+    def __init__(self, track_memory=True):
+        self.track_memory = track_memory
+        self.records = []
+
+    def run(self, stage, func, rows_in=None, rows_out=None):
+        memory = PeakMemory() if self.track_memory else None
+        started = time.perf_counter()
+        if memory is not None:
+            with memory:
+                value = func()
+        else:
+            value = func()
+        elapsed = time.perf_counter() - started
+        peak_mb = round(memory.peak_bytes / (1024 * 1024), 2) if memory is not None else None
+        self.records.append({
+            'stage': stage,
+            'rows_in': rows_in,
+            'rows_out': rows_out() if callable(rows_out) else _rows(value),
+            'seconds': round(elapsed, 4),
+            'peak_mb': peak_mb,
+        })
+        return value
+
+
+def ensure_dataset(data_dir, kind, rows, fmt, seed=0):
+    """Caminho da planilha sintética, gerando-a se ainda não existir."""
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    path = data_dir / f"{kind}_{rows}.{fmt}"
+    if not path.exists():
+        df = generate_leads(rows, seed) if kind == 'leads' else generate_automation_log(rows, seed)
+        tmp_path = path.with_name(path.name + '.tmp')
+        if fmt == 'xlsx':
+            write_excel(df, str(tmp_path), sheet_name='Planilha1')
+        else:
+            write_csv(df, str(tmp_path))
+        tmp_path.replace(path)
+    return path
+
+
+def bench_leads(path, timer):
+    """Etapas dos dashboards sobre uma planilha de leads."""
+    content = path.read_bytes()
+    df = timer.run('load', lambda: read_spreadsheet(path.name, content, columns=LEAD_COLUMNS))
+    rows = len(df)
+    timer.run('normalize', lambda: standardize_columns(df, REQUIRED_COLUMNS + OPTIONAL_COLUMNS), rows, lambda: len(df))
+    timer.run('dates', lambda: coerce_dates(df), rows, lambda: len(df))
+    timer.run('dtypes', lambda: optimize_dtypes(df), len(df), lambda: len(df))
+    timer.run('classify', lambda: add_lead_category(df), len(df), lambda: len(df))
+    rows = len(df)
+    df, _ = timer.run('exclude', lambda: remove_excluded_rows(df), rows)
+    rows = len(df)
+    df, _ = timer.run('dedupe', lambda: remove_duplicate_leads(df, 'first'), rows)
+
+    def sort_and_index():
+        ordered = sort_by_date(df, TARGET_DATE_COL)
+        return ordered, DateIndex(ordered[TARGET_DATE_COL])
+    df, date_index = timer.run('sort_index', sort_and_index, len(df))
+
+    # Metade central do período, como um filtro típico do dashboard
+    dates = df[TARGET_DATE_COL]
+    start = dates.quantile(0.25).date()
+    end = dates.quantile(0.75).date()
+    filtered = timer.run('date_filter', lambda: filter_by_date_range(df, start, end, date_index=date_index), len(df))
+    timer.run('segments', lambda: segment_breakdown(filtered), len(filtered))
+    timer.run('cube', lambda: build_cube(df), len(df), lambda: len(df))
+    timer.run('excel_export', lambda: export_bytes(filtered, 'xlsx'), len(filtered), lambda: len(filtered))
+
+
+def bench_automation_log(path, timer):
+    """Etapas do app.py sobre um log de automação."""
+    content = path.read_bytes()
+    df = timer.run('load', lambda: read_spreadsheet(path.name, content))
+    conversions, _ = timer.run('conversions', lambda: analisar_conversao_por_etapa(df), len(df))
+    timer.run('summary', lambda: resumo_por_etapa(conversions), len(conversions))
+    timer.run('funnel', lambda: funil_por_etapa(df), len(df))
+
+
+def current_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parent,
+        )
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run_benchmark(sizes, formats, data_dir, repeat=1, track_memory=True, log=print):
+    """Roda o benchmark e retorna um DataFrame com uma linha por etapa medida."""
+    run_info = {
+        'run': datetime.now().isoformat(timespec='seconds'),
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+    }
+    benches = (('leads', bench_leads), ('automacao', bench_automation_log))
+    datasets = [
+        (kind, bench, size, fmt, ensure_dataset(data_dir, kind, size, fmt))
+        for size in sizes for fmt in formats for kind, bench in benches
+    ]
+    rows = []
+    for kind, bench, size, fmt, path in datasets:
+        for i in range(repeat):
+            timer = StageTimer(track_memory)
+            bench(path, timer)
+            total = sum(record['seconds'] for record in timer.records)
+            log(f"{kind} {size} {fmt} #{i + 1}: {total:.2f}s")
+            for record in timer.records:
+                rows.append(dict(run_info, dataset=kind, rows=size, format=fmt, repeat=i + 1, **record))
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def append_results(results, path):
+    """Acrescenta ao CSV de resultados (com cabeçalho só na primeira vez)."""
+    path = Path(path)
+    results.to_csv(path, mode='a', index=False, header=not path.exists())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m leads.bench',
+        description="Mede o tempo e a memória de cada etapa do pipeline com planilhas sintéticas.",
+    )
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="número de linhas de cada planilha (padrão: 10000 100000 1000000)")
+    parser.add_argument('--formats', nargs='+', choices=['xlsx', 'csv'], default=DEFAULT_FORMATS, help="formatos das planilhas (padrão: xlsx csv)")
+    parser.add_argument('--data-dir', default='bench_data', help="pasta das planilhas sintéticas, reaproveitadas entre execuções (padrão: bench_data)")
+    parser.add_argument('--results', default='bench_results.csv', help="CSV ao qual os resultados são acrescentados (padrão: bench_results.csv)")
+    parser.add_argument('--repeat', type=int, default=1, help="repetições de cada planilha (padrão: 1)")
+    parser.add_argument('--no-memory', action='store_true', help="não mede a memória")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.sizes, args.formats, args.data_dir, repeat=args.repeat, track_memory=not args.no_memory)
+    append_results(results, args.results)
+
+    table = results.groupby(['dataset', 'rows', 'format', 'stage'], sort=False)[['seconds', 'peak_mb']].median()
+    print(table.to_string())
+    print(f"Resultados acrescentados a {args.results}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Cache em memória das planilhas já processadas, indexado pelo hash do conteúdo.
+
+O Streamlit reexecuta o script inteiro a cada interação com um widget. Guardando
+aqui o DataFrame já normalizado, uma mudança no filtro de datas não precisa
+reler a planilha nem refazer a padronização das colunas.
+"""
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Limites padrão, configuráveis por variável de ambiente
+DEFAULT_MAX_MB = float(os.environ.get('LEADS_CACHE_MAX_MB', 512))
+DEFAULT_MAX_ENTRIES = int(os.environ.get('LEADS_CACHE_MAX_ENTRIES', 16))
+
+
+def hash_bytes(data):
+    """Retorna o hash (hex) do conteúdo informado."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_uploaded_file(uploaded_file):
+    """Hash do conteúdo de um arquivo enviado pelo `st.file_uploader`."""
+    return hash_bytes(uploaded_file.getvalue())
+
+
+def estimate_size(value):
+    """Estimativa, em bytes, da memória ocupada por um valor guardado no cache."""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(value, pd.DataFrame) else int(usage)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ParseCache:
+    """
+    Cache LRU limitado pela memória total estimada e pelo número de entradas.
+
+    Os valores guardados são compartilhados entre reexecuções: quem os recebe
+    não deve alterá-los in-place.
+    """
+
+    def __init__(self, max_mb=DEFAULT_MAX_MB, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # chave -> (valor, tamanho em bytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                # Maior que o limite inteiro: não vale a pena guardar
+                return value
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+            self._evict()
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Retorna o valor em cache para `key` ou calcula, guarda e retorna `compute()`."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = self.put(key, compute())
+        return value
+
+    def set_memory_limit(self, max_mb):
+        with self._lock:
+            self.max_bytes = int(max_mb * 1024 * 1024)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _evict(self):
+        while self._entries and (
+            self._total_bytes > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+
+
+# Instância única por processo, compartilhada entre as reexecuções do Streamlit
+_parse_cache = ParseCache()
+
+
+def get_parse_cache():
+    return _parse_cache
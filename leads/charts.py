@@ -0,0 +1,186 @@
+"""
+Preparação dos dados dos gráficos Plotly dos dashboards e do app.py.
+
+Cada gráfico recebe só o que cabe na tela:
+
+- `top_n`: as N maiores categorias de uma dimensão (segmentos, etapas) e a soma
+  das demais em "Outros";
+- `bucket_periods`: séries mensais agrupadas por trimestre ou ano quando há mais
+  pontos do que a largura do gráfico comporta;
+- `box_stats`: quartis e limites por grupo, em vez de um ponto por linha.
+
+As figuras prontas ficam no cache de planilhas, indexadas pela impressão digital
+dos dados já reduzidos (`cached_figure`): uma reexecução que não muda os dados
+do gráfico não refaz a figura. O Plotly só é importado quando uma figura é
+montada, não ao abrir a página.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from leads.cache import get_parse_cache, hash_bytes
+
+OTHERS_LABEL = 'Outros'
+# Limites padrão, configuráveis por variável de ambiente
+DEFAULT_TOP_N = int(os.environ.get('LEADS_CHART_TOP_N', 15))
+DEFAULT_MAX_POINTS = int(os.environ.get('LEADS_CHART_MAX_POINTS', 60))
+PERIOD_STEPS = ['M', 'Q', 'Y']
+PERIOD_LABELS = {'M': 'Mês', 'Q': 'Trimestre', 'Y': 'Ano'}
+CATEGORY_COLORS = {
+    '✅ Válido': 'green',
+    '❌ Inválido': 'red',
+    '⚠️ Sem qualificação': 'orange'
+}
+
+
+def top_n(data, n=DEFAULT_TOP_N, by=None, other_label=OTHERS_LABEL):
+    """
+    Mantém as `n` maiores linhas de `data` e soma as demais numa linha
+    `other_label`. `data` é uma Series de contagens ou um DataFrame numérico
+    indexado pela categoria; no DataFrame, o tamanho de cada linha vem da coluna
+    `by` (ou da soma da linha). A ordem das linhas mantidas não muda.
+    """
+    weights = data if isinstance(data, pd.Series) else data[by] if by else data.sum(axis=1)
+    # Uma categoria já chamada "Outros" vai sempre para o resto
+    candidates = np.flatnonzero(data.index != other_label)
+    if n is None or len(candidates) <= n:
+        return data
+    ranked = candidates[np.argsort(-weights.to_numpy()[candidates], kind='stable')]
+    keep = np.sort(ranked[:n])
+    rest = np.setdiff1d(np.arange(len(data)), keep)
+    others = data.iloc[rest].sum()
+    if isinstance(data, pd.Series):
+        tail = pd.Series([others], index=[other_label], name=data.name)
+    else:
+        tail = others.to_frame(other_label).T.astype(data.dtypes.to_dict())
+    reduced = pd.concat([data.iloc[keep], tail])
+    reduced.index.name = data.index.name
+    return reduced
+
+
+def bucket_periods(table, max_points=DEFAULT_MAX_POINTS):
+    """
+    Soma as linhas de `table` (indexada por um PeriodIndex mensal) por
+    trimestre ou por ano, o primeiro que deixar no máximo `max_points` pontos.
+    Só vale para contagens, não para percentuais.
+    """
+    for freq in PERIOD_STEPS[1:]:
+        if len(table) <= max_points:
+            break
+        table = table.groupby(table.index.asfreq(freq)).sum()
+    return table
+
+
+def box_stats(df, group_col, value_col):
+    """Quartis e limites (1,5 × IQR, como no Plotly) de `value_col` por `group_col`."""
+    groups = df.groupby(group_col, observed=True, sort=False)[value_col]
+    stats = groups.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    iqr = stats['q3'] - stats['q1']
+    values = df[value_col]
+    low_limit = df[group_col].map(stats['q1'] - 1.5 * iqr).astype('float64')
+    high_limit = df[group_col].map(stats['q3'] + 1.5 * iqr).astype('float64')
+    stats['lowerfence'] = values.where(values >= low_limit).groupby(df[group_col], observed=True).min()
+    stats['upperfence'] = values.where(values <= high_limit).groupby(df[group_col], observed=True).max()
+    stats['count'] = groups.size()
+    return stats
+
+
+def box_figure(stats, order=None, title=None, x_title=None, y_title=None):
+    """Box plot montado a partir de `box_stats`: um traço com cinco números por grupo."""
+    import plotly.graph_objects as go
+
+    if order is not None:
+        stats = stats.reindex([group for group in order if group in stats.index])
+    fig = go.Figure(go.Box(
+        x=list(stats.index),
+        q1=stats['q1'], median=stats['median'], q3=stats['q3'],
+        lowerfence=stats['lowerfence'], upperfence=stats['upperfence'],
+        hovertext=[f"{count} respostas" for count in stats['count']],
+    ))
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title=y_title)
+    return fig
+
+
+def data_fingerprint(*parts):
+    """Hash do conteúdo de DataFrames, Series e parâmetros simples, para chave de cache."""
+    chunks = []
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            labels = list(part.columns) if isinstance(part, pd.DataFrame) else [part.name]
+            chunks.append(repr((type(part).__name__, labels, part.index.name)).encode())
+            chunks.append(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+        else:
+            chunks.append(repr(part).encode())
+    return hash_bytes(b'\0'.join(chunks))
+
+
+def cached_figure(name, data, build, **params):
+    """
+    Figura `name` para os dados `data` (já reduzidos) e os parâmetros `params`;
+    `build()` só é chamado quando essa combinação ainda não está no cache.
+    A figura é compartilhada entre as reexecuções e não deve ser alterada.
+    """
+    key = ('figure', name, data_fingerprint(data, sorted(params.items())))
+    return get_parse_cache().get_or_compute(key, build)
+
+
+def category_pie(lead_counts):
+    """Pizza das categorias de leads (contagem por categoria)."""
+    def build():
+        import plotly.express as px
+
+        fig = px.pie(
+            names=lead_counts.index,
+            values=lead_counts.values,
+            title="Distribuição das Categorias de Leads",
+            color=lead_counts.index,
+            color_discrete_map=CATEGORY_COLORS,
+        )
+        fig.update_traces(textinfo='percent+label', pull=[0.1 if cat == '⚠️ Sem qualificação' else 0 for cat in lead_counts.index])
+        return fig
+    return cached_figure('category-pie', lead_counts, build)
+
+
+def segment_bar(segment_analysis, n=DEFAULT_TOP_N, segment_label='Segmento/Categoria'):
+    """
+    Barras empilhadas por segmento e categoria, só com os `n` maiores segmentos
+    (pelo 'Total') e o resto em "Outros".
+    """
+    counts = top_n(segment_analysis, n, by='Total').drop(columns='Total')
+
+    def build():
+        import plotly.express as px
+
+        fig = px.bar(
+            counts,
+            x=counts.index,
+            y=counts.columns,
+            title="Contagem de Leads por Segmento e Categoria",
+            labels={'value': 'Número de Leads', counts.index.name: segment_label},
+            color_discrete_map=CATEGORY_COLORS,
+        )
+        fig.update_layout(barmode='stack')
+        return fig
+    return cached_figure('segment-bar', counts, build)
+
+
+def monthly_line(summary, columns, max_points=DEFAULT_MAX_POINTS):
+    """Evolução das contagens `columns` de `monthly_summary`, por trimestre ou ano se houver meses demais."""
+    series = bucket_periods(summary[columns], max_points)
+    period_label = PERIOD_LABELS[series.index.freqstr[0]] if isinstance(series.index, pd.PeriodIndex) else 'Mês'
+    series = series.rename(index=str).rename_axis('mes').reset_index()
+
+    def build():
+        import plotly.express as px
+
+        return px.line(
+            series,
+            x='mes',
+            y=columns,
+            markers=True,
+            title="Evolução Mensal dos Leads",
+            labels={'value': 'Número de Leads', 'mes': period_label, 'variable': 'Indicador'},
+        )
+    return cached_figure('monthly-line', series, build)
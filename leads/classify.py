@@ -0,0 +1,83 @@
+"""
+Classificação vetorizada dos leads a partir da coluna de status.
+
+O status é normalizado uma única vez por valor distinto (`strip().lower()`, como
+o antigo `classify_lead` fazia linha a linha) e mapeado por uma tabela de regras
+para a categoria. O resultado é uma coluna categórica.
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORIA_VALIDO = "✅ Válido"
+CATEGORIA_INVALIDO = "❌ Inválido"
+CATEGORIA_SEM_QUALIFICACAO = "⚠️ Sem qualificação"
+
+# Status normalizado -> categoria. Status vazio ou ausente cai na categoria padrão.
+DEFAULT_STATUS_RULES = {
+    "válido": CATEGORIA_VALIDO,
+    "inválido": CATEGORIA_INVALIDO,
+    "sem qualificação": CATEGORIA_SEM_QUALIFICACAO,
+}
+DEFAULT_CATEGORY = CATEGORIA_SEM_QUALIFICACAO
+
+
+def normalize_status(value):
+    return str(value).strip().lower()
+
+
+def build_rules(extra_rules=None, base_rules=None):
+    """
+    Monta uma tabela de regras a partir da padrão (ou de `base_rules`), acrescentando
+    `extra_rules`. As chaves são normalizadas, então 'Em Negociação ' equivale a
+    'em negociação'.
+    """
+    rules = {}
+    for status, categoria in (base_rules or DEFAULT_STATUS_RULES).items():
+        rules[normalize_status(status)] = categoria
+    for status, categoria in (extra_rules or {}).items():
+        rules[normalize_status(status)] = categoria
+    return rules
+
+
+def classify_lead(status_value, rules=None, default=DEFAULT_CATEGORY):
+    """Classifica um único valor de status (mesma regra de `classify_leads`)."""
+    if pd.isna(status_value):
+        return default
+    return (rules or DEFAULT_STATUS_RULES).get(normalize_status(status_value), default)
+
+
+def classify_leads(status, rules=None, default=DEFAULT_CATEGORY):
+    """
+    Classifica uma Series de status e retorna a Series categórica `categoria_lead`.
+
+    As categorias da coluna são apenas as que aparecem no resultado, em ordem
+    alfabética como numa coluna de texto, para que `value_counts`, `groupby` e
+    `unstack` produzam as mesmas linhas e colunas de antes, sem categorias zeradas.
+    """
+    rules = DEFAULT_STATUS_RULES if rules is None else rules
+    codes, uniques = pd.factorize(status, use_na_sentinel=True)
+
+    # Normalização por valor distinto, não por linha
+    normalized = pd.Index(uniques, dtype=object).astype(str).str.strip().str.lower()
+    unique_categories = normalized.map(lambda s: rules.get(s, default))
+
+    ordered = sorted({*rules.values(), default, *unique_categories})
+    position = {categoria: i for i, categoria in enumerate(ordered)}
+
+    unique_codes = np.fromiter(
+        (position[c] for c in unique_categories), dtype=np.int64, count=len(unique_categories)
+    )
+    # Ausentes (código -1 do factorize) vão para a categoria padrão
+    lookup = np.append(unique_codes, position[default])
+    row_codes = lookup[codes]
+
+    present = np.zeros(len(ordered), dtype=bool)
+    present[row_codes] = True
+    remap = np.cumsum(present) - 1
+    categories = [c for c, keep in zip(ordered, present) if keep]
+
+    return pd.Series(
+        pd.Categorical.from_codes(remap[row_codes], categories=categories),
+        index=status.index,
+        name='categoria_lead',
+    )
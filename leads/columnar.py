@@ -0,0 +1,120 @@
+"""
+Cópia colunar (Parquet) em disco das planilhas já padronizadas.
+
+Ler .xlsx pelo openpyxl é muito mais lento do que ler um arquivo colunar. Cada
+planilha processada é gravada, depois da padronização das colunas e da conversão
+das datas, como `<hash>-<variante>.parquet` ao lado de um manifesto
+`<hash>-<variante>.json`. As próximas leituras do mesmo conteúdo usam a cópia
+Parquet (mapeada em memória) no lugar da planilha.
+
+Como a chave é o hash do conteúdo, uma planilha alterada nunca reaproveita a
+cópia antiga; quando a origem é um caminho em disco, as cópias anteriores do
+mesmo caminho são apagadas ao gravar a nova.
+
+Ativado pela variável de ambiente LEADS_COLUMNAR_CACHE_DIR (ou pela opção
+--columnar-cache do processamento em lote). Requer o pyarrow.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Incrementar quando mudar o que é gravado, para invalidar as cópias antigas
+FORMAT_VERSION = 4
+
+
+class ColumnarCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, key):
+        return self.cache_dir / f"{key}.parquet", self.cache_dir / f"{key}.json"
+
+    def load(self, key):
+        """Retorna (DataFrame, metadados) da cópia colunar, ou None se não houver uma válida."""
+        data_path, manifest_path = self._paths(key)
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+            if manifest.get('format_version') != FORMAT_VERSION:
+                return None
+            df = pd.read_parquet(data_path, engine='pyarrow', memory_map=True)
+        except (OSError, ValueError):
+            return None
+        return df, manifest['meta']
+
+    def store(self, key, df, meta, source=None):
+        """
+        Grava a cópia colunar. Retorna False quando o DataFrame não pode ser
+        representado em Parquet (ex.: coluna com tipos misturados).
+        """
+        data_path, manifest_path = self._paths(key)
+        tmp_path = data_path.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            df.to_parquet(tmp_path, engine='pyarrow', index=False)
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            return False
+        os.replace(tmp_path, data_path)
+
+        if source is not None:
+            self.invalidate_source(source, keep_key=key)
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'key': key,
+            'source': source,
+            'created': time.time(),
+            'rows': len(df),
+            'meta': meta,
+        }
+        tmp_manifest = manifest_path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_manifest.write_text(json.dumps(manifest, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_manifest, manifest_path)
+        return True
+
+    def invalidate_source(self, source, keep_key=None):
+        """Apaga as cópias gravadas para `source` (exceto `keep_key`)."""
+        for manifest_path in self.cache_dir.glob('*.json'):
+            try:
+                manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            if manifest.get('source') == source and manifest.get('key') != keep_key:
+                self.remove(manifest.get('key') or manifest_path.stem)
+
+    def remove(self, key):
+        for path in self._paths(key):
+            path.unlink(missing_ok=True)
+
+    def get_or_build(self, content_hash, variant, build, source=None):
+        """
+        Retorna (DataFrame, metadados) da cópia colunar de `content_hash`/`variant`
+        ou chama `build()`, grava o resultado e o retorna. `build` pode retornar
+        DataFrame None (planilha inválida), que não é gravado.
+        """
+        key = f"{content_hash}-{variant}"
+        cached = self.load(key)
+        if cached is not None:
+            return cached
+        df, meta = build()
+        if df is not None:
+            self.store(key, df, meta, source=source)
+        return df, meta
+
+
+_columnar_caches = {}
+
+
+def get_columnar_cache(cache_dir=None):
+    """
+    Cache colunar do diretório informado ou de LEADS_COLUMNAR_CACHE_DIR.
+    Retorna None quando nenhum dos dois está definido (cache desativado).
+    """
+    cache_dir = cache_dir or os.environ.get('LEADS_COLUMNAR_CACHE_DIR')
+    if not cache_dir:
+        return None
+    if cache_dir not in _columnar_caches:
+        _columnar_caches[cache_dir] = ColumnarCache(cache_dir)
+    return _columnar_caches[cache_dir]
@@ -0,0 +1,118 @@
+"""
+Análise das conversões por etapa da automação (logs usados pelo app.py).
+"""
+import pandas as pd
+
+from leads.dedupe import DuplicateIndex, duplicate_mask
+
+STAGE_RESULT_COL = 'Etapa de Conversão'
+DETAIL_COLUMNS = ['Data-hora', 'Deal ID', 'Whatsapp', 'Mensagem', 'Deal name']
+SUMMARY_COLUMNS = ['Etapa', 'Conversões', 'Percentual (%)']
+# Colunas que identificam o lead no log (coluna -> tipo da chave), para contar cada lead uma vez
+IDENTITY_COLUMNS = {'Deal ID': 'id', 'Whatsapp': 'phone'}
+
+# Linhas lidas por bloco no modo streaming
+DEFAULT_CHUNKSIZE = 200_000
+
+
+def analisar_conversao_por_etapa(df, coluna_conversao='Tipo', valor_conversao='Cancelado-Lead-Respondeu', coluna_etapa='Etapa', deduplicar=False):
+    """
+    Filtra os leads convertidos e seleciona as colunas de detalhe. Com
+    `deduplicar`, cada lead (mesmo Deal ID ou Whatsapp) conta uma vez, na
+    primeira conversão. Retorna o DataFrame de resultados e uma mensagem de status.
+    """
+    if df.empty:
+        return pd.DataFrame(), "A planilha está vazia ou não contém dados válidos para análise."
+
+    # Verifica se as colunas essenciais existem no DataFrame original
+    if coluna_conversao not in df.columns:
+        return pd.DataFrame(), f"Erro: Coluna '{coluna_conversao}' não encontrada na sua planilha. Por favor, verifique o nome da coluna."
+
+    # Filtra as linhas onde a conversão (resposta do lead) aconteceu
+    leads_convertidos = df[df[coluna_conversao] == valor_conversao]
+    if deduplicar:
+        leads_convertidos = leads_convertidos[~duplicate_mask(leads_convertidos, IDENTITY_COLUMNS)]
+
+    if leads_convertidos.empty:
+        return pd.DataFrame(), f"Nenhum lead com '{valor_conversao}' encontrado na coluna '{coluna_conversao}'."
+
+    # Sem a coluna de etapa, retorna apenas a lista de convertidos
+    if coluna_etapa not in leads_convertidos.columns:
+        cols_existentes_sem_etapa = [col for col in DETAIL_COLUMNS if col in leads_convertidos.columns]
+        return leads_convertidos[cols_existentes_sem_etapa].copy(), f"Análise concluída. Coluna '{coluna_etapa}' não encontrada para detalhar por etapa."
+
+    # Seleciona as colunas relevantes para exibição
+    cols_existentes = [col for col in DETAIL_COLUMNS + [coluna_etapa] if col in leads_convertidos.columns]
+
+    resultados = leads_convertidos[cols_existentes].rename(columns={coluna_etapa: STAGE_RESULT_COL})
+
+    return resultados, "Análise de conversões concluída com sucesso!"
+
+
+def analisar_conversao_em_blocos(source, coluna_conversao='Tipo', valor_conversao='Cancelado-Lead-Respondeu', coluna_etapa='Etapa', chunksize=DEFAULT_CHUNKSIZE, deduplicar=False):
+    """
+    Versão streaming de `analisar_conversao_por_etapa` para CSVs grandes.
+
+    Lê o arquivo em blocos, só com as colunas usadas na análise, e guarda apenas
+    as linhas convertidas de cada bloco; a contagem por etapa é acumulada bloco a
+    bloco. A memória depende do número de conversões, não do tamanho do arquivo.
+    Retorna os resultados, a mensagem de status e a contagem por etapa (None
+    quando não há coluna de etapa ou conversões). Com `deduplicar`, os leads já
+    vistos em blocos anteriores não contam de novo.
+    """
+    colunas_usadas = {coluna_conversao, coluna_etapa, *DETAIL_COLUMNS}
+    reader = pd.read_csv(source, usecols=lambda col: col in colunas_usadas, chunksize=chunksize)
+
+    partes = []
+    contagem_por_etapa = None
+    indice_duplicados = DuplicateIndex(IDENTITY_COLUMNS) if deduplicar else None
+    total_linhas = 0
+    with reader:
+        for chunk in reader:
+            if coluna_conversao not in chunk.columns:
+                return pd.DataFrame(), f"Erro: Coluna '{coluna_conversao}' não encontrada na sua planilha. Por favor, verifique o nome da coluna.", None
+            total_linhas += len(chunk)
+            convertidos = chunk[chunk[coluna_conversao] == valor_conversao]
+            if indice_duplicados is not None:
+                convertidos = convertidos[~indice_duplicados.mark(convertidos)]
+            if convertidos.empty:
+                continue
+            partes.append(convertidos)
+            if coluna_etapa in convertidos.columns:
+                contagem_bloco = convertidos[coluna_etapa].value_counts()
+                contagem_por_etapa = contagem_bloco if contagem_por_etapa is None else contagem_por_etapa.add(contagem_bloco, fill_value=0)
+
+    if total_linhas == 0:
+        return pd.DataFrame(), "A planilha está vazia ou não contém dados válidos para análise.", None
+    if not partes:
+        return pd.DataFrame(), f"Nenhum lead com '{valor_conversao}' encontrado na coluna '{coluna_conversao}'.", None
+
+    resultados, mensagem = analisar_conversao_por_etapa(pd.concat(partes), coluna_conversao, valor_conversao, coluna_etapa)
+    if contagem_por_etapa is not None:
+        contagem_por_etapa = contagem_por_etapa.astype('int64').sort_index()
+    return resultados, mensagem, contagem_por_etapa
+
+
+def resumo_por_etapa(df_conversoes, contagem_por_etapa=None):
+    """
+    Contagem e percentual de conversões por etapa. Aceita a contagem já calculada
+    (modo streaming). Retorna um DataFrame vazio quando não há etapa ou
+    conversões para resumir.
+    """
+    if contagem_por_etapa is None:
+        if STAGE_RESULT_COL not in df_conversoes.columns:
+            return pd.DataFrame(columns=SUMMARY_COLUMNS)
+        contagem_por_etapa = df_conversoes[STAGE_RESULT_COL].value_counts().sort_index()
+
+    # Etapa categórica: etapas sem conversões não entram no resumo
+    contagem_por_etapa = contagem_por_etapa[contagem_por_etapa > 0]
+    total_conversoes = contagem_por_etapa.sum()
+    if total_conversoes == 0:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    porcentagem_por_etapa = (contagem_por_etapa / total_conversoes * 100).round(2)
+    return pd.DataFrame({
+        'Etapa': contagem_por_etapa.index,
+        'Conversões': contagem_por_etapa.values,
+        'Percentual (%)': porcentagem_por_etapa.values
+    })
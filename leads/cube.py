@@ -0,0 +1,139 @@
+"""
+Cubo de agregação diária dos leads: (dia, dimensões...) -> contagem.
+
+Montado uma vez na ingestão. As contagens ficam numa matriz densa dia x célula
+(uma célula por combinação distinta das dimensões) com somas acumuladas ao longo
+dos dias, então o total de cada célula para qualquer período sai de uma
+subtração entre duas linhas da matriz, sem voltar às linhas da planilha.
+
+A matriz é densa (8 bytes por posição, mesmo nas vazias): acima de
+`MAX_CUBE_CELLS` posições o cubo não é montado. O tamanho do cubo entra na
+memória de cada conjunto no registro (`__sizeof__`).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Acima disso (dias x células) o cubo não é montado e os dashboards agregam as linhas.
+# 2 milhões de posições = 16 MB por cubo
+MAX_CUBE_CELLS = int(os.environ.get('LEADS_CUBE_MAX_CELLS', 2_000_000))
+
+
+class LeadCube:
+    def __init__(self, days, cells, prefix):
+        self.days = days      # datetime64[ns], dias distintos em ordem crescente
+        self.cells = cells    # DataFrame com uma linha por combinação das dimensões
+        self._prefix = prefix  # (len(days) + 1, len(cells)) contagens acumuladas
+
+    @classmethod
+    def from_frame(cls, df, date_col, dims, max_cells=MAX_CUBE_CELLS):
+        """
+        Monta o cubo a partir das linhas de `df`. Retorna None quando a matriz
+        passaria de `max_cells` posições.
+        """
+        dates = df[date_col]
+        if isinstance(dates.dtype, pd.DatetimeTZDtype):
+            dates = dates.dt.tz_localize(None)
+        day_codes, days = pd.factorize(dates.dt.normalize(), sort=True)
+
+        keys = pd.MultiIndex.from_frame(df[dims].astype(object))
+        cell_codes, cell_keys = pd.factorize(keys, sort=True)
+        n_days, n_cells = len(days), len(cell_keys)
+        if n_days * n_cells > max_cells:
+            return None
+
+        counts = np.bincount(
+            day_codes * n_cells + cell_codes, minlength=n_days * n_cells
+        ).reshape(n_days, n_cells)
+        prefix = np.zeros((n_days + 1, n_cells), dtype=np.int64)
+        np.cumsum(counts, axis=0, out=prefix[1:])
+
+        cells = cell_keys.to_frame(index=False, name=dims) if n_cells else pd.DataFrame(columns=dims)
+        return cls(np.asarray(days, dtype='datetime64[ns]'), cells, prefix)
+
+    @classmethod
+    def combine(cls, parts, dims, max_cells=MAX_CUBE_CELLS):
+        """
+        Cubo com a soma das contagens de `parts` ([(cubo, sinal)], sinal 1 para
+        somar e -1 para subtrair), todos com as dimensões `dims`. Dias e células
+        que ficam sem contagem saem. Serve para atualizar um cubo com as linhas
+        que entraram e saíram, sem voltar às demais. Retorna None quando a
+        matriz passaria de `max_cells` posições.
+        """
+        parts = [(cube, sign) for cube, sign in parts if len(cube.days) and len(cube.cells)]
+        if not parts:
+            return cls(np.array([], dtype='datetime64[ns]'), pd.DataFrame(columns=dims), np.zeros((1, 0), dtype=np.int64))
+        days = np.unique(np.concatenate([cube.days for cube, _ in parts]))
+        keys = pd.MultiIndex.from_frame(pd.concat([cube.cells for cube, _ in parts], ignore_index=True).astype(object))
+        cell_codes, cell_keys = pd.factorize(keys, sort=True)
+        if len(days) * len(cell_keys) > max_cells:
+            return None
+
+        counts = np.zeros((len(days), len(cell_keys)), dtype=np.int64)
+        offset = 0
+        for cube, sign in parts:
+            cell_pos = cell_codes[offset:offset + len(cube.cells)]
+            offset += len(cube.cells)
+            day_pos = np.searchsorted(days, cube.days)
+            counts[np.ix_(day_pos, cell_pos)] += sign * np.diff(cube._prefix, axis=0)
+
+        used_days, used_cells = counts.any(axis=1), counts.any(axis=0)
+        counts = counts[used_days][:, used_cells]
+        prefix = np.zeros((len(counts) + 1, counts.shape[1]), dtype=np.int64)
+        np.cumsum(counts, axis=0, out=prefix[1:])
+        cell_keys = cell_keys[used_cells]
+        cells = cell_keys.to_frame(index=False, name=dims) if len(cell_keys) else pd.DataFrame(columns=dims)
+        return cls(days[used_days], cells, prefix)
+
+    def __sizeof__(self):
+        return (
+            object.__sizeof__(self)
+            + self.days.nbytes
+            + self._prefix.nbytes
+            + int(self.cells.memory_usage(deep=True).sum())
+        )
+
+    @property
+    def dims(self):
+        return list(self.cells.columns)
+
+    def _day_positions(self, start_date, end_date):
+        start = 0 if start_date is None else np.searchsorted(self.days, np.datetime64(start_date, 'D'), side='left')
+        stop = len(self.days) if end_date is None else np.searchsorted(self.days, np.datetime64(end_date, 'D'), side='right')
+        return int(start), int(max(start, stop))
+
+    def totals(self, start_date=None, end_date=None):
+        """Contagem de cada célula no período (datas inclusivas; None = sem limite)."""
+        start, stop = self._day_positions(start_date, end_date)
+        return self._prefix[stop] - self._prefix[start]
+
+    def monthly_totals(self, start_date=None, end_date=None):
+        """
+        Contagem de cada célula por mês dentro do período: retorna os meses
+        (PeriodIndex) e a matriz mês x célula. Usa as fronteiras dos meses nas
+        somas acumuladas, sem percorrer os dias um a um.
+        """
+        start, stop = self._day_positions(start_date, end_date)
+        months = self.days[start:stop].astype('datetime64[M]')
+        month_values, first_positions = np.unique(months, return_index=True)
+        bounds = np.append(first_positions + start, stop)
+        totals = self._prefix[bounds[1:]] - self._prefix[bounds[:-1]]
+        return pd.PeriodIndex(month_values, freq='M'), totals
+
+    def query(self, start_date=None, end_date=None):
+        """Células com contagem no período, com a coluna 'count'."""
+        totals = self.totals(start_date, end_date)
+        present = totals > 0
+        rollup = self.cells[present].reset_index(drop=True)
+        rollup['count'] = totals[present]
+        return rollup
+
+    def to_frame(self):
+        """Cubo no formato longo: uma linha por (dia, célula) com contagem."""
+        counts = np.diff(self._prefix, axis=0)
+        day_pos, cell_pos = np.nonzero(counts)
+        frame = self.cells.iloc[cell_pos].reset_index(drop=True)
+        frame.insert(0, 'dia', pd.DatetimeIndex(self.days[day_pos]).date)
+        frame['count'] = counts[day_pos, cell_pos]
+        return frame
@@ -0,0 +1,56 @@
+"""
+Índice de datas para o filtro de período dos dashboards.
+
+O DataFrame de leads é mantido ordenado pela data de conversão; o índice guarda
+as datas em um array numpy e responde a um período (data inicial, data final)
+com duas buscas binárias. O filtro vira uma fatia posicional (`iloc`) do
+DataFrame, sem máscara booleana, sem objetos `date` por linha e sem cópia.
+"""
+
+import numpy as np
+import pandas as pd
+
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+def sort_by_date(df, date_col):
+    """Ordena pela data mantendo a ordem original entre linhas da mesma data."""
+    if df[date_col].is_monotonic_increasing:
+        return df
+    return df.sort_values(date_col, kind='stable')
+
+
+class DateIndex:
+    def __init__(self, dates):
+        """`dates`: Series de datas já ordenada, sem valores ausentes."""
+        if isinstance(dates.dtype, pd.DatetimeTZDtype):
+            # Mesmo comportamento de `.dt.date`: compara a data no fuso da coluna
+            dates = dates.dt.tz_localize(None)
+        self._values = dates.to_numpy(dtype='datetime64[ns]')
+        if len(self._values) > 1 and not (self._values[1:] >= self._values[:-1]).all():
+            raise ValueError("As datas precisam estar ordenadas para montar o índice.")
+
+    def __len__(self):
+        return len(self._values)
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self._values.nbytes
+
+    @property
+    def min_date(self):
+        return pd.Timestamp(self._values[0]).date() if len(self._values) else None
+
+    @property
+    def max_date(self):
+        return pd.Timestamp(self._values[-1]).date() if len(self._values) else None
+
+    def positions(self, start_date, end_date):
+        """Posições [início, fim) das linhas com data entre `start_date` e `end_date`, inclusive."""
+        start = np.searchsorted(self._values, np.datetime64(start_date, 'D'), side='left')
+        stop = np.searchsorted(self._values, np.datetime64(end_date, 'D') + ONE_DAY, side='left')
+        return int(start), int(max(start, stop))
+
+    def slice(self, df, start_date, end_date):
+        """Fatia de `df` (alinhado com o índice) para o período informado."""
+        start, stop = self.positions(start_date, end_date)
+        return df.iloc[start:stop]
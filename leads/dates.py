@@ -0,0 +1,313 @@
+"""
+Conversão rápida da coluna de datas das planilhas.
+
+`pd.to_datetime` sem formato adivinha o formato de cada valor: é lento em
+planilhas grandes e lê '05/01/2024' como 1º de maio. Aqui o formato é detectado
+numa amostra da coluna (ou informado), a coluna inteira é convertida com esse
+formato explícito e só as sobras passam pela conversão lenta, com o dia antes do
+mês. Números (ou textos numéricos) são tratados como datas seriais do Excel.
+
+Cada valor distinto é convertido uma vez só. O relatório diz o formato usado e
+quantas linhas ficaram sem data, e por quê. Datas fora de DATE_RANGE (o que o
+pandas representa em nanossegundos, usado no índice de datas e no cubo) contam
+como fora do intervalo.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+DATE_ORDERS = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d.%m.%Y', '%Y/%m/%d', '%d/%m/%y', '%m/%d/%Y']
+TIME_SUFFIXES = ['', ' %H:%M:%S', ' %H:%M', 'T%H:%M:%S']
+DATE_FORMATS = [order + suffix for order in DATE_ORDERS for suffix in TIME_SUFFIXES]
+SAMPLE_SIZE = 500
+# Amostra usada para decidir se vale agrupar os valores repetidos antes da conversão
+DISTINCT_SAMPLE_SIZE = 1000
+DISTINCT_RATIO = 0.9
+
+# Opções oferecidas nos dashboards (None = detectar em cada planilha)
+DATE_FORMAT_CHOICES = [None, '%d/%m/%Y %H:%M', '%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d']
+
+# Datas aceitas: o intervalo dos Timestamps em nanossegundos (1677-09-22 a 2262-04-11)
+DATE_RANGE = (pd.Timestamp.min.ceil('D'), pd.Timestamp.max.floor('D'))
+# Datas seriais do Excel: dias desde 1899-12-30 (1 = 1900-01-01, 132320 = 2262-04-11, o fim de DATE_RANGE)
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+EXCEL_SERIAL_RANGE = (1, 132320)
+
+REASON_EMPTY = 'vazias'
+REASON_UNRECOGNIZED = 'em formato não reconhecido'
+REASON_OUT_OF_RANGE = 'fora do intervalo de datas (1677 a 2262)'
+
+_REFERENCE_DATE = pd.Timestamp('2000-01-01')
+_NUMERIC = re.compile(r'\d+(?:[.,]\d+)?')
+_FORMAT_LABELS = {'%d': 'dd', '%m': 'mm', '%Y': 'aaaa', '%y': 'aa', '%H': 'hh', '%M': 'mm', '%S': 'ss'}
+
+
+def format_label(fmt):
+    """'%d/%m/%Y %H:%M' -> 'dd/mm/aaaa hh:mm'."""
+    return re.sub(r'%[dmYyHMS]', lambda match: _FORMAT_LABELS[match.group()], fmt)
+
+
+def infer_date_format(texts, sample_size=SAMPLE_SIZE):
+    """
+    Formato de DATE_FORMATS que converte mais valores de uma amostra (espalhada
+    pela coluna) de `texts`. Empates ficam com o primeiro da lista (dia antes do
+    mês). None se nenhum converter.
+    """
+    if len(texts) == 0:
+        return None
+    positions = np.unique(np.linspace(0, len(texts) - 1, min(len(texts), sample_size)).astype(int))
+    sample = texts.iloc[positions].str.strip()
+    best, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = int(pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum())
+        if count > best_count:
+            best, best_count = fmt, count
+            if count == len(sample):
+                break
+    return best
+
+
+def _variants(fmt):
+    """O formato e as variações dele com/sem hora, para as sobras."""
+    base = fmt
+    for suffix in TIME_SUFFIXES:
+        if suffix and fmt.endswith(suffix):
+            base = fmt[:-len(suffix)]
+    return [fmt] + [base + suffix for suffix in TIME_SUFFIXES if base + suffix != fmt]
+
+
+def _dayfirst(fmt):
+    if fmt and '%d' in fmt and '%m' in fmt:
+        return fmt.index('%d') < fmt.index('%m')
+    return True
+
+
+def _from_serials(values):
+    """Datas seriais do Excel; fora de EXCEL_SERIAL_RANGE viram NaT."""
+    values = pd.Series(values, dtype='float64')
+    valid = values.between(*EXCEL_SERIAL_RANGE)
+    dates = EXCEL_EPOCH + pd.to_timedelta(values.where(valid), unit='D')
+    return dates.dt.round('s').astype('datetime64[us]'), ~valid & values.notna()
+
+
+def _outside_range(dates):
+    """Máscara (array) das datas de `dates` fora de DATE_RANGE; NaT fica fora da máscara."""
+    if isinstance(dates.dtype, pd.DatetimeTZDtype):
+        dates = dates.dt.tz_convert(None)
+    return ((dates < DATE_RANGE[0]) | (dates > DATE_RANGE[1])).to_numpy()
+
+
+def _convert(texts, dropna=True, **options):
+    """`pd.to_datetime` sem fuso, só com os valores convertidos (`dropna`); vazio se a conversão falhar por inteiro."""
+    try:
+        converted = pd.to_datetime(texts, errors='coerce', **options)
+    except (TypeError, ValueError):
+        # Fusos horários diferentes na mesma coluna: tudo em UTC
+        try:
+            converted = pd.to_datetime(texts, errors='coerce', utc=True, **options)
+        except (TypeError, ValueError):
+            return pd.Series(dtype='datetime64[us]')
+    if isinstance(converted.dtype, pd.DatetimeTZDtype):
+        converted = converted.dt.tz_localize(None)
+    return converted.dropna() if dropna else converted
+
+
+def _convert_split(texts, fmt):
+    """
+    Conversão com `fmt` separando data e hora pela posição: cada dia e cada
+    horário distintos são convertidos uma vez, o que evita o strptime linha a
+    linha do pandas em formatos que não são ISO. Vale para valores com zeros à
+    esquerda (tamanho fixo); os demais ficam para as sobras.
+    """
+    suffix = next((suffix for suffix in TIME_SUFFIXES if suffix and fmt.endswith(suffix)), None)
+    if suffix is None or fmt.startswith('%Y-%m-%d'):
+        # Sem hora, ou ISO (que o pandas já converte rápido)
+        return _convert(texts, format=fmt)
+    date_format, separator, time_format = fmt[:-len(suffix)], suffix[0], suffix[1:]
+    width = len(_REFERENCE_DATE.strftime(date_format))
+    # Fatiar texto com o dtype 'str' (pyarrow) não passa pelo Python valor a valor
+    texts = texts.astype('str')
+    date_codes, date_values = pd.factorize(texts.str.slice(0, width))
+    time_codes, time_values = pd.factorize(texts.str.slice(width + 1))
+    days = pd.to_datetime(pd.Series(date_values), format=date_format, errors='coerce')
+    clock = pd.to_datetime(pd.Series(time_values), format=time_format, errors='coerce') - pd.Timestamp('1900-01-01')
+    converted = pd.Series(
+        days.to_numpy(dtype='datetime64[us]')[date_codes] + clock.to_numpy(dtype='timedelta64[us]')[time_codes],
+        index=texts.index,
+    )
+    converted[(texts.str.slice(width, width + 1) != separator).to_numpy()] = pd.NaT
+    return converted.dropna()
+
+
+def _parse_leftovers(texts, fmt):
+    """
+    Textos (sem espaços) que o formato principal não converteu: variações com/sem
+    hora, ISO8601 e, por último, a conversão lenta, uma vez por texto distinto.
+    Retorna as datas convertidas e os rótulos que precisaram da conversão lenta.
+    """
+    distinct = np.asarray(texts.unique(), dtype=object)
+    remaining = pd.Series(distinct, dtype=object)
+    parsed = []
+    # ISO8601 antes da conversão lenta: com o dia antes do mês, ela leria 2024-02-01 como 2 de janeiro
+    for variant in [*_variants(fmt)[1:], 'ISO8601'] if fmt else ['ISO8601']:
+        if remaining.empty:
+            break
+        converted = _convert(remaining, format=variant)
+        parsed.append(converted)
+        remaining = remaining.drop(converted.index)
+
+    slow = []
+    if not remaining.empty:
+        converted = _convert(remaining, format='mixed', dayfirst=_dayfirst(fmt))
+        parsed.append(converted)
+        slow = remaining[converted.index]
+    parsed = [part for part in parsed if not part.empty]
+    if not parsed:
+        return pd.Series(dtype='datetime64[us]'), pd.Index([])
+    parsed = pd.concat(parsed)
+    by_text = pd.Series(parsed.to_numpy(), index=pd.Index(distinct[parsed.index], dtype=object))
+    converted = texts.map(by_text).dropna().astype('datetime64[us]')
+    return converted, texts.index[texts.isin(slow).to_numpy()]
+
+
+def _distinct_values(series):
+    """
+    Códigos e valores distintos (como `pd.factorize`): datas sem hora se repetem
+    muito e cada uma é convertida uma vez. Quando quase todos os valores são
+    distintos (data e hora), não vale a pena agrupar e cada linha vira um valor.
+    """
+    step = max(len(series) // DISTINCT_SAMPLE_SIZE, 1)
+    sample = series.iloc[::step]
+    if len(series) <= DISTINCT_SAMPLE_SIZE or sample.nunique() < DISTINCT_RATIO * len(sample):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        return codes, pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+    present = series.notna().to_numpy()
+    codes = np.full(len(series), -1, dtype='int64')
+    codes[present] = np.arange(int(present.sum()))
+    return codes, pd.Series(series.to_numpy(dtype=object)[present], dtype=object)
+
+
+def parse_dates(series, date_format=None):
+    """
+    Converte `series` em datas (NaT quando não for possível). `date_format`
+    (strftime, ex.: '%d/%m/%Y') dispensa a detecção. Retorna as datas e o
+    relatório da conversão.
+    """
+    report = {
+        'format': None,
+        'format_detected': False,
+        'serials': 0,
+        'fallback': 0,
+        'dropped': {REASON_EMPTY: 0, REASON_UNRECOGNIZED: 0, REASON_OUT_OF_RANGE: 0},
+        'examples': [],
+    }
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        out_of_range = _outside_range(series)
+        report['dropped'][REASON_EMPTY] = int(series.isna().sum())
+        report['dropped'][REASON_OUT_OF_RANGE] = int(out_of_range.sum())
+        return (series.mask(out_of_range) if out_of_range.any() else series), report
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        parsed, out_of_range = _from_serials(series.to_numpy(dtype='float64', na_value=np.nan))
+        parsed.index = series.index
+        report['serials'] = int(parsed.notna().sum())
+        report['dropped'][REASON_EMPTY] = int(series.isna().sum())
+        report['dropped'][REASON_OUT_OF_RANGE] = int(out_of_range.sum())
+        return parsed, report
+
+    if pd.api.types.infer_dtype(series, skipna=True) in ('datetime', 'date'):
+        # Células já lidas como data pelo leitor de Excel
+        parsed = _convert(series, dropna=False).reindex(series.index).astype('datetime64[us]')
+        out_of_range = _outside_range(parsed)
+        report['dropped'][REASON_EMPTY] = int(series.isna().sum())
+        report['dropped'][REASON_UNRECOGNIZED] = int(parsed.isna().sum()) - report['dropped'][REASON_EMPTY]
+        report['dropped'][REASON_OUT_OF_RANGE] = int(out_of_range.sum())
+        return parsed.mask(out_of_range), report
+
+    codes, uniques = _distinct_values(series)
+    weights = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    # Uma posição por valor distinto (os rótulos de `uniques` são as posições); NaT no fim para os ausentes (código -1)
+    parsed = np.full(len(uniques) + 1, np.datetime64('NaT', 'us'))
+    serials = []
+    empty = pd.Index([])
+
+    if pd.api.types.infer_dtype(uniques, skipna=True) == 'string':
+        texts = uniques
+    else:
+        is_text = uniques.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+        is_number = uniques.map(
+            lambda value: isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+        ).to_numpy(dtype=bool)
+        texts = uniques[is_text]
+        serials.append(uniques[is_number].astype('float64'))
+        # Células já lidas como data (datetime/Timestamp) pelo leitor de Excel
+        others = uniques[~is_text & ~is_number]
+        if not others.empty:
+            converted = _convert(others)
+            parsed[converted.index.to_numpy()] = converted.to_numpy(dtype='datetime64[us]')
+
+    if not texts.empty:
+        # O formato principal converte quase tudo de uma vez, sem olhar valor a valor
+        fmt = date_format or infer_date_format(texts)
+        report['format'] = fmt
+        report['format_detected'] = date_format is None and fmt is not None
+        if fmt:
+            converted = _convert_split(texts, fmt)
+            parsed[converted.index.to_numpy()] = converted.to_numpy(dtype='datetime64[us]')
+            texts = texts.drop(converted.index)
+
+        texts = texts.str.strip()
+        empty = texts.index[(texts == '').to_numpy()]
+        numeric = texts.str.fullmatch(_NUMERIC).to_numpy(dtype=bool)
+        serials.append(texts[numeric].str.replace(',', '.').astype('float64'))
+        texts = texts[~numeric & (texts != '').to_numpy()]
+        if not texts.empty:
+            converted, fallback = _parse_leftovers(texts, fmt)
+            parsed[converted.index.to_numpy()] = converted.to_numpy(dtype='datetime64[us]')
+            report['fallback'] = int(weights[fallback].sum())
+
+    out_of_range = pd.Index([])
+    serials = pd.concat(serials) if serials else pd.Series(dtype='float64')
+    if not serials.empty:
+        converted, invalid = _from_serials(serials.to_numpy())
+        converted.index = invalid.index = serials.index
+        parsed[serials.index.to_numpy()] = converted.to_numpy(dtype='datetime64[us]')
+        out_of_range = serials.index[invalid.to_numpy()]
+        report['serials'] = int(weights[serials.index[converted.notna().to_numpy()]].sum())
+
+    # Textos e datas fora do intervalo em nanossegundos (os seriais já foram limitados)
+    outside = np.flatnonzero(_outside_range(pd.Series(parsed[:-1])))
+    if len(outside):
+        parsed[outside] = np.datetime64('NaT', 'us')
+        out_of_range = out_of_range.union(pd.Index(outside))
+
+    unrecognized = np.isnat(parsed[:-1])
+    unrecognized[empty] = False
+    unrecognized[out_of_range] = False
+    report['dropped'][REASON_EMPTY] = int((codes < 0).sum() + weights[empty].sum())
+    report['dropped'][REASON_OUT_OF_RANGE] = int(weights[out_of_range].sum())
+    report['dropped'][REASON_UNRECOGNIZED] = int(weights[unrecognized].sum())
+    report['examples'] = [str(value) for value in pd.unique(uniques[unrecognized])[:3]]
+
+    return pd.Series(parsed[codes], index=series.index), report
+
+
+def dropped_rows(report):
+    """Linhas sem data válida, somando todos os motivos."""
+    return sum(report['dropped'].values())
+
+
+def format_date_report(report, date_col):
+    """Resumo da conversão para a barra lateral."""
+    parts = []
+    if report.get('format'):
+        origin = "detectado" if report['format_detected'] else "informado"
+        parts.append(f"Datas de '{date_col}' no formato {format_label(report['format'])} ({origin}).")
+    if report.get('serials'):
+        parts.append(f"{report['serials']} datas seriais do Excel convertidas.")
+    if dropped_rows(report):
+        reasons = ', '.join(f"{count} {reason}" for reason, count in report['dropped'].items() if count)
+        parts.append(f"Removidas {dropped_rows(report)} linhas sem data válida ({reasons}).")
+        if report.get('examples'):
+            parts.append("Exemplos não reconhecidos: " + ', '.join(f"'{value}'" for value in report['examples']) + '.')
+    return ' '.join(parts)
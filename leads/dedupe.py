@@ -0,0 +1,130 @@
+"""
+Remoção de leads duplicados pelo telefone, e-mail ou identificador (Deal ID).
+
+Os valores são normalizados (telefone só com dígitos e sem o código do país,
+e-mail em minúsculas, identificador sem espaços) uma vez por valor distinto, e
+os repetidos são encontrados com o índice de hash do `duplicated` do pandas:
+uma passada linear, sem comparar as linhas duas a duas. Uma linha é duplicada
+quando qualquer uma das chaves aparece numa linha anterior (ou posterior, com
+keep='last'), mesmo que essa outra linha também seja duplicada por outra chave.
+Cada chave é verificada separadamente: A e C com o mesmo telefone e B e C com o
+mesmo e-mail removem C, e A e B ficam.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+KEEP_POLICIES = ('first', 'last')
+DUPLICATE_COL = 'lead_duplicado'
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def _phone_key(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    digits = _NON_DIGITS.sub('', str(value)).lstrip('0')
+    if len(digits) >= 12 and digits.startswith('55'):
+        digits = digits[2:]
+    return digits if len(digits) >= 8 else None
+
+
+def _email_key(value):
+    email = str(value).strip().lower()
+    return email if '@' in email else None
+
+
+def _id_key(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    key = str(value).strip()
+    return key or None
+
+
+NORMALIZERS = {
+    'phone': _phone_key,
+    'email': _email_key,
+    'id': _id_key,
+}
+
+
+def normalize_keys(series, kind):
+    """Chave normalizada de cada linha (None quando vazia ou inválida), calculada por valor distinto."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    normalize = NORMALIZERS[kind]
+    keys = np.array([normalize(value) for value in uniques] + [None], dtype=object)
+    return pd.Series(keys[codes], index=series.index)
+
+
+def identity_keys(df, key_columns):
+    """
+    Chaves normalizadas de cada linha, uma coluna por coluna de `key_columns`
+    (coluna -> tipo: 'phone', 'email' ou 'id') presente em `df`.
+    """
+    return pd.DataFrame(
+        {column: normalize_keys(df[column], kind) for column, kind in key_columns.items() if column in df.columns},
+        index=df.index,
+    )
+
+
+def keys_duplicate_mask(keys, keep='first'):
+    """Máscara das linhas duplicadas a partir das chaves já normalizadas (`identity_keys`)."""
+    if keep not in KEEP_POLICIES:
+        raise ValueError(f"Política inválida: {keep!r} (use 'first' ou 'last').")
+    mask = np.zeros(len(keys), dtype=bool)
+    for column in keys.columns:
+        column_keys = keys[column]
+        present = column_keys.notna().to_numpy()
+        mask[present] |= column_keys[present].duplicated(keep=keep).to_numpy()
+    return pd.Series(mask, index=keys.index)
+
+
+def duplicate_mask(df, key_columns, keep='first'):
+    """
+    Máscara das linhas duplicadas. `key_columns` é coluna -> tipo ('phone',
+    'email' ou 'id'); colunas ausentes no DataFrame são ignoradas.
+    """
+    return keys_duplicate_mask(identity_keys(df, key_columns), keep)
+
+
+def drop_duplicate_leads(df, key_columns, keep='first'):
+    """Remove os duplicados. Retorna o novo DataFrame e quantas linhas saíram."""
+    duplicated = duplicate_mask(df, key_columns, keep)
+    if not duplicated.any():
+        return df, 0
+    return df[~duplicated].copy(), int(duplicated.sum())
+
+
+def flag_duplicate_leads(df, key_columns, keep='first'):
+    """Marca (in-place) os duplicados na coluna DUPLICATE_COL, sem remover linhas."""
+    df[DUPLICATE_COL] = duplicate_mask(df, key_columns, keep)
+    return df
+
+
+class DuplicateIndex:
+    """
+    Índice das chaves já vistas, para marcar duplicados bloco a bloco (modo
+    streaming) mantendo sempre a primeira ocorrência.
+    """
+
+    def __init__(self, key_columns):
+        self.key_columns = dict(key_columns)
+        self._seen = {column: set() for column in self.key_columns}
+
+    def mark(self, chunk):
+        """Máscara dos duplicados do bloco, considerando também os blocos anteriores."""
+        mask = np.zeros(len(chunk), dtype=bool)
+        for column, kind in self.key_columns.items():
+            if column not in chunk.columns:
+                continue
+            keys = normalize_keys(chunk[column], kind)
+            present = keys.notna().to_numpy()
+            keys = keys[present]
+            seen = self._seen[column]
+            mask[present] |= (keys.duplicated(keep='first') | keys.isin(seen)).to_numpy()
+            seen.update(keys)
+        return pd.Series(mask, index=chunk.index)
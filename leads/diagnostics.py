@@ -0,0 +1,154 @@
+"""
+Tempo, linhas e memória de cada etapa de uma execução dos scripts.
+
+Cada reexecução do Streamlit cria um `Diagnostics` (`start_run`); as etapas são
+marcadas com `stage(...)`, tanto nos scripts quanto dentro do pipeline. Fora de
+uma execução instrumentada (lote, benchmark), `stage` não mede nada.
+
+O resultado aparece no painel opcional "Diagnóstico" da barra lateral e, com a
+variável de ambiente LEADS_DIAGNOSTICS_LOG definida ('stderr' ou o caminho de um
+arquivo), é gravado como uma linha JSON por execução, junto com o relatório de
+partida do processo (`leads.startup`).
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+import pandas as pd
+
+from leads.startup import format_startup_report, on_script_start, record_first_run
+
+logger = logging.getLogger('leads.diagnostics')
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_current = ContextVar('leads_diagnostics', default=None)
+
+
+def rss_bytes():
+    """Memória residente (RSS) do processo, ou None onde /proc não existe (Windows, macOS)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return None
+
+
+def _rows(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    return value
+
+
+class Diagnostics:
+    """Etapas de uma execução, na ordem em que começaram."""
+
+    def __init__(self, script):
+        self.script = script
+        self.records = []
+        self.started = time.perf_counter()
+        self.startup = None
+        self.first_run = False
+        self._depth = 0
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Mede o bloco. `rows_in` é um número ou um DataFrame; o dicionário
+        retornado recebe 'rows_out' (`record['rows_out'] = len(df)`). Etapas
+        dentro de etapas aparecem recuadas.
+        """
+        record = {'stage': name, 'depth': self._depth, 'rows_in': _rows(rows_in),
+                  'rows_out': None, 'seconds': None, 'memory_mb': None}
+        self.records.append(record)
+        before = rss_bytes()
+        started = time.perf_counter()
+        self._depth += 1
+        try:
+            yield record
+        finally:
+            self._depth -= 1
+            record['seconds'] = round(time.perf_counter() - started, 4)
+            after = rss_bytes()
+            if before is not None and after is not None:
+                record['memory_mb'] = round((after - before) / (1024 * 1024), 2)
+
+    @property
+    def total_seconds(self):
+        return time.perf_counter() - self.started
+
+    def to_frame(self):
+        """Tabela do painel: uma linha por etapa, com as internas recuadas."""
+        frame = pd.DataFrame(self.records, columns=['stage', 'depth', 'rows_in', 'rows_out', 'seconds', 'memory_mb'])
+        frame['stage'] = [('  ' * depth + '↳ ' if depth else '') + name for name, depth in zip(frame['stage'], frame['depth'])]
+        frame = frame.drop(columns='depth')
+        frame.columns = ['Etapa', 'Linhas (entrada)', 'Linhas (saída)', 'Segundos', 'Memória (MB)']
+        return frame.convert_dtypes()
+
+    def to_json(self):
+        rss = rss_bytes()
+        return json.dumps({
+            'script': self.script,
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'total_seconds': round(self.total_seconds, 4),
+            'rss_mb': round(rss / (1024 * 1024), 1) if rss is not None else None,
+            'stages': self.records,
+            'startup': self.startup,
+        }, ensure_ascii=False, default=str)
+
+    def finish(self):
+        """Encerra a execução e grava a linha JSON, se LEADS_DIAGNOSTICS_LOG estiver definida."""
+        record_first_run(self)
+        if _configure_logging():
+            logger.info(self.to_json())
+        _current.set(None)
+
+
+def start_run(script):
+    """Começa a instrumentação de uma execução do script (e o aquecimento, na primeira do processo)."""
+    diagnostics = Diagnostics(script)
+    _current.set(diagnostics)
+    on_script_start(diagnostics)
+    return diagnostics
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """`Diagnostics.stage` da execução atual; sem execução instrumentada, não mede nada."""
+    diagnostics = _current.get()
+    if diagnostics is None:
+        yield {}
+        return
+    with diagnostics.stage(name, rows_in) as record:
+        yield record
+
+
+_logging_configured = None
+
+
+def _configure_logging():
+    global _logging_configured
+    if _logging_configured is None:
+        target = os.environ.get('LEADS_DIAGNOSTICS_LOG')
+        if target:
+            handler = logging.StreamHandler() if target == 'stderr' else logging.FileHandler(target, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        _logging_configured = bool(target)
+    return _logging_configured
+
+
+def render_panel(container, diagnostics, label="Diagnóstico (tempo por etapa)"):
+    """Painel opcional com as etapas da execução, em `container` (ex.: `st.sidebar`)."""
+    if not container.checkbox(label, key='leads-diagnostics'):
+        return
+    container.dataframe(diagnostics.to_frame(), hide_index=True)
+    container.caption(f"Execução completa até aqui: {diagnostics.total_seconds:.2f}s")
+    startup = format_startup_report(diagnostics.startup) if diagnostics.startup else ''
+    if startup:
+        container.caption(startup)
@@ -0,0 +1,72 @@
+"""
+Plano de tipos compactos para os DataFrames carregados.
+
+Colunas de texto com poucos valores distintos (segmento, status, situação,
+Etapa, Tipo...) viram categóricas e colunas inteiras (Deal ID...) são reduzidas
+ao menor tipo inteiro que comporta os valores. `.str.contains`, comparações e
+`groupby` continuam funcionando sobre os tipos compactos.
+"""
+import pandas as pd
+from pandas.api.types import infer_dtype, is_integer_dtype, is_object_dtype, is_string_dtype
+
+# Vira categórica a coluna de texto com até este número de valores distintos...
+CATEGORY_MAX_UNIQUE = 5000
+# ...e com no máximo esta proporção de valores distintos por linha
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def memory_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def compact_column(series, max_unique=CATEGORY_MAX_UNIQUE, max_unique_ratio=CATEGORY_MAX_UNIQUE_RATIO):
+    """Versão compacta da coluna, ou None se não houver ganho previsto."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return None
+    if is_integer_dtype(series.dtype) and not isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+        downcast = pd.to_numeric(series, downcast='integer')
+        return downcast if downcast.dtype != series.dtype else None
+    if is_object_dtype(series.dtype) or is_string_dtype(series.dtype):
+        # Só texto puro: categorias com tipos misturados não ordenam
+        if len(series) == 0 or infer_dtype(series, skipna=True) != 'string':
+            return None
+        n_unique = series.nunique(dropna=True)
+        if n_unique <= max_unique and n_unique <= len(series) * max_unique_ratio:
+            return series.astype('category')
+    return None
+
+
+def optimize_dtypes(df, exclude=()):
+    """
+    Converte (in-place) as colunas de `df` para tipos compactos. Retorna um
+    relatório com a memória antes/depois e as colunas convertidas.
+    """
+    before = memory_bytes(df)
+    converted = {}
+    for column in df.columns:
+        if column in exclude:
+            continue
+        compacted = compact_column(df[column])
+        if compacted is not None:
+            converted[str(column)] = [str(df[column].dtype), str(compacted.dtype)]
+            df[column] = compacted
+    return {'before': before, 'after': memory_bytes(df), 'columns': converted}
+
+
+def as_text(series):
+    """
+    Equivalente a `astype(str)` que preserva colunas categóricas: só as
+    categorias são convertidas, e apenas quando alguma não é texto.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if infer_dtype(series.cat.categories, skipna=True) == 'string':
+            return series
+        return series.astype(str).astype('category')
+    return series.astype(str)
+
+
+def format_memory_report(report):
+    before_mb = report['before'] / 1024 ** 2
+    after_mb = report['after'] / 1024 ** 2
+    saved = 100 * (1 - report['after'] / report['before']) if report['before'] else 0
+    return f"Memória dos dados: {before_mb:.1f} MB → {after_mb:.1f} MB (economia de {saved:.0f}%)"
@@ -0,0 +1,99 @@
+"""
+Leitura de planilhas Excel só com as colunas usadas.
+
+A leitura é a do `pd.read_excel`, com o motor calamine quando o pacote
+python-calamine está instalado (bem mais rápido) e o padrão do pandas
+(openpyxl para .xlsx) caso contrário. As colunas são escolhidas pelo nome do
+cabeçalho, com uma função em `usecols`: só elas chegam ao DataFrame. Com
+sheets='all', as abas são juntadas numa tabela.
+
+Limitações do openpyxl: ele converte a planilha inteira em Python puro, então
+escolher as colunas economiza memória, mas não tempo de leitura; e, como a
+conversão segura o GIL, ler as abas em threads não adiantaria. Por isso as abas
+só são lidas em paralelo (uma thread por aba) com o calamine, que faz a leitura
+em Rust; com o openpyxl elas são lidas uma depois da outra.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+from io import BytesIO
+
+import pandas as pd
+
+# Motor mais rápido do pandas, se instalado (None = padrão, openpyxl/xlrd)
+FAST_ENGINE = 'calamine' if find_spec('python_calamine') else None
+# Abas lidas: 'first' só a primeira, 'all' todas, juntadas numa tabela
+SHEET_POLICIES = ('first', 'all')
+DEFAULT_SHEETS = os.environ.get('LEADS_EXCEL_SHEETS', 'first')
+SHEET_COL = 'aba'
+# Em `DataFrame.attrs`: todas as colunas da planilha, inclusive as não lidas
+SOURCE_COLUMNS_ATTR = 'source_columns'
+
+
+def read_sheet(content, sheet=0, usecols=None):
+    """
+    Uma aba do Excel. `usecols` é uma função nome da coluna -> bool (None =
+    todas); os nomes de todas as colunas da aba ficam em
+    `df.attrs[SOURCE_COLUMNS_ATTR]`.
+    """
+    if usecols is None:
+        df = pd.read_excel(BytesIO(content), sheet_name=sheet, engine=FAST_ENGINE)
+        df.attrs[SOURCE_COLUMNS_ATTR] = [str(col) for col in df.columns]
+        return df
+
+    # O pandas consulta `usecols` uma vez por coluna do cabeçalho: anota os nomes
+    source_columns = []
+
+    def choose(name):
+        source_columns.append(str(name))
+        return usecols(name)
+
+    df = pd.read_excel(BytesIO(content), sheet_name=sheet, usecols=choose, engine=FAST_ENGINE)
+    df.attrs[SOURCE_COLUMNS_ATTR] = source_columns
+    return df
+
+
+def combine_sheets(frames, normalize=str):
+    """
+    Junta as abas numa tabela, com a coluna SHEET_COL indicando a origem. As
+    colunas são alinhadas pelo nome normalizado (`normalize`); vale a grafia da
+    primeira aba em que a coluna aparece.
+    """
+    names = {}
+    aligned = []
+    source_columns = {}
+    for sheet, df in frames.items():
+        for col in df.attrs.get(SOURCE_COLUMNS_ATTR, df.columns):
+            source_columns.setdefault(normalize(str(col)), str(col))
+        if df.empty:
+            continue
+        renamed = {}
+        for col in df.columns:
+            renamed[col] = names.setdefault(normalize(str(col)), col)
+        aligned.append(df.rename(columns=renamed).assign(**{SHEET_COL: sheet}))
+    combined = pd.concat(aligned, ignore_index=True) if aligned else pd.DataFrame()
+    combined.attrs = {SOURCE_COLUMNS_ATTR: list(source_columns.values())}
+    return combined
+
+
+def read_excel(content, usecols=None, sheets=DEFAULT_SHEETS, normalize=str, max_workers=None):
+    """
+    Lê um .xlsx/.xls. `usecols` é uma função nome da coluna -> bool (None = todas).
+    Com sheets='all', lê todas as abas (em paralelo só com o calamine) e as junta
+    (`combine_sheets`).
+    """
+    if sheets not in SHEET_POLICIES:
+        raise ValueError(f"Opção de abas inválida: {sheets!r} (use 'first' ou 'all').")
+    if sheets == 'first':
+        return read_sheet(content, 0, usecols)
+
+    names = pd.ExcelFile(BytesIO(content), engine=FAST_ENGINE).sheet_names
+    if len(names) == 1:
+        return read_sheet(content, names[0], usecols)
+    if FAST_ENGINE is None:
+        # openpyxl segura o GIL: em threads, as abas seriam lidas em sequência do mesmo jeito
+        return combine_sheets({sheet: read_sheet(content, sheet, usecols) for sheet in names}, normalize)
+    # Cada thread abre o próprio arquivo: o leitor do pandas não é compartilhável entre threads
+    with ThreadPoolExecutor(max_workers=max_workers or min(len(names), os.cpu_count() or 1)) as pool:
+        frames = dict(zip(names, pool.map(lambda sheet: read_sheet(content, sheet, usecols), names)))
+    return combine_sheets(frames, normalize)
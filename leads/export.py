@@ -0,0 +1,226 @@
+"""
+Exportação dos leads processados para Excel, CSV ou Parquet.
+
+Os arquivos são escritos em blocos de linhas: o Excel usa o modo
+`constant_memory` do xlsxwriter (cada linha vai para o disco assim que é
+escrita), o CSV é gerado bloco a bloco e o Parquet grava um row group por
+bloco. Nos dashboards a geração é pedida a um `ExportManager`, que escreve o
+arquivo numa thread de fundo, num temporário no disco, e o guarda por uma chave
+barata (hash do arquivo + filtros), sem precisar fazer hash do DataFrame a cada
+reexecução. A página acompanha o andamento nas reexecuções e oferece o download
+quando o arquivo fica pronto; os bytes só são lidos do disco no clique.
+"""
+import atexit
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+DEFAULT_SHEET_NAME = 'Leads Processados'
+DEFAULT_CHUNK_ROWS = 50_000
+# Exportações prontas guardadas no disco (as mais antigas são apagadas)
+DEFAULT_EXPORT_ENTRIES = int(os.environ.get('LEADS_EXPORT_MAX_ENTRIES', 8))
+DEFAULT_EXPORT_MAX_MB = float(os.environ.get('LEADS_EXPORT_MAX_MB', 1024))
+EXPORT_FORMATS = {
+    'xlsx': ('Excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('CSV', 'text/csv'),
+    'parquet': ('Parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def iter_chunks(df, chunk_rows=DEFAULT_CHUNK_ROWS):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _excel_rows(chunk):
+    """Linhas do bloco como listas de valores Python, com ausentes como None."""
+    columns = []
+    for name in chunk.columns:
+        series = chunk[name]
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            values = series.dt.tz_localize(None) if series.dt.tz is not None else series
+            values = values.astype(object)
+        else:
+            values = series.astype(object)
+        columns.append(values.where(series.notna(), None).tolist())
+    return zip(*columns)
+
+
+def write_excel(df, target, sheet_name=DEFAULT_SHEET_NAME, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Escreve `df` em um .xlsx (`target` é um caminho ou arquivo binário) no modo
+    de memória constante do xlsxwriter, linha a linha, bloco a bloco.
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(target, {
+        'constant_memory': True,
+        'tmpdir': tempfile.gettempdir(),
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+    })
+    worksheet = workbook.add_worksheet(sheet_name)
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    worksheet.write_row(0, 0, [str(col) for col in df.columns], header_format)
+    row = 1
+    for chunk in iter_chunks(df, chunk_rows):
+        for values in _excel_rows(chunk):
+            worksheet.write_row(row, 0, values)
+            row += 1
+    workbook.close()
+
+
+def write_csv(df, target, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Escreve `df` em CSV (UTF-8) bloco a bloco; `target` é um caminho ou arquivo binário."""
+    own_file = isinstance(target, (str, os.PathLike))
+    output = open(target, 'wb') if own_file else target
+    try:
+        if df.empty:
+            output.write(df.to_csv(index=False).encode('utf-8'))
+        for i, chunk in enumerate(iter_chunks(df, chunk_rows)):
+            output.write(chunk.to_csv(index=False, header=(i == 0)).encode('utf-8'))
+    finally:
+        if own_file:
+            output.close()
+
+
+def write_parquet(df, target, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Escreve `df` em Parquet com um row group por bloco. Requer o pyarrow."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    with pq.ParquetWriter(target, schema) as writer:
+        for chunk in iter_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+WRITERS = {
+    'xlsx': write_excel,
+    'csv': write_csv,
+    'parquet': write_parquet,
+}
+
+
+def export_bytes(df, fmt='xlsx', **options):
+    """
+    Gera o arquivo no formato `fmt` e retorna o conteúdo. A escrita passa por um
+    arquivo temporário no disco, então só o resultado final fica em memória.
+    """
+    with tempfile.TemporaryFile() as tmp:
+        WRITERS[fmt](df, tmp, **options)
+        tmp.seek(0)
+        return tmp.read()
+
+
+def export_file(df, fmt='xlsx', directory=None, **options):
+    """Gera o arquivo no formato `fmt` num temporário no disco e retorna o caminho."""
+    handle, path = tempfile.mkstemp(prefix='leads-export-', suffix=f'.{fmt}', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as output:
+            WRITERS[fmt](df, output, **options)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+class ExportManager:
+    """
+    Gera as exportações em threads de fundo, em arquivos temporários no disco, e
+    guarda as prontas por chave: no máximo `max_entries` arquivos e `max_mb` no
+    total, apagando os usados há mais tempo. Quem chama escolhe a chave (ex.:
+    hash do arquivo, período e formato); o DataFrame passado não deve ser
+    alterado depois.
+    """
+
+    def __init__(self, max_workers=2, max_entries=DEFAULT_EXPORT_ENTRIES, max_mb=DEFAULT_EXPORT_MAX_MB):
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='leads-export')
+        self._futures = OrderedDict()  # chave -> Future com o caminho do arquivo
+        self._lock = threading.RLock()
+
+    def submit(self, key, df, fmt='xlsx'):
+        """
+        Future com o caminho do arquivo; reaproveita a já pedida com a mesma
+        chave, a não ser que tenha falhado. `df` pode ser uma função sem
+        argumentos que retorna o DataFrame, chamada já na thread de fundo.
+        """
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None and not (future.done() and future.exception() is not None):
+                self._futures.move_to_end(key)
+                return future
+            future = self._executor.submit(lambda: export_file(df() if callable(df) else df, fmt))
+            self._futures[key] = future
+            self._futures.move_to_end(key)
+        future.add_done_callback(lambda _: self._evict())
+        return future
+
+    def get(self, key):
+        """Future da exportação com esta chave, ou None se ela não foi pedida (ou já foi apagada)."""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self._futures.move_to_end(key)
+            return future
+
+    def read(self, key):
+        """Conteúdo da exportação pronta com esta chave (lido do disco agora)."""
+        with open(self.get(key).result(), 'rb') as f:
+            return f.read()
+
+    def clear(self):
+        """Apaga todos os arquivos prontos."""
+        with self._lock:
+            for future in self._futures.values():
+                _remove_export(future)
+            self._futures.clear()
+
+    def _evict(self):
+        # Apaga os arquivos prontos mais antigos; os em andamento ficam até terminar
+        with self._lock:
+            done = [key for key, future in self._futures.items() if future.done()]
+            sizes = {key: _export_size(self._futures[key]) for key in done}
+            count, total = len(self._futures), sum(sizes.values())
+            for key in done[:-1]:  # o mais recente fica, mesmo acima do limite
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                _remove_export(self._futures.pop(key))
+                count -= 1
+                total -= sizes[key]
+
+
+def _export_size(future):
+    if future.exception() is not None:
+        return 0
+    try:
+        return os.path.getsize(future.result())
+    except OSError:
+        return 0
+
+
+def _remove_export(future):
+    if future.done() and future.exception() is None:
+        try:
+            os.remove(future.result())
+        except OSError:
+            pass
+
+
+_export_manager = None
+_export_manager_lock = threading.Lock()
+
+
+def get_export_manager():
+    """Gerenciador de exportações compartilhado pelo processo (todas as sessões)."""
+    global _export_manager
+    with _export_manager_lock:
+        if _export_manager is None:
+            _export_manager = ExportManager()
+            atexit.register(_export_manager.clear)
+        return _export_manager
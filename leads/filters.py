@@ -0,0 +1,183 @@
+"""
+Filtros por valor (segmento, situação, categoria, etapa) com índices montados
+uma vez, na preparação dos dados.
+
+`FilterIndex` guarda, para cada coluna filtrável, o código de cada linha (a
+posição do valor na lista de valores distintos) e as posições das linhas de
+cada valor, agrupadas por valor e em ordem crescente. Uma seleção vira:
+
+- dentro de uma coluna (OU): a junção das posições dos valores escolhidos;
+- entre colunas (E): a coluna com menos linhas escolhidas dá as posições
+  candidatas, e as demais colunas são conferidas numa tabela valor -> escolhido
+  pelos códigos só dessas posições.
+
+O custo segue o tamanho da seleção, não o da planilha. O período entra como o
+intervalo de posições do `DateIndex` (os leads estão ordenados por data).
+
+As contagens de cada opção (`counts`) consideram o período e as seleções das
+outras colunas, e ficam guardadas por essas seleções: mudar a escolha numa
+coluna não recalcula as contagens dela, só as das outras.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Contagens guardadas por índice (as mais antigas saem antes)
+MAX_COUNT_ENTRIES = 128
+
+
+def freeze_selections(selections):
+    """Seleções ({coluna: valores}) como tupla ordenada, para chave de cache; colunas sem escolha não entram."""
+    return tuple(sorted(
+        (col, tuple(sorted(values, key=str))) for col, values in (selections or {}).items() if values
+    ))
+
+
+def filter_cells(rollup, selections):
+    """Linhas de `rollup` (células do cubo ou de um resumo) com os valores escolhidos em cada coluna."""
+    active = [(col, values) for col, values in (selections or {}).items() if values and col in rollup.columns]
+    if not active:
+        return rollup
+    mask = np.ones(len(rollup), dtype=bool)
+    for col, values in active:
+        mask &= rollup[col].isin(values).to_numpy(dtype=bool)
+    return rollup[mask].reset_index(drop=True)
+
+
+class FilterIndex:
+    """Posições das linhas por valor de cada coluna filtrável de um DataFrame."""
+
+    def __init__(self, df, columns):
+        self.n_rows = len(df)
+        self.columns = [col for col in columns if col in df.columns]
+        self._codes = {}
+        self._values = {}
+        self._order = {}
+        self._offsets = {}
+        for col in self.columns:
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes, values = series.cat.codes.to_numpy(), series.cat.categories
+            else:
+                codes, values = pd.factorize(series, sort=True, use_na_sentinel=True)
+            codes = codes.astype(np.min_scalar_type(-max(len(values), 1)))
+            # Vazios (código -1) ficam no começo da ordem e nunca são escolhidos
+            counts = np.bincount(codes[codes >= 0], minlength=len(values))
+            offsets = np.empty(len(values) + 1, dtype=np.int64)
+            offsets[0] = int((codes < 0).sum())
+            np.cumsum(counts, out=offsets[1:])
+            offsets[1:] += offsets[0]
+            self._codes[col] = codes
+            self._values[col] = pd.Index(values)
+            self._order[col] = np.argsort(codes, kind='stable').astype(np.min_scalar_type(max(self.n_rows, 1)))
+            self._offsets[col] = offsets
+        self._counts = OrderedDict()
+        # O índice é compartilhado entre as sessões (registro de conjuntos)
+        self._lock = threading.Lock()
+
+    def __sizeof__(self):
+        arrays = [*self._codes.values(), *self._order.values(), *self._offsets.values()]
+        return object.__sizeof__(self) + sum(a.nbytes for a in arrays) + sum(v.memory_usage(deep=True) for v in self._values.values())
+
+    def options(self, col):
+        """Valores de `col` com pelo menos uma linha, na ordem dos valores."""
+        offsets = self._offsets[col]
+        return list(self._values[col][np.diff(offsets) > 0])
+
+    def _selected_codes(self, col, values):
+        codes = self._values[col].get_indexer(list(values))
+        return np.unique(codes[codes >= 0])
+
+    def _active(self, selections):
+        return {
+            col: self._selected_codes(col, values)
+            for col, values in (selections or {}).items() if values and col in self._codes
+        }
+
+    def positions(self, selections=None, start=0, stop=None):
+        """
+        Posições (crescentes) das linhas entre `start` e `stop` com os valores
+        escolhidos em cada coluna. Sem nenhuma escolha, retorna None (todas as
+        linhas do intervalo).
+        """
+        stop = self.n_rows if stop is None else stop
+        active = self._active(selections)
+        if not active:
+            return None
+        sizes = {col: int(np.sum(self._offsets[col][codes + 1] - self._offsets[col][codes])) for col, codes in active.items()}
+        first = min(active, key=sizes.get)
+        order, offsets = self._order[first], self._offsets[first]
+        parts = []
+        for code in active[first]:
+            rows = order[offsets[code]:offsets[code + 1]]
+            parts.append(rows[np.searchsorted(rows, start):np.searchsorted(rows, stop)])
+        positions = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+        for col, codes in active.items():
+            if col == first or not len(positions):
+                continue
+            # Uma posição a mais para o código -1 (vazio), que nunca é escolhido
+            lookup = np.zeros(len(self._values[col]) + 1, dtype=bool)
+            lookup[codes] = True
+            positions = positions[lookup[self._codes[col][positions]]]
+        return positions
+
+    def select(self, df, selections=None, start=0, stop=None):
+        """Linhas de `df` (alinhado com o índice) no intervalo e com os valores escolhidos."""
+        stop = self.n_rows if stop is None else stop
+        positions = self.positions(selections, start, stop)
+        return df.iloc[start:stop] if positions is None else df.iloc[positions]
+
+    def counts(self, col, selections=None, start=0, stop=None):
+        """
+        Quantas linhas do intervalo têm cada valor de `col`, com as escolhas das
+        outras colunas aplicadas (Series indexada pelos valores de `col`).
+        """
+        stop = self.n_rows if stop is None else stop
+        others = {other: values for other, values in (selections or {}).items() if other != col}
+        key = (col, start, stop, freeze_selections(others))
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+        positions = self.positions(others, start, stop)
+        codes = self._codes[col][start:stop] if positions is None else self._codes[col][positions]
+        counts = pd.Series(
+            np.bincount(codes[codes >= 0], minlength=len(self._values[col])), index=self._values[col], name=col
+        )
+        with self._lock:
+            self._counts[key] = counts
+            while len(self._counts) > MAX_COUNT_ENTRIES:
+                self._counts.popitem(last=False)
+        return counts
+
+
+def render_filters(container, index, labels, state, start=0, stop=None, key='filter'):
+    """
+    Um multiselect por coluna de `labels` ({coluna: rótulo}) presente no índice,
+    em `container` (ex.: `st.sidebar`), com a contagem de cada opção. `state` é o
+    `st.session_state`, de onde saem as escolhas atuais para as contagens antes
+    de os widgets serem desenhados. Retorna as seleções {coluna: valores}.
+    """
+    columns = [col for col in labels if col in index.columns]
+    options = {col: index.options(col) for col in columns}
+    current = {}
+    for col in columns:
+        widget_key = f"{key}-{col}"
+        if widget_key in state:
+            # Escolhas de uma planilha anterior que não existem nesta saem da seleção
+            allowed = set(options[col])
+            state[widget_key] = [value for value in state[widget_key] if value in allowed]
+        current[col] = state.get(widget_key, [])
+    selections = {}
+    for col in columns:
+        counts = index.counts(col, current, start, stop)
+        selections[col] = container.multiselect(
+            labels[col],
+            options[col],
+            key=f"{key}-{col}",
+            format_func=lambda value, counts=counts: f"{value} ({counts.get(value, 0)})",
+            placeholder="Todos",
+        )
+    return {col: values for col, values in selections.items() if values}
@@ -0,0 +1,160 @@
+"""
+Funil da automação a partir do log de eventos do app.py.
+
+Os eventos são agrupados por `Deal ID` e ordenados por `Data-hora`. Para cada
+etapa: quantos leads chegaram nela (alcance), quantos responderam nela
+(conversão sobre os que chegaram) e quanto tempo levaram para responder, do
+primeiro evento do lead na etapa até a resposta.
+
+Tudo sai de uma ordenação numérica por (deal, etapa, data) e de `groupby`
+sobre o log inteiro, sem laço por deal. O log é primeiro reduzido ao primeiro evento e à primeira
+resposta de cada (deal, etapa); a redução pode ser feita bloco a bloco (modo
+streaming) e repetida sobre a junção dos blocos sem mudar o resultado.
+"""
+import numpy as np
+import pandas as pd
+
+from leads.conversions import DEFAULT_CHUNKSIZE
+from leads.dates import parse_dates
+
+DEAL_COL = 'Deal ID'
+EVENT_TIME_COL = 'Data-hora'
+CONVERTED_COL = 'convertido'
+FUNNEL_COLUMNS = [
+    'Etapa',
+    'Leads na etapa',
+    'Alcance (%)',
+    'Conversões',
+    'Taxa de conversão (%)',
+    'Resposta mediana (h)',
+    'Resposta p90 (h)',
+]
+RESPONSE_HOURS_COL = 'Horas até a resposta'
+
+
+def _primeiros_por_grupo(eventos, coluna_etapa):
+    """
+    Posições do primeiro evento e da primeira resposta de cada (deal, etapa), e o
+    código do grupo de cada linha. Uma ordenação numérica (grupo, data) e uma
+    comparação com a linha anterior; sem hash de pares nem laço por deal.
+    """
+    deals, _ = pd.factorize(eventos[DEAL_COL])
+    etapas, _ = pd.factorize(eventos[coluna_etapa])
+    grupos = deals.astype('int64') * (int(etapas.max(initial=0)) + 1) + etapas
+    # Duas ordenações estáveis (data, depois grupo) saem mais rápidas que o lexsort
+    ordem = np.argsort(eventos[EVENT_TIME_COL].to_numpy().view('int64'), kind='stable')
+    ordem = ordem[np.argsort(grupos[ordem], kind='stable')]
+    ordenados = grupos[ordem]
+    inicio = np.ones(len(ordem), dtype=bool)
+    inicio[1:] = ordenados[1:] != ordenados[:-1]
+
+    convertidos = eventos[CONVERTED_COL].to_numpy()[ordem]
+    grupos_resposta = ordenados[convertidos]
+    inicio_resposta = np.ones(len(grupos_resposta), dtype=bool)
+    inicio_resposta[1:] = grupos_resposta[1:] != grupos_resposta[:-1]
+    return ordem[inicio], ordem[convertidos][inicio_resposta], grupos
+
+
+def reduzir_eventos(eventos, coluna_etapa='Etapa'):
+    """
+    Mantém, de cada (deal, etapa), o primeiro evento e a primeira resposta.
+    `eventos` tem as colunas DEAL_COL, EVENT_TIME_COL, `coluna_etapa` e CONVERTED_COL.
+    """
+    chegadas, respostas, _ = _primeiros_por_grupo(eventos, coluna_etapa)
+    manter = np.zeros(len(eventos), dtype=bool)
+    manter[chegadas] = True
+    manter[respostas] = True
+    return eventos[manter]
+
+
+def preparar_eventos(df, coluna_conversao='Tipo', valor_conversao='Cancelado-Lead-Respondeu', coluna_etapa='Etapa'):
+    """Colunas usadas no funil, com a data convertida; eventos sem deal, etapa ou data válida são ignorados."""
+    eventos = pd.DataFrame({
+        DEAL_COL: df[DEAL_COL],
+        EVENT_TIME_COL: parse_dates(df[EVENT_TIME_COL])[0],
+        coluna_etapa: df[coluna_etapa],
+        CONVERTED_COL: (df[coluna_conversao] == valor_conversao).to_numpy() if coluna_conversao in df.columns else False,
+    })
+    return eventos.dropna(subset=[DEAL_COL, EVENT_TIME_COL, coluna_etapa])
+
+
+def colunas_faltantes(columns, coluna_etapa='Etapa'):
+    return [col for col in (DEAL_COL, EVENT_TIME_COL, coluna_etapa) if col not in columns]
+
+
+def calcular_funil(reduzidos, coluna_etapa='Etapa', ordem_etapas=None):
+    """
+    Funil por etapa a partir dos eventos reduzidos. Sem `ordem_etapas`, as etapas
+    seguem a ordem típica em que os leads chegam nelas (mediana do tempo entre o
+    primeiro evento do lead e o primeiro evento na etapa).
+    Retorna a tabela do funil e os tempos de resposta de cada conversão.
+    """
+    pos_chegadas, pos_respostas, grupos = _primeiros_por_grupo(reduzidos, coluna_etapa)
+    chegadas = reduzidos.iloc[pos_chegadas]
+    respostas = reduzidos.iloc[pos_respostas]
+    total_leads = chegadas[DEAL_COL].nunique()
+
+    # Tempo de resposta: da chegada na etapa (mesmo grupo) até a primeira resposta nela
+    horario = reduzidos[EVENT_TIME_COL].to_numpy()
+    chegada_do_grupo = np.empty(grupos.max(initial=0) + 1, dtype=horario.dtype)
+    chegada_do_grupo[grupos[pos_chegadas]] = horario[pos_chegadas]
+    espera = horario[pos_respostas] - chegada_do_grupo[grupos[pos_respostas]]
+    tempos = respostas[[DEAL_COL, coluna_etapa]].copy()
+    tempos[RESPONSE_HOURS_COL] = espera / np.timedelta64(1, 'h')
+
+    por_etapa = chegadas.groupby(coluna_etapa, observed=True)
+    funil = pd.DataFrame({'Leads na etapa': por_etapa.size()})
+    funil['Conversões'] = respostas.groupby(coluna_etapa, observed=True).size()
+    funil['Conversões'] = funil['Conversões'].fillna(0).astype('int64')
+    funil['Alcance (%)'] = (funil['Leads na etapa'] / total_leads * 100).round(2)
+    funil['Taxa de conversão (%)'] = (funil['Conversões'] / funil['Leads na etapa'] * 100).round(2)
+    horas = tempos.groupby(coluna_etapa, observed=True)[RESPONSE_HOURS_COL]
+    funil['Resposta mediana (h)'] = horas.median().round(2)
+    funil['Resposta p90 (h)'] = horas.quantile(0.9).round(2)
+
+    if ordem_etapas is None:
+        inicio_lead = chegadas.groupby(DEAL_COL, observed=True)[EVENT_TIME_COL].transform('min')
+        atraso = (chegadas[EVENT_TIME_COL] - inicio_lead).dt.total_seconds()
+        ordem_etapas = atraso.groupby(chegadas[coluna_etapa], observed=True).median().sort_values(kind='stable').index
+    funil = funil.reindex([etapa for etapa in ordem_etapas if etapa in funil.index])
+    funil = funil.rename_axis('Etapa').reset_index()
+    return funil[FUNNEL_COLUMNS], tempos.rename(columns={coluna_etapa: 'Etapa'})
+
+
+def funil_por_etapa(df, coluna_conversao='Tipo', valor_conversao='Cancelado-Lead-Respondeu', coluna_etapa='Etapa', ordem_etapas=None):
+    """
+    Funil do log inteiro em memória. Retorna a tabela do funil, os tempos de
+    resposta e uma mensagem (tabelas vazias se faltarem colunas).
+    """
+    faltantes = colunas_faltantes(df.columns, coluna_etapa)
+    if faltantes:
+        return pd.DataFrame(columns=FUNNEL_COLUMNS), pd.DataFrame(), f"Funil indisponível: coluna(s) {', '.join(faltantes)} não encontrada(s)."
+    eventos = preparar_eventos(df, coluna_conversao, valor_conversao, coluna_etapa)
+    if eventos.empty:
+        return pd.DataFrame(columns=FUNNEL_COLUMNS), pd.DataFrame(), "Funil indisponível: nenhum evento com Deal ID, etapa e data válidos."
+    funil, tempos = calcular_funil(reduzir_eventos(eventos, coluna_etapa), coluna_etapa, ordem_etapas)
+    return funil, tempos, "Funil calculado com sucesso!"
+
+
+def funil_em_blocos(source, coluna_conversao='Tipo', valor_conversao='Cancelado-Lead-Respondeu', coluna_etapa='Etapa', chunksize=DEFAULT_CHUNKSIZE, ordem_etapas=None):
+    """
+    Versão streaming de `funil_por_etapa` para CSVs grandes: cada bloco é
+    reduzido ao primeiro evento e à primeira resposta por (deal, etapa), então a
+    memória depende do número de deals, não do número de eventos.
+    """
+    colunas_usadas = {DEAL_COL, EVENT_TIME_COL, coluna_etapa, coluna_conversao}
+    reader = pd.read_csv(source, usecols=lambda col: col in colunas_usadas, chunksize=chunksize)
+
+    partes = []
+    with reader:
+        for chunk in reader:
+            faltantes = colunas_faltantes(chunk.columns, coluna_etapa)
+            if faltantes:
+                return pd.DataFrame(columns=FUNNEL_COLUMNS), pd.DataFrame(), f"Funil indisponível: coluna(s) {', '.join(faltantes)} não encontrada(s)."
+            partes.append(reduzir_eventos(preparar_eventos(chunk, coluna_conversao, valor_conversao, coluna_etapa), coluna_etapa))
+
+    partes = [parte for parte in partes if not parte.empty]
+    if not partes:
+        return pd.DataFrame(columns=FUNNEL_COLUMNS), pd.DataFrame(), "Funil indisponível: nenhum evento com Deal ID, etapa e data válidos."
+    funil, tempos = calcular_funil(pd.concat(partes, ignore_index=True), coluna_etapa, ordem_etapas)
+    return funil, tempos, "Funil calculado com sucesso!"
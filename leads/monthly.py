@@ -0,0 +1,107 @@
+"""
+Comparativo mês a mês dos leads: contagens por mês, variação e crescimento.
+
+As contagens mensais saem do cubo de agregação (uma subtração por fronteira de
+mês) ou, sem cubo, de um único `groupby` sobre a data agrupada por mês.
+"""
+import numpy as np
+import pandas as pd
+
+from leads.classify import CATEGORIA_INVALIDO, CATEGORIA_SEM_QUALIFICACAO, CATEGORIA_VALIDO
+from leads.pipeline import CATEGORY_COL, TARGET_DATE_COL, TARGET_SEGMENT_COL, TARGET_SITUATION_COL
+from leads.rules import evaluate_rules, get_rules
+
+MONTH_COL = 'mes'
+SUMMARY_CATEGORIES = {
+    'Válidos': CATEGORIA_VALIDO,
+    'Inválidos': CATEGORIA_INVALIDO,
+    'Sem qualificação': CATEGORIA_SEM_QUALIFICACAO,
+}
+
+
+def monthly_rollup(cube, start_date=None, end_date=None):
+    """Células do cubo com a contagem de cada mês do período (formato longo, sem zeros)."""
+    months, totals = cube.monthly_totals(start_date, end_date)
+    month_pos, cell_pos = np.nonzero(totals)
+    rollup = cube.cells.iloc[cell_pos].reset_index(drop=True)
+    rollup.insert(0, MONTH_COL, months[month_pos])
+    rollup['count'] = totals[month_pos, cell_pos]
+    return rollup
+
+
+def monthly_rollup_from_frame(df, dims=None):
+    """Mesmo resultado de `monthly_rollup`, agrupando as linhas de `df` em uma passada."""
+    if dims is None:
+        dims = [TARGET_SEGMENT_COL, CATEGORY_COL]
+        if TARGET_SITUATION_COL in df.columns:
+            dims.append(TARGET_SITUATION_COL)
+    keys = [df[TARGET_DATE_COL].dt.to_period('M').rename(MONTH_COL)] + [df[dim].astype(object) for dim in dims]
+    return df.groupby(keys, dropna=False).size().rename('count').reset_index()
+
+
+def add_growth(table, columns):
+    """Acrescenta, para cada coluna, a variação absoluta (Δ) e o crescimento (%) em relação ao mês anterior."""
+    table = table.copy()
+    for column in columns:
+        previous = table[column].shift(1)
+        table[f'Δ {column}'] = table[column] - previous
+        growth = (table[column] - previous) / previous.replace(0, np.nan) * 100
+        table[f'% {column}'] = growth.round(2)
+    return table
+
+
+def _flag_masks(rollup, keyword_rules=None):
+    """Máscaras das flags cujas colunas existem no rollup (as demais não entram no resumo)."""
+    keyword_rules = keyword_rules or get_rules()
+    _, flags = evaluate_rules(rollup, keyword_rules, exclude=False)
+    return {
+        name: mask for name, mask in flags.items()
+        if keyword_rules['flags'][name]['column'] in rollup.columns
+    }
+
+
+def monthly_summary(rollup, keyword_rules=None):
+    """
+    Uma linha por mês: total de leads, válidos/inválidos/sem qualificação,
+    oportunidade/perdido, com variação e crescimento em relação ao mês anterior.
+    """
+    if rollup.empty:
+        return pd.DataFrame()
+    months = pd.period_range(rollup[MONTH_COL].min(), rollup[MONTH_COL].max(), freq='M')
+    summary = pd.DataFrame(index=pd.Index(months, name=MONTH_COL))
+    summary['Leads'] = rollup.groupby(MONTH_COL)['count'].sum()
+
+    by_category = rollup.groupby([MONTH_COL, CATEGORY_COL], observed=True)['count'].sum().unstack(fill_value=0)
+    for label, categoria in SUMMARY_CATEGORIES.items():
+        summary[label] = by_category[categoria] if categoria in by_category.columns else 0
+
+    value_columns = ['Leads', *SUMMARY_CATEGORIES]
+    for label, mask in _flag_masks(rollup, keyword_rules).items():
+        summary[label] = rollup[mask].groupby(MONTH_COL)['count'].sum()
+        value_columns.append(label)
+
+    summary = summary.fillna(0).astype('int64')
+    return add_growth(summary, value_columns)
+
+
+def monthly_segment_situation(rollup, flag, keyword_rules=None):
+    """
+    Leads que casam com a regra `flag` (ex.: 'Perdido'), por segmento (linhas) e
+    mês (colunas), com a variação e o crescimento do último mês em relação ao
+    anterior.
+    """
+    _, flags = evaluate_rules(rollup, keyword_rules, exclude=False)
+    matched = rollup[flags[flag]]
+    if matched.empty:
+        return pd.DataFrame()
+    table = matched.pivot_table(
+        index=TARGET_SEGMENT_COL, columns=MONTH_COL, values='count', aggfunc='sum', fill_value=0
+    )
+    table = table.reindex(columns=pd.period_range(table.columns.min(), table.columns.max(), freq='M'), fill_value=0)
+    table.columns = [str(month) for month in table.columns]
+    last = table.columns[-1]
+    if len(table.columns) >= 2:
+        previous = table.columns[-2]
+        table['Δ último mês'] = table[last] - table[previous]
+        table['% último mês'] = ((table[last] - table[previous]) / table[previous].replace(0, np.nan) * 100).round(2)
+    return table.sort_values(by=last, ascending=False)
@@ -0,0 +1,661 @@
+"""
+Pipeline de processamento das planilhas de leads, sem dependência do Streamlit.
+
+Etapas: leitura -> padronização das colunas -> datas -> classificação ->
+remoção de duplicado/teste -> agregações. Os dashboards, o app.py e os
+scripts de linha de comando chamam estas funções.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from leads.cache import hash_bytes
+from leads.classify import CATEGORIA_SEM_QUALIFICACAO, classify_leads
+from leads.columnar import get_columnar_cache
+from leads.cube import LeadCube
+from leads.dateindex import DateIndex, sort_by_date
+from leads.dates import REASON_EMPTY, dropped_rows, parse_dates
+from leads.dedupe import KEEP_POLICIES, drop_duplicate_leads, identity_keys, keys_duplicate_mask
+from leads.diagnostics import stage
+from leads.dtypes import as_text, memory_bytes, optimize_dtypes
+from leads.excel import DEFAULT_SHEETS, SOURCE_COLUMNS_ATTR, read_excel
+from leads.export import export_bytes
+from leads.filters import FilterIndex, freeze_selections
+from leads.registry import get_dataset_registry
+from leads.rules import evaluate_rules, get_rules, rules_fingerprint
+from leads.store import KEY_COL
+
+TARGET_STATUS_COL = 'status'
+TARGET_DATE_COL = 'data_da_conversao'
+TARGET_SEGMENT_COL = 'segmento_categoria'
+TARGET_SITUATION_COL = 'situacao'
+CATEGORY_COL = 'categoria_lead'
+
+REQUIRED_COLUMNS = [TARGET_STATUS_COL, TARGET_DATE_COL, TARGET_SEGMENT_COL]
+OPTIONAL_COLUMNS = [TARGET_SITUATION_COL]
+# Colunas com filtro por valor nos dashboards -> rótulo na barra lateral
+FILTER_COLUMNS = {
+    TARGET_SEGMENT_COL: 'Segmento/Categoria',
+    TARGET_SITUATION_COL: 'Situação',
+    CATEGORY_COL: 'Categoria do lead',
+}
+
+# Nome padronizado -> variações aceitas na planilha do usuário
+COLUMN_ALIASES = {
+    TARGET_STATUS_COL: ['Status', 'status'],
+    TARGET_DATE_COL: ['Data da conversão:', 'Data da conversão', 'data_da_conversao'],
+    TARGET_SEGMENT_COL: ['Segmento/Categoria', 'segmento_categoria'],
+    TARGET_SITUATION_COL: ['Situação', 'situacao'],
+}
+
+# Colunas que identificam o lead (nome normalizado -> tipo da chave), usadas na remoção de duplicados
+IDENTITY_COLUMNS = {
+    'telefone': 'phone',
+    'celular': 'phone',
+    'whatsapp': 'phone',
+    'e_mail': 'email',
+    'email': 'email',
+    'deal_id': 'id',
+}
+# Duplicados: 'first' mantém a primeira ocorrência, 'last' a última, 'off' não remove.
+# Desligado por padrão: as contagens só mudam quando o usuário escolhe remover os repetidos
+DEFAULT_DEDUPE = os.environ.get('LEADS_DEDUPE', 'off')
+# Formato da data de conversão (strftime, ex.: '%d/%m/%Y'); vazio = detectado em cada planilha
+DEFAULT_DATE_FORMAT = os.environ.get('LEADS_DATE_FORMAT') or None
+
+
+def normalize_col_name(col_name):
+    return col_name.strip().lower().replace(' ', '_').replace('-', '_').replace('/', '_').replace(':', '')
+
+
+# Colunas (nomes normalizados) que os dashboards usam; as demais nem são lidas da planilha
+LEAD_COLUMNS = frozenset(
+    [normalize_col_name(alias) for aliases in COLUMN_ALIASES.values() for alias in aliases] + list(IDENTITY_COLUMNS) + ['nome']
+)
+
+
+def read_variant(columns=None, sheets=DEFAULT_SHEETS):
+    """Sufixo da variante na cópia colunar para uma seleção de colunas e abas ('' = leitura completa)."""
+    if columns is None and sheets == 'first':
+        return ''
+    return '-' + hash_bytes(repr((sorted(columns) if columns is not None else None, sheets)).encode())[:8]
+
+
+def read_spreadsheet(file_name, content, columnar_cache=None, columns=None, sheets=DEFAULT_SHEETS):
+    """
+    Lê o conteúdo (bytes) de um arquivo CSV ou Excel e retorna o DataFrame.
+    `columns` limita a leitura às colunas cujo nome normalizado está no conjunto
+    (ex.: LEAD_COLUMNS); `sheets='all'` junta todas as abas do Excel. Com
+    `columnar_cache`, reaproveita a cópia Parquet do mesmo conteúdo.
+    """
+    if columnar_cache is not None:
+        df, _ = columnar_cache.get_or_build(
+            hash_bytes(content), 'raw' + read_variant(columns, sheets),
+            lambda: (read_spreadsheet(file_name, content, columns=columns, sheets=sheets), {}),
+        )
+        return df
+
+    name = file_name.lower()
+    if not name.endswith(('.csv', '.xlsx', '.xls')):
+        raise ValueError(f"Formato de arquivo não suportado: {file_name}")
+    usecols = None if columns is None else (lambda col: normalize_col_name(str(col)) in columns)
+    with stage('ler planilha') as record:
+        if name.endswith('.csv'):
+            df = pd.read_csv(BytesIO(content), usecols=usecols)
+            if columns is not None:
+                df.attrs[SOURCE_COLUMNS_ATTR] = [str(col) for col in pd.read_csv(BytesIO(content), nrows=0).columns]
+        else:
+            df = read_excel(content, usecols=usecols, sheets=sheets, normalize=normalize_col_name)
+        record['rows_out'] = len(df)
+    return df
+
+
+def standardize_columns(df, targets=REQUIRED_COLUMNS):
+    """
+    Renomeia (in-place) as colunas cujo nome normalizado corresponde a uma das
+    variações conhecidas dos `targets`. Retorna o dicionário de renomeação aplicado.
+    """
+    potential_names = {
+        target: [normalize_col_name(alias) for alias in COLUMN_ALIASES[target]]
+        for target in targets
+    }
+    found = {}
+    current_normalized_cols_map = {normalize_col_name(col): col for col in df.columns}
+    for norm_name, original_name in current_normalized_cols_map.items():
+        for target, names in potential_names.items():
+            if norm_name in names:
+                found[target] = original_name
+
+    rename_dict = {
+        found[target]: target
+        for target in targets
+        if target in found and found[target] != target
+    }
+    if rename_dict:
+        df.rename(columns=rename_dict, inplace=True)
+    return rename_dict
+
+
+def missing_columns(df, required=REQUIRED_COLUMNS):
+    return [col for col in required if col not in df.columns]
+
+
+def coerce_dates(df, date_col=TARGET_DATE_COL, date_format=None):
+    """
+    Converte a coluna de data e remove (in-place) as linhas com data inválida.
+    Retorna o relatório da conversão (formato usado e linhas removidas por motivo).
+    """
+    df[date_col], report = parse_dates(df[date_col], date_format)
+    df.dropna(subset=[date_col], inplace=True)
+    return report
+
+
+def add_lead_category(df, status_col=TARGET_STATUS_COL, rules=None):
+    df[CATEGORY_COL] = classify_leads(df[status_col], rules=rules)
+    return df
+
+
+def remove_excluded_rows(df, keyword_rules=None):
+    """
+    Remove as linhas que casam com as regras de exclusão (por padrão, 'duplicado'
+    ou 'teste' no segmento). As colunas envolvidas passam a ser texto. Retorna o
+    novo DataFrame e quantas linhas saíram.
+    """
+    keyword_rules = keyword_rules or get_rules()
+    columns = [col for col in keyword_rules['exclude'] if col in df.columns]
+    for column in columns:
+        df[column] = as_text(df[column])
+    excluded, _ = evaluate_rules(df, keyword_rules, flags=False)
+    filtered = df[~excluded].copy()
+    for column in columns:
+        if isinstance(filtered[column].dtype, pd.CategoricalDtype):
+            filtered[column] = filtered[column].cat.remove_unused_categories()
+    return filtered, len(df) - len(filtered)
+
+
+def identity_columns(df):
+    """Colunas de telefone/e-mail/Deal ID presentes em `df` -> tipo da chave."""
+    columns = {}
+    for col in df.columns:
+        kind = IDENTITY_COLUMNS.get(normalize_col_name(str(col)))
+        if kind is not None:
+            columns[col] = kind
+    return columns
+
+
+def remove_duplicate_leads(df, keep=DEFAULT_DEDUPE):
+    """
+    Remove os leads repetidos (mesmo telefone, e-mail ou Deal ID normalizado),
+    mantendo a primeira ou a última ocorrência. Com keep='off', não remove nada.
+    """
+    if keep not in KEEP_POLICIES:
+        return df, 0
+    return drop_duplicate_leads(df, identity_columns(df), keep=keep)
+
+
+def standardize_leads(df, optional_columns=(TARGET_SITUATION_COL,), date_format=DEFAULT_DATE_FORMAT):
+    """
+    Padroniza as colunas, converte as datas e compacta os tipos de um DataFrame
+    recém-lido. Retorna o DataFrame (None se faltarem colunas obrigatórias) e os metadados
+    exibidos na interface. É o estado guardado na cópia colunar.
+    """
+    meta = {
+        'original_columns': df.attrs.get(SOURCE_COLUMNS_ATTR) or [str(col) for col in df.columns],
+        'rename_dict': standardize_columns(df, REQUIRED_COLUMNS + list(optional_columns)),
+        'missing_cols': [],
+        'invalid_dates': 0,
+        'date_report': None,
+        'memory': None,
+    }
+    meta['missing_cols'] = missing_columns(df)
+    if meta['missing_cols']:
+        return None, meta
+
+    with stage('converter datas', len(df)) as record:
+        meta['date_report'] = coerce_dates(df, date_format=date_format)
+        meta['invalid_dates'] = dropped_rows(meta['date_report'])
+        record['rows_out'] = len(df)
+    with stage('compactar tipos', len(df)):
+        meta['memory'] = optimize_dtypes(df)
+    return df, meta
+
+
+def finish_leads(df, meta, rules=None, keyword_rules=None, dedupe=DEFAULT_DEDUPE):
+    """
+    Classifica, remove duplicado/teste e os leads repetidos e ordena por data um
+    DataFrame já padronizado. Retorna o dicionário usado pelos dashboards: o DataFrame final em
+    'df' (ou None), o índice de datas em 'date_index', o cubo de agregação em
+    'cube', o índice dos filtros por valor em 'filter_index' e os metadados da
+    padronização.
+    """
+    prepared = dict(meta, df=None, rows_removed=0, duplicates_removed=0, date_index=None, cube=None, filter_index=None)
+    if df is None:
+        return prepared
+
+    with stage('classificar', len(df)):
+        add_lead_category(df, rules=rules)
+    with stage('remover duplicado/teste', len(df)) as record:
+        df, prepared['rows_removed'] = remove_excluded_rows(df, keyword_rules)
+        record['rows_out'] = len(df)
+    with stage('remover leads repetidos', len(df)) as record:
+        df, prepared['duplicates_removed'] = remove_duplicate_leads(df, dedupe)
+        record['rows_out'] = len(df)
+    # Ordenado por data, o filtro de período é uma busca binária no índice
+    with stage('ordenar e indexar datas', len(df)):
+        prepared['df'] = sort_by_date(df, TARGET_DATE_COL)
+        prepared['date_index'] = DateIndex(prepared['df'][TARGET_DATE_COL])
+    with stage('montar cubo', len(df)):
+        prepared['cube'] = build_cube(prepared['df'])
+    with stage('indexar filtros', len(df)):
+        prepared['filter_index'] = FilterIndex(prepared['df'], FILTER_COLUMNS)
+    return prepared
+
+
+def cube_dims(df):
+    dims = [TARGET_SEGMENT_COL, CATEGORY_COL]
+    if TARGET_SITUATION_COL in df.columns:
+        dims.append(TARGET_SITUATION_COL)
+    return dims
+
+
+def build_cube(df):
+    """Cubo diário (dia, segmento, categoria[, situação]) -> contagem. None se ficar grande demais."""
+    return LeadCube.from_frame(df, TARGET_DATE_COL, cube_dims(df))
+
+
+def prepare_leads(df, optional_columns=(TARGET_SITUATION_COL,), rules=None, dedupe=DEFAULT_DEDUPE,
+                  date_format=DEFAULT_DATE_FORMAT):
+    """
+    Executa, sobre um DataFrame recém-lido, todas as etapas que dependem apenas do
+    conteúdo da planilha.
+    """
+    return finish_leads(*standardize_leads(df, optional_columns, date_format), rules=rules, dedupe=dedupe)
+
+
+def load_leads(file_name, content, optional_columns=(TARGET_SITUATION_COL,), columnar_cache=None, source=None,
+               dedupe=DEFAULT_DEDUPE, date_format=DEFAULT_DATE_FORMAT, columns=None, sheets=DEFAULT_SHEETS):
+    """
+    Lê e prepara uma planilha. Com `columnar_cache`, a leitura, a padronização e a
+    conversão das datas vêm da cópia Parquet quando o mesmo conteúdo já foi visto;
+    `source` (caminho do arquivo) permite apagar as cópias de versões anteriores.
+    `columns` e `sheets` são repassados a `read_spreadsheet`.
+    """
+    content_hash = hash_bytes(content)
+    if columnar_cache is None:
+        prepared = prepare_leads(
+            read_spreadsheet(file_name, content, columns=columns, sheets=sheets),
+            optional_columns=optional_columns, dedupe=dedupe, date_format=date_format,
+        )
+    else:
+        variant = '-'.join(['leads', *optional_columns])
+        if date_format:
+            variant += '-' + re.sub(r'\W', '', date_format)
+        variant += read_variant(columns, sheets)
+        df, meta = columnar_cache.get_or_build(
+            content_hash,
+            variant,
+            lambda: standardize_leads(
+                read_spreadsheet(file_name, content, columns=columns, sheets=sheets), optional_columns, date_format
+            ),
+            source=source,
+        )
+        prepared = finish_leads(df, meta, dedupe=dedupe)
+    prepared['content_hash'] = content_hash
+    return prepared
+
+
+def load_leads_cached(file_name, content, optional_columns=(TARGET_SITUATION_COL,), dedupe=DEFAULT_DEDUPE,
+                      date_format=DEFAULT_DATE_FORMAT, columns=None, sheets=DEFAULT_SHEETS, session=None):
+    """
+    `load_leads` através do registro de conjuntos do processo (e da cópia
+    colunar em disco, se ativada): o mesmo conteúdo só é processado uma vez e
+    fica numa cópia só para todas as sessões. Com `session` (um
+    `RegistrySession`), a sessão segura o conjunto enquanto o estiver usando.
+    O DataFrame retornado é compartilhado e não deve ser alterado in-place;
+    'cache_key' identifica o resultado, para cachear o que for derivado dele.
+    """
+    key = (
+        'load_leads', tuple(optional_columns), dedupe, date_format, read_variant(columns, sheets),
+        rules_fingerprint(get_rules()), hash_bytes(content),
+    )
+    return get_dataset_registry().acquire(
+        key,
+        lambda: dict(
+            load_leads(
+                file_name, content, optional_columns=optional_columns, columnar_cache=get_columnar_cache(), dedupe=dedupe,
+                date_format=date_format, columns=columns, sheets=sheets,
+            ),
+            cache_key=key,
+        ),
+        session=session,
+        slot='leads',
+    )
+
+
+def ingest_spreadsheet(store, file_name, content, date_format=DEFAULT_DATE_FORMAT, sheets=DEFAULT_SHEETS):
+    """
+    Padroniza uma planilha e acrescenta os leads dela à base local `store`.
+    Retorna os metadados da padronização com 'inserted' (linhas novas gravadas),
+    'existing' (linhas já gravadas por uma planilha anterior) e 'already_imported'
+    (mesmo conteúdo já importado antes, nada é relido).
+    A base guarda todas as colunas da planilha (sem `columns`).
+    """
+    content_hash = hash_bytes(content)
+    if store.has_source(content_hash):
+        return {'already_imported': True, 'inserted': 0, 'existing': 0, 'missing_cols': [], 'rename_dict': {}}
+    df, meta = standardize_leads(read_spreadsheet(file_name, content, sheets=sheets), date_format=date_format)
+    meta.update(already_imported=False, inserted=0, existing=0)
+    if df is not None:
+        meta['inserted'] = store.append(df, content_hash, file_name)
+        meta['existing'] = len(df) - meta['inserted']
+    return meta
+
+
+def concat_rows(frames):
+    """
+    `pd.concat` de partes de um mesmo conjunto que mantém categóricas as colunas
+    categóricas em todas as partes (com as categorias unidas; o concat comum as
+    tornaria texto solto).
+    """
+    parts = [frame for frame in frames if len(frame)] or list(frames[:1])
+    if len(parts) == 1:
+        return parts[0]
+    for col in parts[0].columns:
+        dtypes = [part[col].dtype for part in parts if col in part.columns]
+        if len(dtypes) < len(parts) or not all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            continue
+        categories = dtypes[0].categories
+        for dtype in dtypes[1:]:
+            categories = categories.union(dtype.categories)
+        parts = [
+            part if part[col].dtype.categories.equals(categories) else part.assign(**{col: part[col].cat.set_categories(categories)})
+            for part in parts
+        ]
+    return pd.concat(parts)
+
+
+class StoreLeads:
+    """
+    Leads da base local processados de forma incremental. A cada versão da base,
+    só as linhas novas passam pela conversão de datas, compactação de tipos,
+    classificação, regras de exclusão e normalização das chaves de
+    identificação, e o cubo recebe só a diferença (linhas que entraram menos as
+    que passaram a ser repetidas, com keep='last'). As demais linhas ficam como
+    estavam; a ordenação por data junta as linhas novas às já ordenadas.
+    """
+
+    def __init__(self, optional_columns=(TARGET_SITUATION_COL,), dedupe=DEFAULT_DEDUPE, rules=None, keyword_rules=None):
+        self.optional_columns = tuple(optional_columns)
+        self.dedupe = dedupe
+        self.rules = rules
+        self.keyword_rules = keyword_rules
+        self.last_id = 0
+        self.kept = None  # leads mantidos, ordenados por data (índice: chave do lead)
+        self.dropped = None  # leads repetidos, fora de `kept`
+        self.identity = pd.DataFrame()  # chaves normalizadas de `kept` + `dropped`, na ordem de chegada
+        self.removed = pd.Series(dtype=object)  # chave -> motivo ('data' ou 'regra') das linhas descartadas
+        self.cube = None
+        self.cube_dims = None
+        self.date_report = None
+        self.memory = None
+        self._bytes_per_row = 0.0
+        self._rows_seen = 0
+        self._lock = threading.Lock()
+
+    def update(self, store):
+        """Lê da base só as linhas novas, processa e retorna o dicionário de `finish_leads`."""
+        with self._lock:
+            batch, last_id = store.read(self.last_id)
+            meta = {
+                'original_columns': [str(col) for col in store.columns()],
+                'rename_dict': {},
+                'missing_cols': missing_columns(batch),
+                'invalid_dates': 0,
+                'date_report': None,
+                'memory': None,
+            }
+            if meta['missing_cols']:
+                return finish_leads(None, meta)
+            if len(batch) or self.kept is None:
+                self._merge(batch)
+            self.last_id = last_id
+            return self._prepared(meta)
+
+    def _process(self, batch):
+        with np.errstate(over='ignore'):  # o pandas testa se as chaves (hash de 64 bits) formam um intervalo
+            batch = batch.set_index(KEY_COL)
+        batch = batch.drop(columns=[col for col in OPTIONAL_COLUMNS if col in batch.columns and col not in self.optional_columns])
+        keys = batch.index
+        with stage('converter datas', len(batch)):
+            report = coerce_dates(batch)
+        invalid = keys.difference(batch.index)
+        with stage('compactar tipos', len(batch)):
+            memory = optimize_dtypes(batch)
+        with stage('classificar', len(batch)):
+            add_lead_category(batch, rules=self.rules)
+        with stage('remover duplicado/teste', len(batch)) as record:
+            fresh, _ = remove_excluded_rows(batch, self.keyword_rules)
+            record['rows_out'] = len(fresh)
+        self.date_report = report
+        self._rows_seen += len(keys)
+        self._bytes_per_row += (memory['before'] - self._bytes_per_row * len(keys)) / max(self._rows_seen, 1)
+        self.memory = memory
+        return fresh, invalid, batch.index.difference(fresh.index)
+
+    def _merge(self, batch):
+        fresh, invalid, excluded = self._process(batch)
+        old_kept = self.kept if self.kept is not None else fresh.iloc[:0]
+        old_dropped = self.dropped if self.dropped is not None else fresh.iloc[:0]
+
+        # As linhas descartadas guardam o motivo
+        self.removed = pd.concat([
+            self.removed,
+            pd.Series('data', index=invalid, dtype=object),
+            pd.Series('regra', index=excluded, dtype=object),
+        ])
+        with stage('remover leads repetidos', len(fresh)) as record:
+            self.identity = concat_rows([self.identity, identity_keys(fresh, identity_columns(fresh))])
+            if self.dedupe in KEEP_POLICIES and len(self.identity.columns):
+                repeated = keys_duplicate_mask(self.identity, self.dedupe).to_numpy()
+            else:
+                repeated = np.zeros(len(self.identity), dtype=bool)
+            kept_keys = self.identity.index[~repeated]
+            record['rows_out'] = len(kept_keys)
+
+        # A base só recebe inserções: uma linha repetida continua repetida, e com
+        # keep='last' uma linha nova pode tornar repetida uma linha já mantida
+        leaving = ~old_kept.index.isin(kept_keys)
+        fresh_kept = fresh.index.isin(kept_keys)
+        entering = fresh[fresh_kept]
+        left = old_kept[leaving]
+        with stage('ordenar e indexar datas', len(entering)):
+            self.kept = sort_by_date(
+                concat_rows([old_kept[~leaving], sort_by_date(entering, TARGET_DATE_COL)]), TARGET_DATE_COL
+            )
+            if not self.kept.columns.equals(fresh.columns):
+                # A leitura traz todas as colunas da base: as que chegaram agora ficam vazias nas linhas antigas
+                self.kept = self.kept.reindex(columns=fresh.columns)
+        self.dropped = concat_rows([old_dropped, left, fresh[~fresh_kept]])
+
+        with stage('montar cubo', len(entering) + len(left)):
+            dims = cube_dims(self.kept)
+            if dims != self.cube_dims:
+                self.cube, self.cube_dims = build_cube(self.kept), dims
+            elif self.cube is not None:
+                parts = [(self.cube, 1)] + [
+                    (LeadCube.from_frame(frame, TARGET_DATE_COL, dims), sign)
+                    for frame, sign in ((entering, 1), (left, -1)) if len(frame)
+                ]
+                self.cube = LeadCube.combine(parts, dims)
+
+    def _prepared(self, meta):
+        df = self.kept.reset_index(drop=True)
+        invalid = int((self.removed == 'data').sum())
+        if self.date_report is not None:
+            # As datas da base já estão convertidas: só faltam as vazias
+            meta['date_report'] = dict(
+                self.date_report, dropped={**dict.fromkeys(self.date_report['dropped'], 0), REASON_EMPTY: invalid}
+            )
+        meta['invalid_dates'] = invalid
+        if self.memory is not None:
+            meta['memory'] = dict(self.memory, before=int(self._bytes_per_row * len(df)), after=memory_bytes(df))
+        prepared = dict(
+            meta,
+            df=df,
+            rows_removed=int((self.removed == 'regra').sum()),
+            duplicates_removed=len(self.dropped),
+            date_index=DateIndex(df[TARGET_DATE_COL]),
+            cube=self.cube,
+        )
+        with stage('indexar filtros', len(df)):
+            prepared['filter_index'] = FilterIndex(df, FILTER_COLUMNS)
+        return prepared
+
+
+# Estados incrementais por base e opções (os menos usados saem antes)
+MAX_STORE_STATES = 4
+_store_leads = OrderedDict()
+_store_leads_lock = threading.Lock()
+
+
+def get_store_leads(store, optional_columns=(TARGET_SITUATION_COL,), dedupe=DEFAULT_DEDUPE):
+    """`StoreLeads` da base `store` com estas opções e as regras atuais, compartilhado pelas sessões."""
+    key = (store.path, tuple(optional_columns), dedupe, rules_fingerprint(get_rules()))
+    with _store_leads_lock:
+        state = _store_leads.get(key)
+        if state is None:
+            state = _store_leads[key] = StoreLeads(optional_columns, dedupe)
+        _store_leads.move_to_end(key)
+        while len(_store_leads) > MAX_STORE_STATES:
+            _store_leads.popitem(last=False)
+        return state
+
+
+def load_store_leads(store, optional_columns=(TARGET_SITUATION_COL,), dedupe=DEFAULT_DEDUPE, session=None):
+    """
+    Prepara os leads acumulados na base local, como `load_leads_cached`. O
+    resultado fica no registro de conjuntos até a base receber linhas novas;
+    então só essas linhas são lidas do disco e processadas (`StoreLeads`).
+    """
+    version = store.version
+    key = ('store', store.path, version, tuple(optional_columns), dedupe, rules_fingerprint(get_rules()))
+    state = get_store_leads(store, optional_columns, dedupe)
+
+    def prepare():
+        prepared = state.update(store)
+        prepared['content_hash'] = f"store-{version}"
+        prepared['cache_key'] = key
+        return prepared
+
+    return get_dataset_registry().acquire(key, prepare, session=session, slot='leads')
+
+
+def period_cached(prepared, name, start_date, end_date, compute, selections=None):
+    """
+    Resultado de `compute()` para a parte `name` do dashboard (ex.: uma aba) no
+    período e nos filtros (`selections`) escolhidos, guardado junto com o
+    conjunto de `prepared` no registro ('cache_key'): voltar a uma aba ou a um
+    período já visto não refaz as agregações, em nenhuma sessão. O resultado é
+    compartilhado e não deve ser alterado.
+    """
+    return get_dataset_registry().derived(
+        prepared['cache_key'],
+        ('period', name, str(start_date), str(end_date), freeze_selections(selections)),
+        compute,
+    )
+
+
+def select_leads(prepared, start_date=None, end_date=None, selections=None):
+    """
+    Leads de `prepared` no período (sem datas, todos) e com os valores escolhidos
+    nos filtros, pelos índices de datas e de filtros do conjunto.
+    """
+    if start_date is None or end_date is None:
+        start, stop = 0, len(prepared['df'])
+    else:
+        start, stop = prepared['date_index'].positions(start_date, end_date)
+    return prepared['filter_index'].select(prepared['df'], selections, start, stop)
+
+
+def filter_by_date_range(df, start_date, end_date, date_col=TARGET_DATE_COL, date_index=None):
+    """
+    Leads com data entre `start_date` e `end_date`, inclusive. Com o `date_index`
+    do DataFrame ordenado, retorna uma fatia sem cópia (não alterar in-place).
+    """
+    if date_index is not None:
+        return date_index.slice(df, start_date, end_date)
+    return df[
+        (df[date_col].dt.date >= start_date)
+        & (df[date_col].dt.date <= end_date)
+    ].copy()
+
+
+def category_counts(df):
+    """Contagem e percentual de leads por categoria."""
+    lead_counts = df[CATEGORY_COL].value_counts()
+    # A coluna é categórica: categorias sem leads no período não entram na contagem
+    lead_counts = lead_counts[lead_counts > 0]
+    lead_percentages = (lead_counts / lead_counts.sum()).rename('proportion') * 100
+    return lead_counts, lead_percentages
+
+
+def unqualified_leads(df):
+    return df[df[CATEGORY_COL] == CATEGORIA_SEM_QUALIFICACAO]
+
+
+def situation_counts(df, keyword_rules=None):
+    """Quantos leads casam com cada regra de flag (por padrão, 'Oportunidade' e 'Perdido' na situação)."""
+    _, flags = evaluate_rules(df, keyword_rules, exclude=False)
+    return {name: int(mask.sum()) for name, mask in flags.items()}
+
+
+def order_segment_table(segment_analysis):
+    """
+    Põe a tabela de segmentos na ordem do dashboard original: segmentos e
+    categorias em ordem alfabética do texto (a do groupby/unstack sobre colunas
+    de texto), depois 'Total', e então do maior para o menor total. A ordem das
+    categorias das colunas categóricas não entra, nem nos empates do total.
+    """
+    segment_analysis = segment_analysis.loc[
+        sorted(segment_analysis.index, key=str), sorted(segment_analysis.columns, key=str)
+    ]
+    segment_analysis.columns = pd.Index(list(segment_analysis.columns), name=CATEGORY_COL)
+    segment_analysis['Total'] = segment_analysis.sum(axis=1)
+    return segment_analysis.sort_values(by='Total', ascending=False)
+
+
+def segment_breakdown(df, segment_col=TARGET_SEGMENT_COL):
+    """Contagem de leads por segmento e categoria, com a coluna 'Total', do maior para o menor."""
+    segment_analysis = df.groupby(segment_col, observed=True)[CATEGORY_COL].value_counts().unstack(fill_value=0)
+    return order_segment_table(segment_analysis.loc[:, segment_analysis.sum() > 0])
+
+
+def rollup_category_counts(rollup):
+    """`category_counts` a partir das células do cubo no período (`LeadCube.query`)."""
+    lead_counts = rollup.groupby(CATEGORY_COL, observed=True)['count'].sum()
+    lead_counts = lead_counts[lead_counts > 0].sort_values(ascending=False, kind='stable')
+    lead_percentages = (lead_counts / lead_counts.sum()).rename('proportion') * 100
+    return lead_counts, lead_percentages
+
+
+def rollup_situation_counts(rollup, keyword_rules=None):
+    """`situation_counts` a partir das células do cubo no período."""
+    _, flags = evaluate_rules(rollup, keyword_rules, exclude=False)
+    return {name: int(rollup['count'][mask].sum()) for name, mask in flags.items()}
+
+
+def rollup_segment_breakdown(rollup, segment_col=TARGET_SEGMENT_COL):
+    """`segment_breakdown` a partir das células do cubo."""
+    segment_analysis = rollup.pivot_table(
+        index=segment_col, columns=CATEGORY_COL, values='count', aggfunc='sum', fill_value=0, observed=True
+    )
+    return order_segment_table(segment_analysis.astype('int64'))
+
+
+def to_excel_bytes(df, sheet_name='Leads Processados'):
+    return export_bytes(df, 'xlsx', sheet_name=sheet_name)
@@ -0,0 +1,245 @@
+"""
+Registro, por processo, dos conjuntos de dados já preparados, compartilhados
+entre as sessões.
+
+Num servidor com vários analistas, todas as sessões do Streamlit rodam no mesmo
+processo. O cache de planilhas é um LRU: sob pressão de memória ele pode
+descartar a planilha que outra sessão está usando (que então é processada de
+novo, numa segunda cópia), e duas sessões que enviam o mesmo arquivo ao mesmo
+tempo processam o conteúdo duas vezes. Aqui cada conjunto (DataFrame
+normalizado, índice de datas, cubo e o que for derivado dele) existe uma vez
+por chave de conteúdo:
+
+- `acquire` carrega o conjunto uma vez só, mesmo com pedidos simultâneos (os
+  demais esperam o primeiro terminar);
+- cada sessão segura o conjunto que está vendo (contagem de referências);
+  trocar de arquivo ou encerrar a sessão solta a referência;
+- conjuntos sem nenhuma sessão ficam disponíveis por LEADS_REGISTRY_IDLE_SECONDS
+  e depois saem; acima de LEADS_REGISTRY_MAX_MB, os ociosos mais antigos saem
+  antes. Conjuntos em uso nunca são descartados;
+- `derived` guarda resultados calculados a partir do conjunto (agregações por
+  período), liberados junto com ele.
+
+Os dados são só para leitura: com o Copy-on-Write do pandas, um DataFrame
+derivado do compartilhado não o altera, mas ninguém deve alterar in-place o
+DataFrame recebido.
+"""
+import itertools
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+
+from leads.cache import estimate_size, get_parse_cache
+
+# Limites padrão, configuráveis por variável de ambiente
+DEFAULT_IDLE_SECONDS = float(os.environ.get('LEADS_REGISTRY_IDLE_SECONDS', 600))
+DEFAULT_MAX_MB = float(os.environ.get('LEADS_REGISTRY_MAX_MB', 1024))
+# Resultados derivados guardados por conjunto (os mais antigos saem antes)
+DEFAULT_MAX_DERIVED = 64
+
+_session_ids = itertools.count(1)
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'holders', 'last_used', 'ready', 'error', 'derived')
+
+    def __init__(self):
+        self.value = None
+        self.size = 0
+        self.holders = set()  # (id da sessão, slot)
+        self.last_used = time.monotonic()
+        self.ready = threading.Event()
+        self.error = None
+        self.derived = OrderedDict()  # nome -> (valor, tamanho em bytes)
+
+
+class RegistrySession:
+    """
+    Uma sessão do Streamlit no registro (guardada em `st.session_state`).
+    Quando a sessão termina e o objeto é coletado, os conjuntos que ela segurava
+    são soltos.
+    """
+
+    def __init__(self, registry):
+        self.id = next(_session_ids)
+        # Só anota a sessão: o finalizador pode rodar no meio de outra operação do registro
+        weakref.finalize(self, registry._released.append, self.id)
+
+
+class DatasetRegistry:
+    """Conjuntos de dados por chave, com contagem de referências por sessão e descarte dos ociosos."""
+
+    def __init__(self, idle_seconds=DEFAULT_IDLE_SECONDS, max_mb=DEFAULT_MAX_MB, max_derived=DEFAULT_MAX_DERIVED):
+        self.idle_seconds = idle_seconds
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_derived = max_derived
+        self._entries = {}
+        self._sessions = {}  # id da sessão -> {slot: chave}
+        self._released = deque()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def total_bytes(self):
+        return sum(entry.size for entry in self._entries.values())
+
+    def session(self):
+        return RegistrySession(self)
+
+    def acquire(self, key, load, session=None, slot='default'):
+        """
+        Conjunto de `key`, carregado por `load()` só se ainda não estiver no
+        registro. Com `session`, a sessão passa a segurar o conjunto no `slot`
+        (soltando o que segurava antes nele).
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            entry = self._entries.get(key)
+            loader = entry is None
+            if loader:
+                entry = self._entries[key] = _Entry()
+            if session is not None:
+                self._hold(session.id, slot, key, entry, now)
+            entry.last_used = now
+
+        if not loader:
+            entry.ready.wait()
+            if entry.error is not None:
+                raise entry.error
+            self.hits += 1
+            return entry.value
+
+        try:
+            value = load()
+        except BaseException as e:
+            with self._lock:
+                entry.error = e
+                self._drop(key)
+            entry.ready.set()
+            raise
+        size = estimate_size(value)
+        with self._lock:
+            entry.value, entry.size = value, size
+            self.loads += 1
+            self._sweep(time.monotonic())
+        entry.ready.set()
+        return value
+
+    def derived(self, key, name, compute):
+        """
+        Resultado `name` derivado do conjunto `key`, calculado por `compute()` na
+        primeira vez. Para chaves fora do registro, usa o cache de planilhas.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.ready.is_set() or entry.error is not None:
+                entry = None
+            elif name in entry.derived:
+                entry.derived.move_to_end(name)
+                entry.last_used = time.monotonic()
+                return entry.derived[name][0]
+        if entry is None:
+            return get_parse_cache().get_or_compute((name, key), compute)
+
+        value = compute()
+        size = estimate_size(value)
+        with self._lock:
+            if name not in entry.derived:
+                entry.derived[name] = (value, size)
+                entry.size += size
+                while len(entry.derived) > self.max_derived:
+                    _, (_, old_size) = entry.derived.popitem(last=False)
+                    entry.size -= old_size
+        return value
+
+    def release(self, session, slot='default'):
+        """A sessão deixa de segurar o conjunto do `slot`."""
+        with self._lock:
+            self._unhold(session.id, slot, time.monotonic())
+
+    def holders(self, key):
+        """Número de sessões que seguram o conjunto `key`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return len({session_id for session_id, _ in entry.holders}) if entry is not None else 0
+
+    def stats(self):
+        """Uma linha por conjunto: sessões, memória estimada, resultados derivados e tempo ocioso."""
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            return [
+                {
+                    'key': key,
+                    'sessions': len({session_id for session_id, _ in entry.holders}),
+                    'size_mb': round(entry.size / (1024 * 1024), 2),
+                    'derived': len(entry.derived),
+                    'idle_seconds': None if entry.holders else round(now - entry.last_used, 1),
+                }
+                for key, entry in self._entries.items()
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sessions.clear()
+
+    def _hold(self, session_id, slot, key, entry, now):
+        slots = self._sessions.setdefault(session_id, {})
+        if slots.get(slot) == key:
+            return
+        self._unhold(session_id, slot, now)
+        slots[slot] = key
+        entry.holders.add((session_id, slot))
+
+    def _unhold(self, session_id, slot, now):
+        key = self._sessions.get(session_id, {}).pop(slot, None)
+        entry = self._entries.get(key) if key is not None else None
+        if entry is not None:
+            entry.holders.discard((session_id, slot))
+            entry.last_used = now
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for session_id, slot in entry.holders:
+                self._sessions.get(session_id, {}).pop(slot, None)
+
+    def _sweep(self, now):
+        # Sessões encerradas (finalizadores) soltam o que seguravam
+        while self._released:
+            session_id = self._released.popleft()
+            for slot in list(self._sessions.get(session_id, {})):
+                self._unhold(session_id, slot, now)
+            self._sessions.pop(session_id, None)
+
+        # Só pelo horário: as chaves não são comparáveis entre si (None e texto na mesma posição)
+        idle = sorted(
+            ((entry.last_used, key) for key, entry in self._entries.items()
+             if not entry.holders and entry.ready.is_set()),
+            key=lambda item: item[0],
+        )
+        total = self.total_bytes
+        for last_used, key in idle:
+            if now - last_used < self.idle_seconds and total <= self.max_bytes:
+                break
+            total -= self._entries[key].size
+            del self._entries[key]
+
+
+# Instância única por processo, compartilhada por todas as sessões do Streamlit
+_registry = DatasetRegistry()
+
+
+def get_dataset_registry():
+    return _registry
@@ -0,0 +1,138 @@
+"""
+Regras de palavras-chave aplicadas às colunas de texto dos leads.
+
+- `exclude`: coluna -> padrões; linhas que casam com algum padrão são removidas
+  (hoje, 'duplicado' e 'teste' no segmento).
+- `flags`: nome -> coluna e padrões; usadas nas contagens (hoje, 'Oportunidade'
+  e 'Perdido' na situação).
+
+Os padrões são expressões regulares sem diferenciar maiúsculas, como no
+`str.contains(..., case=False)` que substituem. Cada coluna é fatorada uma vez e
+os padrões rodam uma vez por valor distinto, não por linha.
+
+As listas podem ser trocadas por um JSON no mesmo formato de DEFAULT_RULES,
+indicado pela variável de ambiente LEADS_RULES_FILE.
+"""
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from leads.cache import hash_bytes
+
+DEFAULT_RULES = {
+    'exclude': {
+        'segmento_categoria': ['duplicado', 'teste'],
+    },
+    'flags': {
+        'Oportunidade': {'column': 'situacao', 'keywords': ['oportunidade']},
+        'Perdido': {'column': 'situacao', 'keywords': ['perdido']},
+    },
+}
+
+
+def load_rules(path=None):
+    """
+    Lê as regras de um arquivo JSON (ou de LEADS_RULES_FILE). Seções ausentes
+    ficam com o padrão; sem arquivo, retorna DEFAULT_RULES.
+    """
+    path = path or os.environ.get('LEADS_RULES_FILE')
+    if not path:
+        return DEFAULT_RULES
+    with open(path, encoding='utf-8') as f:
+        configured = json.load(f)
+
+    rules = {
+        'exclude': configured.get('exclude', DEFAULT_RULES['exclude']),
+        'flags': configured.get('flags', DEFAULT_RULES['flags']),
+    }
+    for column, keywords in rules['exclude'].items():
+        if not isinstance(keywords, list):
+            raise ValueError(f"Regra de exclusão da coluna '{column}' deve ser uma lista de palavras-chave.")
+    for name, flag in rules['flags'].items():
+        if not isinstance(flag, dict) or 'column' not in flag or not isinstance(flag.get('keywords'), list):
+            raise ValueError(f"Regra '{name}' deve ter 'column' e uma lista 'keywords'.")
+    return rules
+
+
+_rules = None
+
+
+def get_rules():
+    """Regras em uso no processo (carregadas uma vez)."""
+    global _rules
+    if _rules is None:
+        _rules = load_rules()
+    return _rules
+
+
+def rules_fingerprint(rules):
+    return hash_bytes(json.dumps(rules, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+
+
+def compile_keywords(keywords):
+    return re.compile('|'.join(f'(?:{keyword})' for keyword in keywords), re.IGNORECASE)
+
+
+def _distinct_values(series):
+    """Códigos por linha (-1 para ausente) e valores distintos da coluna."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    return pd.factorize(series, use_na_sentinel=True)
+
+
+def _match_distinct(uniques, keywords):
+    """Resultado por valor distinto, com uma posição extra (False) para os ausentes."""
+    matched = np.zeros(len(uniques) + 1, dtype=bool)
+    if keywords:
+        pattern = compile_keywords(keywords)
+        matched[:-1] = [pattern.search(str(value)) is not None for value in uniques]
+    return matched
+
+
+def keyword_mask(series, keywords):
+    """Equivale a `series.astype(str).str.contains('a|b', case=False, na=False)`."""
+    codes, uniques = _distinct_values(series)
+    return pd.Series(_match_distinct(uniques, keywords)[codes], index=series.index)
+
+
+def evaluate_rules(df, rules=None, exclude=True, flags=True):
+    """
+    Avalia as regras em uma passada: cada coluna envolvida é fatorada uma vez e
+    todas as regras dela rodam sobre os valores distintos. Retorna a máscara das
+    linhas excluídas e um dicionário nome -> máscara das flags. Regras de colunas
+    ausentes não casam com nenhuma linha.
+    """
+    rules = rules or get_rules()
+    per_column = {}
+    if exclude:
+        for column, keywords in rules['exclude'].items():
+            per_column.setdefault(column, []).append((None, keywords))
+    if flags:
+        for name, flag in rules['flags'].items():
+            per_column.setdefault(flag['column'], []).append((name, flag['keywords']))
+
+    excluded = np.zeros(len(df), dtype=bool)
+    flag_masks = {}
+    for column, column_rules in per_column.items():
+        if column not in df.columns:
+            results = [(name, np.zeros(len(df), dtype=bool)) for name, _ in column_rules]
+        else:
+            codes, uniques = _distinct_values(df[column])
+            results = [(name, _match_distinct(uniques, keywords)[codes]) for name, keywords in column_rules]
+        for name, mask in results:
+            if name is None:
+                excluded |= mask
+            else:
+                flag_masks[name] = pd.Series(mask, index=df.index)
+    flag_masks = {name: flag_masks[name] for name in rules['flags']} if flags else {}
+    return pd.Series(excluded, index=df.index), flag_masks
+
+
+def excluded_keywords_label(rules=None):
+    """Texto com as palavras-chave de exclusão para as mensagens ('duplicado' ou 'teste')."""
+    rules = rules or get_rules()
+    keywords = [keyword for column_keywords in rules['exclude'].values() for keyword in column_keywords]
+    return ' ou '.join(f"'{keyword}'" for keyword in keywords)
@@ -0,0 +1,244 @@
+"""
+Tempo de partida dos scripts: aquecimento opcional e relatório.
+
+As bibliotecas pesadas (Plotly Express, openpyxl, xlsxwriter, pyarrow.parquet)
+são importadas só quando um gráfico, uma leitura de Excel ou uma exportação
+precisa delas, então a página abre sem esperar por elas.
+
+Com LEADS_WARMUP=1, a primeira execução de um script no processo dispara, numa
+thread de fundo, a importação dessas bibliotecas e uma passada do pipeline
+sobre uma planilha sintética pequena (leitura, padronização, classificação,
+agregações, gráficos e exportação), enquanto o usuário ainda escolhe o
+arquivo: a primeira planilha de verdade já encontra tudo carregado.
+
+`startup_report()` traz o tempo desde o início do processo até a primeira
+execução, a duração dela e o tempo do aquecimento; aparece no painel de
+diagnóstico e na linha JSON do LEADS_DIAGNOSTICS_LOG. Para acompanhar a partida
+a frio fora do Streamlit:
+
+    python -m leads.startup [--json]
+
+mede, cada um num processo novo, as importações de cada script e o aquecimento.
+"""
+import argparse
+import ast
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = ('app.py', 'dashboard_leads.py', 'dashboard_leadsv3.py')
+# Importadas sob demanda pelos scripts; o aquecimento as carrega antes
+HEAVY_MODULES = ('plotly.express', 'openpyxl', 'xlsxwriter', 'pyarrow.parquet')
+DEFAULT_WARMUP = os.environ.get('LEADS_WARMUP', '').lower() in ('1', 'true', 'yes', 'on')
+WARMUP_ROWS = 500
+
+_report = {
+    'process_seconds': None,
+    'first_script': None,
+    'first_run_seconds': None,
+    'warmup': None,
+}
+_lock = threading.Lock()
+_warmup_thread = None
+
+
+def process_uptime():
+    """Segundos desde o início do processo, ou None onde /proc não existe (Windows, macOS)."""
+    try:
+        with open('/proc/self/stat') as f:
+            # O nome do executável pode ter espaços: os campos vêm depois do último ')'
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+
+
+def timed_import(name):
+    """Importa o módulo `name` e retorna os segundos gastos (0 se já estava carregado)."""
+    if name in sys.modules:
+        return 0.0
+    started = time.perf_counter()
+    importlib.import_module(name)
+    return round(time.perf_counter() - started, 4)
+
+
+def exercise_pipeline(rows=WARMUP_ROWS):
+    """
+    Passa uma planilha sintética pelo caminho dos dashboards, para carregar as
+    bibliotecas e os caminhos de código que a primeira planilha usaria. Nada vai
+    para o cache de planilhas. Retorna os segundos de cada parte.
+    """
+    import plotly.express as px
+    import plotly.io as pio
+
+    from leads.charts import box_figure, box_stats
+    from leads.export import export_bytes
+    from leads.pipeline import LEAD_COLUMNS, category_counts, load_leads, segment_breakdown, unqualified_leads
+    from leads.synthetic import generate_leads
+
+    timings = {}
+    started = time.perf_counter()
+
+    def mark(name):
+        nonlocal started
+        now = time.perf_counter()
+        timings[name] = round(now - started, 4)
+        started = now
+
+    content = export_bytes(generate_leads(rows, seed=0), 'xlsx')
+    mark('gerar planilha')
+    prepared = load_leads('aquecimento.xlsx', content, columns=LEAD_COLUMNS)
+    mark('carregar planilha')
+    df = prepared['df']
+    category_counts(df)
+    unqualified_leads(df)
+    segments = segment_breakdown(df)
+    mark('agregações')
+    # Montadas fora de `cached_figure` e serializadas como o st.plotly_chart faz
+    pio.to_json(px.bar(segments.drop(columns='Total'), title='aquecimento'))
+    pio.to_json(box_figure(box_stats(df.assign(valor=range(len(df))), 'categoria_lead', 'valor')))
+    mark('gráficos')
+    export_bytes(df, 'csv')
+    export_bytes(df.head(1), 'parquet')
+    mark('exportação')
+    return timings
+
+
+def warm_up(modules=HEAVY_MODULES, pipeline=True):
+    """Importa `modules` e, com `pipeline`, roda `exercise_pipeline`. Retorna o relatório do aquecimento."""
+    started = time.perf_counter()
+    result = {'imports': {}, 'pipeline': None, 'seconds': None, 'error': None}
+    try:
+        for name in modules:
+            result['imports'][name] = timed_import(name)
+        if pipeline:
+            result['pipeline'] = exercise_pipeline()
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def _run_warm_up():
+    result = warm_up()
+    with _lock:
+        _report['warmup'] = result
+
+
+def start_warm_up():
+    """Dispara `warm_up` numa thread de fundo, uma vez por processo."""
+    global _warmup_thread
+    with _lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_run_warm_up, name='leads-warmup', daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
+
+
+def on_script_start(diagnostics, warmup=DEFAULT_WARMUP):
+    """
+    Chamado por `start_run` no início de cada execução dos scripts: registra a
+    primeira execução do processo, dispara o aquecimento (se ativado) e anexa o
+    relatório de partida a `diagnostics`.
+    """
+    with _lock:
+        if _report['first_script'] is None:
+            uptime = process_uptime()
+            _report['process_seconds'] = round(uptime, 4) if uptime is not None else None
+            _report['first_script'] = diagnostics.script
+            diagnostics.first_run = True
+    if warmup:
+        start_warm_up()
+    diagnostics.startup = _report
+
+
+def record_first_run(diagnostics):
+    """Guarda a duração da primeira execução do processo (chamado por `Diagnostics.finish`)."""
+    with _lock:
+        if diagnostics.first_run and _report['first_run_seconds'] is None:
+            _report['first_run_seconds'] = round(diagnostics.total_seconds, 4)
+
+
+def startup_report():
+    """Cópia do relatório de partida deste processo."""
+    with _lock:
+        return json.loads(json.dumps(_report))
+
+
+def format_startup_report(report):
+    """Resumo de uma linha para o painel de diagnóstico."""
+    parts = []
+    if report.get('process_seconds') is not None:
+        parts.append(f"processo até a 1ª execução: {report['process_seconds']:.2f}s")
+    if report.get('first_run_seconds') is not None:
+        parts.append(f"1ª execução ({report['first_script']}): {report['first_run_seconds']:.2f}s")
+    warmup = report.get('warmup')
+    if warmup:
+        parts.append(f"aquecimento: {warmup['seconds']:.2f}s" + (f" (erro: {warmup['error']})" if warmup['error'] else ""))
+    return "Partida — " + "; ".join(parts) if parts else ""
+
+
+def script_imports(path):
+    """Código com as importações do nível de topo de um script."""
+    source = Path(path).read_text(encoding='utf-8')
+    nodes = [node for node in ast.parse(source).body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return '\n'.join(ast.get_source_segment(source, node) for node in nodes)
+
+
+_MEASURE = """
+import json, sys, time
+started = time.perf_counter()
+exec(sys.argv[1])
+seconds = time.perf_counter() - started
+print(json.dumps({'seconds': round(seconds, 4), 'loaded': [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def measure_cold_start(scripts=SCRIPTS, root=ROOT):
+    """
+    Mede, cada um num interpretador novo, as importações de cada script e o
+    aquecimento completo. Retorna um dicionário com os segundos e as bibliotecas
+    pesadas que já ficaram carregadas só pelas importações.
+    """
+    def run(code):
+        out = subprocess.run(
+            [sys.executable, '-c', _MEASURE, code, *HEAVY_MODULES],
+            cwd=root, capture_output=True, text=True, check=True,
+        )
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+    results = {'python': sys.version.split()[0], 'scripts': {}}
+    for script in scripts:
+        results['scripts'][script] = run(script_imports(Path(root) / script))
+    results['warmup'] = run(
+        "from leads.startup import warm_up\nresult = warm_up()\nassert result['error'] is None, result['error']"
+    )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede a partida a frio dos scripts (importações e aquecimento).")
+    parser.add_argument('--json', action='store_true', help="imprime o resultado em JSON")
+    args = parser.parse_args(argv)
+    results = measure_cold_start()
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 0
+    print(f"Python {results['python']}")
+    for script, result in results['scripts'].items():
+        loaded = ', '.join(result['loaded']) or 'nenhuma'
+        print(f"  {script:<22} importações: {result['seconds']:.2f}s  (bibliotecas pesadas já carregadas: {loaded})")
+    print(f"  {'aquecimento':<22} {results['warmup']['seconds']:.2f}s (num processo novo, com as importações)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Base local (SQLite) de leads acumulados de várias planilhas.
+
+Cada planilha enviada é padronizada pelo pipeline e acrescentada à tabela
+`leads`; planilhas já importadas (mesmo hash de conteúdo) são ignoradas e linhas
+já gravadas por uma planilha anterior (mesma chave) não são gravadas de novo. A
+base só recebe inserções: a leitura é incremental, trazendo do disco apenas as
+linhas gravadas desde a última leitura.
+
+A chave de uma linha é o hash do conteúdo (todas as colunas, em ordem
+alfabética) com o número da ocorrência desse conteúdo na planilha: a mesma
+linha exportada em dois meses conta uma vez só, mas duas linhas iguais na mesma
+planilha continuam sendo duas. Linhas diferentes nunca se sobrepõem, mesmo com
+o mesmo telefone, e-mail ou Deal ID; juntar o mesmo lead é papel da remoção de
+leads repetidos do pipeline (`remove_duplicate_leads`). Uma linha editada numa
+exportação posterior entra como linha nova (com keep='last', a remoção de
+repetidos fica com a versão mais recente).
+
+Colunas da planilha com o nome de uma coluna interna (`id`, `lead_key`,
+`lead_source`) ou repetido sem diferenciar maiúsculas (o SQLite não diferencia)
+são gravadas com um sufixo: `id.1`, `nome.1`...
+
+Ativada pela variável de ambiente LEADS_STORE_PATH (caminho do arquivo .sqlite).
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+KEY_COL = 'lead_key'
+SOURCE_COL = 'lead_source'
+RESERVED_COLUMNS = ('id', KEY_COL, SOURCE_COL)
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _to_records(df):
+    """Colunas como valores aceitos pelo SQLite (datas em texto, ausentes como None)."""
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            values = series.dt.strftime(DATETIME_FORMAT).astype(object)
+        else:
+            values = series.astype(object)
+        columns[name] = values.where(series.notna(), None)
+    return pd.DataFrame(columns, index=df.index)
+
+
+def storage_names(columns, known=()):
+    """
+    Nome na tabela de cada coluna de `columns` (dicionário coluna -> nome). Uma
+    coluna já existente (`known`) é reaproveitada mesmo com outra grafia de
+    maiúsculas; nomes das colunas internas ou já usados ganham o sufixo '.1', '.2'...
+    """
+    known_by_lower = {str(name).lower(): str(name) for name in known}
+    used = {name.lower() for name in RESERVED_COLUMNS}
+    names = {}
+    for col in columns:
+        base = str(col)
+        name = known_by_lower.get(base.lower(), base)
+        suffix = 0
+        while name.lower() in used:
+            suffix += 1
+            name = known_by_lower.get(f"{base}.{suffix}".lower(), f"{base}.{suffix}")
+        used.add(name.lower())
+        names[col] = name
+    return names
+
+
+def lead_keys(records):
+    """
+    Chave de cada linha: hash do conteúdo de todas as colunas, em ordem
+    alfabética, e da ocorrência desse conteúdo em `records` (0 na primeira
+    linha com ele, 1 na segunda...).
+    """
+    ordered = records[sorted(records.columns, key=str)].astype(str)
+    content = pd.Series(pd.util.hash_pandas_object(ordered, index=False).to_numpy())
+    occurrence = content.groupby(content).cumcount()
+    keys = pd.DataFrame({'content': content, 'occurrence': occurrence})
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy().view('int64')
+
+
+class LeadStore:
+    """Base de leads em um arquivo SQLite. Uma instância pode ser usada por várias threads."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS leads (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            f"{KEY_COL} INTEGER NOT NULL UNIQUE, {SOURCE_COL} TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS columns (name TEXT PRIMARY KEY, kind TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            "content_hash TEXT PRIMARY KEY, file_name TEXT, added_at REAL, "
+            "rows INTEGER, inserted INTEGER)"
+        )
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _columns(self):
+        return dict(self._conn.execute("SELECT name, kind FROM columns ORDER BY rowid"))
+
+    def columns(self):
+        """Colunas de dados da base -> tipo ('datetime' ou 'value')."""
+        with self._lock:
+            return self._columns()
+
+    def has_source(self, content_hash):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM sources WHERE content_hash = ?", (content_hash,)).fetchone()
+        return row is not None
+
+    def sources(self):
+        """Planilhas importadas, da mais antiga para a mais recente."""
+        with self._lock:
+            return pd.read_sql_query(
+                "SELECT file_name, content_hash, added_at, rows, inserted FROM sources ORDER BY added_at",
+                self._conn,
+            )
+
+    @property
+    def version(self):
+        """Maior id gravado: muda sempre que a base recebe linhas novas."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM leads").fetchone()[0]
+
+    def append(self, df, content_hash, file_name=None):
+        """
+        Acrescenta as linhas de `df` (já padronizado) que ainda não estão na base.
+        Retorna quantas foram gravadas; 0 se a planilha já tinha sido importada.
+        """
+        records = _to_records(df)
+        keys = lead_keys(records)
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM sources WHERE content_hash = ?", (content_hash,)).fetchone():
+                return 0
+            known = self._columns()
+            names = storage_names(records.columns, known)
+            for col, name in names.items():
+                if name not in known:
+                    kind = 'datetime' if pd.api.types.is_datetime64_any_dtype(df[col].dtype) else 'value'
+                    self._conn.execute(f"ALTER TABLE leads ADD COLUMN {_quote(name)}")
+                    self._conn.execute("INSERT INTO columns (name, kind) VALUES (?, ?)", (name, kind))
+            records = records.rename(columns=names)
+            columns = [KEY_COL, SOURCE_COL, *(_quote(name) for name in records.columns)]
+            rows_before = self._conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO leads ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                zip(keys.tolist(), [content_hash] * len(records), *(records[c].tolist() for c in records.columns)),
+            )
+            inserted = self._conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0] - rows_before
+            self._conn.execute(
+                "INSERT INTO sources (content_hash, file_name, added_at, rows, inserted) VALUES (?, ?, ?, ?, ?)",
+                (content_hash, file_name, time.time(), len(records), inserted),
+            )
+        return inserted
+
+    def read(self, since_id=0):
+        """
+        Linhas gravadas depois do id `since_id`, na ordem de chegada, com a chave
+        em KEY_COL e as datas convertidas, e o último id lido.
+        """
+        with self._lock:
+            columns = self._columns()
+            new_rows = pd.read_sql_query(
+                f"SELECT id, {KEY_COL}, {', '.join(_quote(c) for c in columns) or 'NULL'} "
+                f"FROM leads WHERE id > ? ORDER BY id",
+                self._conn,
+                params=(since_id,),
+            )
+        last_id = int(new_rows['id'].max()) if len(new_rows) else since_id
+        new_rows = new_rows.drop(columns='id')
+        for name, kind in columns.items():
+            if kind == 'datetime':
+                new_rows[name] = pd.to_datetime(new_rows[name], format=DATETIME_FORMAT)
+        return new_rows, last_id
+
+
+_lead_stores = {}
+_lead_stores_lock = threading.Lock()
+
+
+def get_lead_store(path=None):
+    """
+    Base do caminho informado ou de LEADS_STORE_PATH. Retorna None quando nenhum
+    dos dois está definido (base desativada).
+    """
+    path = path or os.environ.get('LEADS_STORE_PATH')
+    if not path:
+        return None
+    with _lead_stores_lock:
+        if path not in _lead_stores:
+            _lead_stores[path] = LeadStore(path)
+        return _lead_stores[path]
@@ -0,0 +1,75 @@
+"""
+Planilhas sintéticas no formato esperado pelos dashboards e pelo app.py.
+
+- `generate_leads`: Nome, E-mail, Telefone, Status, Data da conversão:,
+  Segmento/Categoria e Situação, com status fora das regras, datas inválidas,
+  segmentos 'duplicado'/'teste' e telefones/e-mails repetidos, como nas
+  exportações reais.
+- `generate_automation_log`: log de eventos do app.py (Tipo, Etapa, Data-hora,
+  Deal ID, Whatsapp, Mensagem, Deal name), vários eventos por deal.
+
+Usadas pelo benchmark (`python -m leads.bench`); a mesma semente gera sempre os
+mesmos dados.
+"""
+import numpy as np
+import pandas as pd
+
+STATUSES = ['Válido', 'Inválido', 'Sem qualificação', ' válido ', 'INVÁLIDO', 'Em negociação', None]
+STATUS_WEIGHTS = [0.3, 0.25, 0.2, 0.05, 0.05, 0.1, 0.05]
+SEGMENTS = ['Varejo', 'Serviços', 'Indústria', 'Saúde', 'Educação', 'Tecnologia', 'Duplicado', 'Teste interno']
+SEGMENT_WEIGHTS = [0.2, 0.18, 0.15, 0.14, 0.1, 0.1, 0.08, 0.05]
+SITUATIONS = ['Oportunidade', 'Perdido', 'Em aberto', 'Ganho', None]
+SITUATION_WEIGHTS = [0.3, 0.25, 0.25, 0.1, 0.1]
+STAGES = ['Primeiro contato', 'Segundo contato', 'Terceiro contato', 'Follow-up']
+EVENT_TYPES = ['Enviado', 'Entregue', 'Lido', 'Cancelado-Lead-Respondeu']
+EVENT_WEIGHTS = [0.4, 0.3, 0.2, 0.1]
+
+START_DATE = pd.Timestamp('2023-01-01')
+PERIOD_DAYS = 730
+
+
+def _choice(rng, values, weights, size):
+    values = np.array(values, dtype=object)
+    return values[rng.choice(len(values), size=size, p=weights)]
+
+
+def generate_leads(rows, seed=0, invalid_date_ratio=0.01, repeat_ratio=0.1):
+    """Planilha de leads com `rows` linhas."""
+    rng = np.random.default_rng(seed)
+    # Parte dos leads reaparece com o mesmo telefone/e-mail
+    person = np.arange(rows)
+    repeated = rng.random(rows) < repeat_ratio
+    person[repeated] = rng.integers(0, rows, repeated.sum())
+
+    dates = START_DATE + pd.to_timedelta(rng.integers(0, PERIOD_DAYS * 86400, rows), unit='s')
+    dates = pd.Series(dates.strftime('%Y-%m-%d %H:%M:%S'), dtype=object)
+    dates[rng.random(rows) < invalid_date_ratio] = 'sem data'
+
+    return pd.DataFrame({
+        'Nome': [f'Lead {p}' for p in person],
+        'E-mail': [f'lead{p}@exemplo.com.br' for p in person],
+        'Telefone': [f'(11) 9{p % 100_000_000:08d}' for p in person],
+        'Status': _choice(rng, STATUSES, STATUS_WEIGHTS, rows),
+        'Data da conversão:': dates,
+        'Segmento/Categoria': _choice(rng, SEGMENTS, SEGMENT_WEIGHTS, rows),
+        'Situação': _choice(rng, SITUATIONS, SITUATION_WEIGHTS, rows),
+    })
+
+
+def generate_automation_log(rows, seed=0, events_per_deal=4):
+    """Log de automação do app.py com `rows` eventos, em média `events_per_deal` por deal."""
+    rng = np.random.default_rng(seed)
+    deals = max(rows // events_per_deal, 1)
+    deal_id = rng.integers(0, deals, rows) + 100_000
+    stage = rng.integers(0, len(STAGES), rows)
+    # Etapas posteriores acontecem depois: dias por etapa + ruído
+    seconds = (deal_id - 100_000) % (PERIOD_DAYS * 86400) + stage * 2 * 86400 + rng.integers(0, 86400, rows)
+    return pd.DataFrame({
+        'Tipo': _choice(rng, EVENT_TYPES, EVENT_WEIGHTS, rows),
+        'Etapa': np.array(STAGES, dtype=object)[stage],
+        'Data-hora': (START_DATE + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%d %H:%M:%S'),
+        'Deal ID': deal_id,
+        'Whatsapp': [f'55119{d:08d}' for d in deal_id],
+        'Mensagem': 'Olá! Podemos conversar?',
+        'Deal name': [f'Deal {d}' for d in deal_id],
+    })
@@ -0,0 +1,144 @@
+"""
+Tabela paginada para listas grandes de leads (sem qualificação, conversões).
+
+O `st.dataframe` manda o DataFrame inteiro para o navegador; com centenas de
+milhares de linhas a aba trava. Aqui a busca e a ordenação rodam no servidor e
+só a página visível é enviada.
+
+`TableView` guarda, por coluna e só quando pedidos, a ordem de cada ordenação e
+um índice de busca (código de cada linha + texto normalizado de cada valor
+distinto): uma busca compara só os valores distintos e a página sai de uma
+fatia das posições já ordenadas.
+"""
+import numpy as np
+import pandas as pd
+
+from leads.cache import get_parse_cache
+
+PAGE_SIZES = [25, 50, 100, 500]
+DEFAULT_PAGE_SIZE = 50
+NO_SORT = "Ordem original"
+
+
+def normalize_texts(values):
+    """Textos para a busca: minúsculos e sem acentos ('Qualificação' -> 'qualificacao')."""
+    texts = pd.Series(pd.Index(values))
+    if texts.dtype != 'str':
+        texts = texts.astype('str')
+    texts = texts.str.lower()
+    # A decomposição dos acentos é lenta; só os textos com algum caractere fora do ASCII passam por ela
+    accented = texts.str.contains(r'[^\x00-\x7f]', regex=True).to_numpy(dtype=bool)
+    if accented.any():
+        texts[accented] = texts[accented].str.normalize('NFKD').str.replace(r'\p{Mn}', '', regex=True)
+    return texts
+
+
+class TableView:
+    """Busca e ordenação de um DataFrame, com os índices montados sob demanda."""
+
+    def __init__(self, df):
+        self.df = df
+        self._orders = {}
+        self._search_index = {}
+        self._last = None
+
+    def __len__(self):
+        return len(self.df)
+
+    def __sizeof__(self):
+        arrays = [*self._orders.values(), *(codes for codes, _ in self._search_index.values())]
+        texts = [texts.memory_usage(deep=True) for _, texts in self._search_index.values()]
+        return object.__sizeof__(self) + int(self.df.memory_usage(deep=True).sum()) + sum(a.nbytes for a in arrays) + sum(texts)
+
+    def order(self, column, ascending=True):
+        """Posições das linhas ordenadas por `column` (vazios no fim, empates na ordem original)."""
+        key = (column, ascending)
+        if key not in self._orders:
+            values = self.df[column].reset_index(drop=True)
+            self._orders[key] = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+        return self._orders[key]
+
+    def _column_index(self, column):
+        if column not in self._search_index:
+            series = self.df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+            else:
+                codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            self._search_index[column] = (codes, normalize_texts(uniques))
+        return self._search_index[column]
+
+    def search(self, query):
+        """Máscara das linhas em que alguma coluna contém `query` (sem diferenciar maiúsculas e acentos)."""
+        term = normalize_texts([query.strip()])[0]
+        mask = np.zeros(len(self.df), dtype=bool)
+        for column in self.df.columns:
+            codes, texts = self._column_index(column)
+            # Uma posição a mais para o código -1 (vazio), que nunca casa
+            matches = np.append(texts.str.contains(term, regex=False).to_numpy(dtype=bool), False)
+            if matches.any():
+                mask |= matches[codes]
+        return mask
+
+    def positions(self, query='', sort_by=None, ascending=True):
+        """Posições das linhas que casam com a busca, na ordem pedida."""
+        key = (query.strip(), sort_by, ascending)
+        # Trocar de página repete a última busca: ela fica guardada
+        last = self._last
+        if last is not None and last[0] == key:
+            return last[1]
+        positions = self.order(sort_by, ascending) if sort_by is not None else np.arange(len(self.df))
+        if key[0]:
+            positions = positions[self.search(key[0])[positions]]
+        self._last = (key, positions)
+        return positions
+
+    def page(self, positions, page, page_size):
+        """Linhas da página `page` (a partir de 1)."""
+        start = (page - 1) * page_size
+        return self.df.iloc[positions[start:start + page_size]]
+
+
+def get_table_view(df, cache_key=None):
+    """
+    `TableView` de `df`. Com `cache_key` (algo que identifique o conteúdo de
+    `df`), os índices de busca e ordenação ficam no cache de planilhas e valem
+    para as próximas reexecuções.
+    """
+    if cache_key is None:
+        return TableView(df)
+    return get_parse_cache().get_or_compute(('table', cache_key), lambda: TableView(df))
+
+
+def render_table(container, df, key, cache_key=None, page_sizes=PAGE_SIZES, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Tabela paginada em `container` (ex.: `st` ou uma coluna), com busca e
+    ordenação no servidor. `key` distingue os widgets de cada tabela da página.
+    Retorna as linhas da página exibida.
+    """
+    view = get_table_view(df, cache_key)
+    search_col, sort_col, direction_col, size_col = container.columns([3, 2, 1, 1])
+    query = search_col.text_input("Buscar", key=f"{key}-search", placeholder="Nome, e-mail, telefone...")
+    sort_by = sort_col.selectbox("Ordenar por", [NO_SORT, *df.columns], key=f"{key}-sort")
+    sort_by = None if sort_by == NO_SORT else sort_by
+    descending = direction_col.checkbox("Decrescente", key=f"{key}-descending", disabled=sort_by is None)
+    page_size = size_col.selectbox(
+        "Linhas", page_sizes, index=page_sizes.index(page_size) if page_size in page_sizes else 0, key=f"{key}-page-size"
+    )
+
+    positions = view.positions(query, sort_by, not descending)
+    total = len(positions)
+    pages = max(1, -(-total // page_size))
+    # Nova busca, ordenação ou tamanho de página volta para a página 1
+    page_key = f"{key}-page-{hash((query, sort_by, descending, page_size, total))}"
+    page = container.number_input(f"Página (de {pages})", min_value=1, max_value=pages, value=1, step=1, key=page_key)
+
+    rows = view.page(positions, page, page_size)
+    container.dataframe(rows)
+    if total:
+        first = (page - 1) * page_size + 1
+        container.caption(f"Linhas {first}–{first + len(rows) - 1} de {total}" + (f" (de {len(view)} no total)" if total != len(view) else ""))
+    else:
+        container.caption(f"Nenhuma linha encontrada para \"{query.strip()}\".")
+    return rows
+
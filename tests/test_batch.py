@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from leads.batch import output_stem, process_file, run_batch
+from leads.synthetic import generate_leads
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    directory = tmp_path / 'entrada'
+    (directory / 'vendas').mkdir(parents=True)
+    generate_leads(300, seed=1).to_csv(directory / 'jan.csv', index=False)
+    generate_leads(200, seed=2).to_csv(directory / 'vendas' / 'jan.csv', index=False)
+    return directory
+
+
+def test_process_file_writes_outputs(input_dir, tmp_path):
+    output_dir = tmp_path / 'saida'
+    summary, segments = process_file(input_dir / 'jan.csv', output_dir, input_dir=input_dir)
+    assert summary['erro'] == ''
+    assert summary['total_leads'] > 0
+    assert segments['Total'].sum() == summary['total_leads']
+    assert (output_dir / 'jan_csv_segmentos.csv').exists()
+
+
+def test_missing_columns_are_reported(tmp_path):
+    path = tmp_path / 'sem_colunas.csv'
+    pd.DataFrame({'Nome': ['Ana']}).to_csv(path, index=False)
+    summary, segments = process_file(path, tmp_path / 'saida')
+    assert segments is None
+    assert summary['erro'].startswith('Colunas essenciais não encontradas')
+
+
+def test_unreadable_file_is_reported(tmp_path):
+    path = tmp_path / 'quebrado.xlsx'
+    path.write_bytes(b'isto nao e um xlsx')
+    summary, segments = process_file(path, tmp_path / 'saida')
+    assert segments is None
+    assert summary['erro'].startswith('Erro ao carregar a planilha')
+
+
+def test_output_errors_are_reported_without_partial_counts(input_dir, tmp_path):
+    output_dir = tmp_path / 'saida'
+    output_dir.mkdir()
+    # Um arquivo no lugar da subpasta de saída: a gravação falha
+    (output_dir / 'vendas').write_text('')
+    summary, segments = process_file(input_dir / 'vendas' / 'jan.csv', output_dir, input_dir=input_dir)
+    assert segments is None
+    assert summary['erro'].startswith('Erro ao processar a planilha')
+    assert 'total_leads' not in summary
+
+
+def test_batch_continues_after_a_failing_file(input_dir, tmp_path):
+    output_dir = tmp_path / 'saida'
+    output_dir.mkdir()
+    (output_dir / 'vendas').write_text('')
+    paths = [input_dir / 'jan.csv', input_dir / 'vendas' / 'jan.csv']
+    run_batch(paths, output_dir, workers=1, input_dir=input_dir)
+    summary = pd.read_csv(output_dir / 'resumo.csv', keep_default_na=False).set_index('arquivo')
+    assert summary.loc['jan.csv', 'erro'] == ''
+    assert summary.loc['vendas/jan.csv', 'erro'].startswith('Erro ao processar a planilha')
+
+
+def test_output_stem_keeps_subfolder_and_extension(input_dir):
+    assert output_stem(input_dir / 'vendas' / 'jan.csv', input_dir).as_posix() == 'vendas/jan_csv'
+    assert output_stem(input_dir / 'jan.csv').as_posix() == 'jan_csv'
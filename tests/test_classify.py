@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from leads.classify import (
+    CATEGORIA_INVALIDO,
+    CATEGORIA_SEM_QUALIFICACAO,
+    CATEGORIA_VALIDO,
+    build_rules,
+    classify_lead,
+    classify_leads,
+)
+from leads.synthetic import generate_leads
+
+
+def original_classify_lead(status_value):
+    """`classify_lead` do dashboard original, aplicado linha a linha."""
+    if pd.isna(status_value) or str(status_value).strip() == "" or str(status_value).strip().lower() == "sem qualificação":
+        return "⚠️ Sem qualificação"
+    elif str(status_value).strip().lower() == "válido":
+        return "✅ Válido"
+    elif str(status_value).strip().lower() == "inválido":
+        return "❌ Inválido"
+    else:
+        return "⚠️ Sem qualificação"
+
+
+STATUS_VALUES = [
+    'Válido', ' válido ', 'VÁLIDO', 'Inválido', 'inválido\t', 'Sem qualificação', 'SEM QUALIFICAÇÃO',
+    'Em negociação', '', '   ', None, np.nan, pd.NA, 0, 1.5, 'valido',
+]
+
+
+@pytest.mark.parametrize('values', [
+    STATUS_VALUES,
+    generate_leads(2000, seed=3)['Status'].tolist(),
+    ['Válido'] * 5,
+    [None, None],
+    [],
+])
+def test_classify_leads_matches_original(values):
+    status = pd.Series(values, dtype=object)
+    result = classify_leads(status)
+    assert result.astype(object).tolist() == [original_classify_lead(v) for v in values]
+    assert result.index.equals(status.index)
+    assert result.name == 'categoria_lead'
+
+
+def test_classify_leads_keeps_index_and_text_dtype_input():
+    status = pd.Series(['Válido', None, 'inválido'], index=[10, 5, 7], dtype='str')
+    result = classify_leads(status)
+    assert result.to_dict() == {10: CATEGORIA_VALIDO, 5: CATEGORIA_SEM_QUALIFICACAO, 7: CATEGORIA_INVALIDO}
+
+
+def test_categories_are_present_values_in_text_order():
+    result = classify_leads(pd.Series(['inválido', 'válido', 'inválido']))
+    assert list(result.cat.categories) == sorted([CATEGORIA_INVALIDO, CATEGORIA_VALIDO])
+    # Mesmas linhas de value_counts que numa coluna de texto
+    assert result.value_counts().to_dict() == result.astype(str).value_counts().to_dict()
+
+
+def test_classify_lead_matches_classify_leads_with_custom_rules():
+    rules = build_rules({' Em Negociação ': 'Em andamento'})
+    values = ['em negociação', 'Válido', None, 'outro']
+    expected = [classify_lead(v, rules) for v in values]
+    assert classify_leads(pd.Series(values, dtype=object), rules=rules).astype(object).tolist() == expected
+    assert expected == ['Em andamento', CATEGORIA_VALIDO, CATEGORIA_SEM_QUALIFICACAO, CATEGORIA_SEM_QUALIFICACAO]
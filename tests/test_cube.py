@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from leads.cube import LeadCube
+from leads.pipeline import (
+    CATEGORY_COL,
+    TARGET_DATE_COL,
+    TARGET_SEGMENT_COL,
+    cube_dims,
+    prepare_leads,
+    rollup_segment_breakdown,
+    segment_breakdown,
+)
+from leads.synthetic import generate_leads
+
+
+@pytest.fixture(scope='module')
+def df():
+    return prepare_leads(generate_leads(3000, seed=1))['df']
+
+
+def frame_totals(df, dims, start=None, end=None):
+    days = df[TARGET_DATE_COL].dt.normalize()
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= days >= pd.Timestamp(start)
+    if end is not None:
+        mask &= days <= pd.Timestamp(end)
+    return df[mask].astype({col: object for col in dims}).groupby(dims, dropna=False).size()
+
+
+def cube_totals(cube, start=None, end=None):
+    rollup = cube.query(start, end)
+    return rollup.astype({col: object for col in cube.dims}).set_index(cube.dims)['count']
+
+
+@pytest.mark.parametrize('start, end', [
+    (None, None), ('2023-03-01', '2023-06-30'), ('2023-05-10', '2023-05-10'), ('2030-01-01', None), (None, '2022-01-01'),
+])
+def test_totals_match_groupby(df, start, end):
+    dims = cube_dims(df)
+    cube = LeadCube.from_frame(df, TARGET_DATE_COL, dims)
+    expected = frame_totals(df, dims, start, end)
+    result = cube_totals(cube, start, end)
+    pd.testing.assert_series_equal(
+        result.sort_index(), expected.sort_index(), check_names=False, check_dtype=False, check_index_type=False
+    )
+    assert int(cube.totals(start, end).sum()) == int(expected.sum())
+
+
+def test_monthly_totals_match_groupby(df):
+    dims = [TARGET_SEGMENT_COL, CATEGORY_COL]
+    cube = LeadCube.from_frame(df, TARGET_DATE_COL, dims)
+    months, totals = cube.monthly_totals('2023-02-15', '2023-09-30')
+    period = df[df[TARGET_DATE_COL].between('2023-02-15', '2023-09-30 23:59:59')]
+    expected = period.groupby(period[TARGET_DATE_COL].dt.to_period('M')).size()
+    assert list(months) == list(expected.index)
+    assert totals.sum(axis=1).tolist() == expected.tolist()
+
+
+def test_to_frame_matches_daily_groupby(df):
+    dims = [TARGET_SEGMENT_COL, CATEGORY_COL]
+    frame = LeadCube.from_frame(df, TARGET_DATE_COL, dims).to_frame()
+    expected = df.groupby([df[TARGET_DATE_COL].dt.date, *dims], observed=True).size()
+    assert frame['count'].sum() == len(df)
+    assert sorted(frame['count'].tolist()) == sorted(expected[expected > 0].tolist())
+
+
+def test_combine_equals_cube_of_all_rows(df):
+    dims = cube_dims(df)
+    first, second = df.iloc[:1000], df.iloc[1000:]
+    combined = LeadCube.combine(
+        [(LeadCube.from_frame(first, TARGET_DATE_COL, dims), 1), (LeadCube.from_frame(second, TARGET_DATE_COL, dims), 1)],
+        dims,
+    )
+    whole = LeadCube.from_frame(df, TARGET_DATE_COL, dims)
+    assert np.array_equal(combined.days, whole.days)
+    pd.testing.assert_series_equal(cube_totals(combined).sort_index(), cube_totals(whole).sort_index())
+
+    # Subtrair uma parte devolve o cubo da outra
+    rest = LeadCube.combine([(whole, 1), (LeadCube.from_frame(first, TARGET_DATE_COL, dims), -1)], dims)
+    expected = LeadCube.from_frame(second, TARGET_DATE_COL, dims)
+    pd.testing.assert_series_equal(cube_totals(rest).sort_index(), cube_totals(expected).sort_index())
+
+
+def test_cube_is_skipped_above_max_cells(df):
+    dims = cube_dims(df)
+    assert LeadCube.from_frame(df, TARGET_DATE_COL, dims, max_cells=100) is None
+    cube = LeadCube.from_frame(df, TARGET_DATE_COL, dims)
+    assert LeadCube.combine([(cube, 1)], dims, max_cells=100) is None
+
+
+def test_cube_memory_is_counted():
+    df = prepare_leads(generate_leads(500, seed=2))['df']
+    cube = LeadCube.from_frame(df, TARGET_DATE_COL, cube_dims(df))
+    assert cube.__sizeof__() >= cube._prefix.nbytes + cube.days.nbytes
+
+
+def original_segment_table(df):
+    """Tabela de segmentos do dashboard original (colunas de texto)."""
+    df = df.astype({TARGET_SEGMENT_COL: str, CATEGORY_COL: str})
+    segment_analysis = df.groupby(TARGET_SEGMENT_COL)[CATEGORY_COL].value_counts().unstack(fill_value=0)
+    segment_analysis['Total'] = segment_analysis.sum(axis=1)
+    return segment_analysis.sort_values(by='Total', ascending=False)
+
+
+def test_segment_tables_match_original(df):
+    # Categorias fora da ordem alfabética, como depois de juntar planilhas
+    shuffled = df.assign(**{
+        TARGET_SEGMENT_COL: df[TARGET_SEGMENT_COL].cat.reorder_categories(df[TARGET_SEGMENT_COL].cat.categories[::-1]),
+        CATEGORY_COL: df[CATEGORY_COL].cat.reorder_categories(df[CATEGORY_COL].cat.categories[::-1]),
+    })
+    expected = original_segment_table(df)
+    cube = LeadCube.from_frame(shuffled, TARGET_DATE_COL, [TARGET_SEGMENT_COL, CATEGORY_COL])
+    for result in (segment_breakdown(shuffled), rollup_segment_breakdown(cube.query())):
+        assert list(result.columns) == list(expected.columns)
+        assert [str(s) for s in result.index] == list(expected.index)
+        assert np.array_equal(result.to_numpy(), expected.to_numpy())
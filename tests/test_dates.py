@@ -0,0 +1,101 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from leads.dates import (
+    DATE_RANGE,
+    EXCEL_EPOCH,
+    REASON_EMPTY,
+    REASON_OUT_OF_RANGE,
+    REASON_UNRECOGNIZED,
+    dropped_rows,
+    infer_date_format,
+    parse_dates,
+)
+
+
+def test_day_first_is_detected():
+    dates, report = parse_dates(pd.Series(['05/01/2024', '31/12/2023', '01/02/2024']))
+    assert dates.tolist() == [pd.Timestamp('2024-01-05'), pd.Timestamp('2023-12-31'), pd.Timestamp('2024-02-01')]
+    assert report['format'] == '%d/%m/%Y'
+    assert report['format_detected']
+
+
+def test_ambiguous_dates_default_to_day_first():
+    assert infer_date_format(pd.Series(['05/01/2024', '06/02/2024'])) == '%d/%m/%Y'
+
+
+def test_month_first_and_iso_with_time():
+    dates, _ = parse_dates(pd.Series(['12/31/2023', '01/05/2024']))
+    assert dates.tolist() == [pd.Timestamp('2023-12-31'), pd.Timestamp('2024-01-05')]
+    dates, report = parse_dates(pd.Series(['2024-01-05 13:45:00', '2023-12-31 08:00:00']))
+    assert dates.tolist() == [pd.Timestamp('2024-01-05 13:45'), pd.Timestamp('2023-12-31 08:00')]
+    assert report['format'] == '%Y-%m-%d %H:%M:%S'
+
+
+def test_explicit_format_skips_detection():
+    dates, report = parse_dates(pd.Series(['05/01/2024', '06/02/2024']), date_format='%m/%d/%Y')
+    assert dates.tolist() == [pd.Timestamp('2024-05-01'), pd.Timestamp('2024-06-02')]
+    assert not report['format_detected']
+
+
+def test_empty_and_unrecognized_values_are_reported():
+    dates, report = parse_dates(pd.Series(['05/01/2024', '', '  ', None, 'abc', 'abc']))
+    assert dates.isna().tolist() == [False, True, True, True, True, True]
+    assert report['dropped'][REASON_EMPTY] == 3
+    assert report['dropped'][REASON_UNRECOGNIZED] == 2
+    assert report['examples'] == ['abc']
+    assert dropped_rows(report) == 5
+
+
+def test_excel_serials():
+    dates, report = parse_dates(pd.Series([45000, 45000.5, np.nan]))
+    assert dates[0] == EXCEL_EPOCH + pd.Timedelta(days=45000) == pd.Timestamp('2023-03-15')
+    assert dates[1] == pd.Timestamp('2023-03-15 12:00')
+    assert report['serials'] == 2
+    assert report['dropped'][REASON_EMPTY] == 1
+
+
+def test_out_of_range_serials_are_dropped_not_wrapped():
+    dates, report = parse_dates(pd.Series([0, -5, 1e7, 132320, 132321, 1e300]))
+    assert dates.isna().tolist() == [True, True, True, False, True, True]
+    assert dates[3] == DATE_RANGE[1]
+    assert report['dropped'][REASON_OUT_OF_RANGE] == 5
+
+
+def test_out_of_range_serials_in_text_columns():
+    dates, report = parse_dates(pd.Series(['45000', '99999999', '05/01/2024']))
+    assert dates.tolist()[0] == pd.Timestamp('2023-03-15')
+    assert pd.isna(dates[1])
+    assert report['dropped'][REASON_OUT_OF_RANGE] == 1
+
+
+def test_out_of_range_texts_and_datetimes():
+    dates, report = parse_dates(pd.Series(['05/01/2024', '01/01/1500', '01/01/2300']))
+    assert dates.isna().tolist() == [False, True, True]
+    assert report['dropped'][REASON_OUT_OF_RANGE] == 2
+
+    cells = pd.Series([datetime.datetime(2024, 1, 5), datetime.datetime(1500, 1, 1), None], dtype=object)
+    dates, report = parse_dates(cells)
+    assert dates.isna().tolist() == [False, True, True]
+    assert report['dropped'][REASON_OUT_OF_RANGE] == 1
+    assert report['dropped'][REASON_EMPTY] == 1
+
+
+def test_datetime_dtype_outside_ns_range():
+    series = pd.Series(np.array(['2024-01-05', '1500-01-01', 'NaT'], dtype='datetime64[s]'))
+    dates, report = parse_dates(series)
+    assert dates.isna().tolist() == [False, True, True]
+    assert report['dropped'] == {REASON_EMPTY: 1, REASON_UNRECOGNIZED: 0, REASON_OUT_OF_RANGE: 1}
+    # Dentro do intervalo, a conversão para nanossegundos não estoura
+    assert dates.dropna().astype('datetime64[ns]').tolist() == [pd.Timestamp('2024-01-05')]
+
+
+def test_mixed_cells():
+    cells = pd.Series([datetime.datetime(2024, 1, 5), 45000, 'x', '05/01/2024'], dtype=object)
+    dates, report = parse_dates(cells)
+    assert dates.tolist()[:2] == [pd.Timestamp('2024-01-05'), pd.Timestamp('2023-03-15')]
+    assert pd.isna(dates[2])
+    assert dates[3] == pd.Timestamp('2024-01-05')
+    assert report['dropped'][REASON_UNRECOGNIZED] == 1
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from leads.filters import FilterIndex
+
+
+@pytest.fixture(scope='module')
+def df():
+    rng = np.random.default_rng(0)
+    n = 500
+    return pd.DataFrame({
+        'segmento': pd.Categorical(rng.choice(['Varejo', 'Saúde', 'Educação', None], n)),
+        'situacao': pd.Series(rng.choice(['Oportunidade', 'Perdido', 'Em aberto', None], n), dtype=object),
+        'categoria': rng.choice(['a', 'b'], n),
+    })
+
+
+def expected_positions(df, selections, start=0, stop=None):
+    mask = np.zeros(len(df), dtype=bool)
+    mask[start:stop] = True
+    for col, values in selections.items():
+        mask &= df[col].isin(values).to_numpy()
+    return np.flatnonzero(mask)
+
+
+@pytest.mark.parametrize('selections', [
+    {'segmento': ['Varejo']},
+    {'segmento': ['Varejo', 'Saúde'], 'situacao': ['Perdido']},
+    {'segmento': ['Educação'], 'situacao': ['Oportunidade', 'Em aberto'], 'categoria': ['b']},
+    {'situacao': ['não existe']},
+    {'segmento': ['Varejo'], 'situacao': ['não existe']},
+])
+@pytest.mark.parametrize('start, stop', [(0, None), (100, 350), (200, 200)])
+def test_positions_match_boolean_mask(df, selections, start, stop):
+    index = FilterIndex(df, ['segmento', 'situacao', 'categoria'])
+    positions = index.positions(selections, start, stop)
+    assert positions.tolist() == expected_positions(df, selections, start, stop).tolist()
+    selected = index.select(df, selections, start, stop)
+    assert selected.index.tolist() == df.index[positions].tolist()
+
+
+def test_no_selection_means_all_rows(df):
+    index = FilterIndex(df, ['segmento', 'situacao'])
+    assert index.positions({}) is None
+    assert index.positions({'segmento': []}) is None
+    assert len(index.select(df, None, 10, 20)) == 10
+
+
+def test_missing_values_are_never_selected(df):
+    index = FilterIndex(df, ['segmento', 'situacao'])
+    assert index.options('situacao') == ['Em aberto', 'Oportunidade', 'Perdido']
+    every = index.positions({'situacao': index.options('situacao')})
+    assert every.tolist() == np.flatnonzero(df['situacao'].notna().to_numpy()).tolist()
+
+
+def test_counts_apply_the_other_filters(df):
+    index = FilterIndex(df, ['segmento', 'situacao'])
+    selections = {'segmento': ['Varejo'], 'situacao': ['Perdido']}
+    counts = index.counts('situacao', selections, 50, 450)
+    part = df.iloc[50:450]
+    expected = part[part['segmento'] == 'Varejo']['situacao'].value_counts()
+    assert counts[counts > 0].to_dict() == expected.to_dict()
+
+
+def test_columns_missing_from_frame_are_ignored(df):
+    index = FilterIndex(df, ['segmento', 'nao_existe'])
+    assert index.columns == ['segmento']
+    assert index.positions({'nao_existe': ['x']}) is None
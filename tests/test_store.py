@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+from leads.store import KEY_COL, LeadStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LeadStore(tmp_path / 'leads.sqlite')
+    yield store
+    store.close()
+
+
+def leads(rows):
+    df = pd.DataFrame(rows, columns=['nome', 'telefone', 'e-mail', 'status', 'data_da_conversao'])
+    df['data_da_conversao'] = pd.to_datetime(df['data_da_conversao'])
+    return df
+
+
+JANUARY = leads([
+    ['Ana', '11999990000', 'ana@x.com', 'Válido', '2024-01-05'],
+    ['Ana de novo', '11999990000', 'ana@x.com', 'Inválido', '2024-01-06'],
+    ['Bia', '11888880000', 'ana@x.com', 'Válido', '2024-01-07'],
+])
+
+
+def test_rows_sharing_phone_and_email_are_all_kept(store):
+    assert store.append(JANUARY, 'jan', 'jan.xlsx') == 3
+    rows, last_id = store.read()
+    assert rows['nome'].tolist() == ['Ana', 'Ana de novo', 'Bia']
+    assert rows[KEY_COL].is_unique
+    assert last_id == store.version == 3
+
+
+def test_identical_rows_in_one_file_are_kept(store):
+    df = pd.concat([JANUARY.iloc[[0]], JANUARY.iloc[[0]]], ignore_index=True)
+    assert store.append(df, 'dup') == 2
+
+
+def test_same_file_is_imported_once(store):
+    assert store.append(JANUARY, 'jan') == 3
+    assert store.append(JANUARY, 'jan') == 0
+    assert store.has_source('jan')
+    assert store.sources()['inserted'].tolist() == [3]
+
+
+def test_overlapping_exports_only_add_new_rows(store):
+    store.append(JANUARY, 'jan')
+    february = pd.concat([
+        JANUARY.iloc[1:],
+        leads([
+            ['Ana', '11999990000', 'ana@x.com', 'Válido', '2024-02-01'],
+            ['Bia', '11888880000', 'ana@x.com', 'Perdido', '2024-01-07'],
+        ]),
+    ], ignore_index=True)
+    assert store.append(february, 'fev') == 2
+    rows, _ = store.read()
+    assert len(rows) == 5
+    assert rows['data_da_conversao'].dtype.kind == 'M'
+
+
+def test_incremental_read(store):
+    store.append(JANUARY.iloc[:2], 'a')
+    _, last_id = store.read()
+    store.append(JANUARY.iloc[2:], 'b')
+    rows, new_last_id = store.read(last_id)
+    assert rows['nome'].tolist() == ['Bia']
+    assert new_last_id == last_id + 1
+    rows, same_id = store.read(new_last_id)
+    assert rows.empty and same_id == new_last_id
+
+
+def test_reserved_and_repeated_column_names(store):
+    df = JANUARY.assign(id=[7, 8, 9], **{'NOME': ['a', 'b', 'c']})
+    store.append(df, 'jan')
+    columns = store.columns()
+    assert 'id.1' in columns and 'NOME.1' in columns
+    rows, _ = store.read()
+    assert rows['id.1'].tolist() == [7, 8, 9]
+    assert columns['data_da_conversao'] == 'datetime'